@@ -0,0 +1,290 @@
+# benchmarks/load_test.py
+"""
+End-to-end load and latency benchmark for the FastAPI app.
+
+Drives /negotiate/start, /negotiate/turn, /negotiate/{session_id}/feedback and /dialogue/facilitate
+in-process (httpx ASGI transport) against the stubbed LLM, STT and TTS backends, then prints a JSON
+report with throughput, p50/p95/p99 latency per endpoint, event-loop lag and RSS per active session.
+
+Usage (from the project root):
+    python -m benchmarks.load_test --concurrency 16 --sessions 200 --output bench_output.json
+    python -m benchmarks.load_test --budget /negotiate/turn=800   # exit 1 if turn p99 exceeds 800 ms
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import random
+import resource
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# Stub every upstream before the app (and its services) are imported.
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("AUDIO_BACKEND", "stub")
+# The stubs have no quota to protect; set UPSTREAM_* explicitly to benchmark the rate and concurrency limiters
+os.environ.setdefault("UPSTREAM_RATE_PER_S", "0")
+os.environ.setdefault("UPSTREAM_MAX_CONCURRENCY", "0")
+
+import httpx
+
+PERSONAS = ["hardliner", "compromiser", "emotional_stakeholder"]
+USER_MESSAGES = [
+    "We are willing to share the water rights if the border patrols are reduced.",
+    "That proposal is unacceptable to my people.",
+    "Can we agree on a joint commission to review the claims?",
+    "Let's make a deal on the fishing quotas first.",
+    "I hear your concerns, but we need guarantees.",
+]
+FACILITATE_MESSAGES = [
+    "Thanks, that sounds reasonable.",
+    "You people never listen, this is outrageous!",
+    "I think we should take a short break and revisit this.",
+    "If you cross that line again there will be consequences.",
+]
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return round(sorted_values[index], 2)
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 2) if ordered else None,
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "max": round(ordered[-1], 2) if ordered else None,
+    }
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (Linux /proc, falling back to peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class LoadRecorder:
+    def __init__(self):
+        self.latencies_ms: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> Optional[dict]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[route] += 1
+            return None
+        self.latencies_ms[route].append((time.perf_counter() - started) * 1000)
+        self.status_codes[route][response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[route] += 1
+            return None
+        return response.json()
+
+
+class EventLoopLagMonitor:
+    """Samples how late the loop wakes up from a fixed-interval sleep; blocking calls show up as lag."""
+
+    def __init__(self, interval_s: float = 0.01):
+        self.interval_s = interval_s
+        self.lags_ms: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            self.lags_ms.append(max(0.0, (time.perf_counter() - expected) * 1000))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+async def run_negotiation(client: httpx.AsyncClient, recorder: LoadRecorder, rng: random.Random, args) -> bool:
+    negotiators = [
+        {"id": f"ai_{i + 1}", "persona_type": rng.choice(PERSONAS), "initial_stance": f"Side {i + 1} keeps its historical claims."}
+        for i in range(args.agents)
+    ]
+    started = await recorder.request(client, "/negotiate/start", "POST", "/negotiate/start", json={
+        "scenario_id": "border_dispute_1",
+        "user_persona": "Mediator",
+        "ai_negotiators": negotiators,
+    })
+    if not started:
+        return False
+    session_id = started["session_id"]
+
+    for _ in range(args.turns):
+        if rng.random() < args.audio_ratio and args.audio_transport == "binary":
+            await recorder.request(client, "/negotiate/turn/audio", "POST", "/negotiate/turn/audio",
+                                   params={"session_id": session_id, "speaker_id": "user"},
+                                   content=os.urandom(args.audio_bytes), headers={"content-type": "audio/webm"})
+            continue
+        payload = {"session_id": session_id, "speaker_id": "user"}
+        if rng.random() < args.audio_ratio:
+            payload["audio_input_b64"] = base64.b64encode(os.urandom(args.audio_bytes)).decode("utf-8")
+        else:
+            payload["message"] = rng.choice(USER_MESSAGES)
+        await recorder.request(client, "/negotiate/turn", "POST", "/negotiate/turn", json=payload)
+
+    if rng.random() < args.feedback_ratio:
+        await recorder.request(client, "/negotiate/{session_id}/feedback", "GET", f"/negotiate/{session_id}/feedback", params={"wait": args.timeout / 2})
+    return True
+
+
+async def run_facilitation(client: httpx.AsyncClient, recorder: LoadRecorder, rng: random.Random, args):
+    for _ in range(args.facilitate_messages):
+        if rng.random() < args.audio_ratio and args.audio_transport == "binary":
+            await recorder.request(client, "/dialogue/facilitate/audio", "POST", "/dialogue/facilitate/audio",
+                                   params={"speaker_id": rng.choice(["Party A", "Party B"])},
+                                   content=os.urandom(args.audio_bytes), headers={"content-type": "audio/webm"})
+            continue
+        payload = {"session_id": "bench_facilitator", "speaker_id": rng.choice(["Party A", "Party B"])}
+        if rng.random() < args.audio_ratio:
+            payload["audio_input_b64"] = base64.b64encode(os.urandom(args.audio_bytes)).decode("utf-8")
+        else:
+            payload["message"] = rng.choice(FACILITATE_MESSAGES)
+        await recorder.request(client, "/dialogue/facilitate", "POST", "/dialogue/facilitate", json=payload)
+
+
+def count_active_sessions(app_module) -> int:
+    return len(app_module.negotiation_service.session_store)
+
+
+async def run_benchmark(args) -> dict:
+    import main as app_module
+
+    recorder = LoadRecorder()
+    lag_monitor = EventLoopLagMonitor(args.lag_interval_ms / 1000)
+    rng = random.Random(args.seed)
+    work_queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.sessions):
+        work_queue.put_nowait("negotiation" if rng.random() < args.negotiation_ratio else "facilitation")
+
+    sessions_before = count_active_sessions(app_module)
+    rss_before = current_rss_bytes()
+    negotiations_started = 0
+
+    async def virtual_user(worker_id: int):
+        nonlocal negotiations_started
+        worker_rng = random.Random(f"{args.seed}-{worker_id}")
+        while True:
+            try:
+                kind = work_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if kind == "negotiation":
+                if await run_negotiation(client, recorder, worker_rng, args):
+                    negotiations_started += 1
+            else:
+                await run_facilitation(client, recorder, worker_rng, args)
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+        lag_monitor.start()
+        wall_started = time.perf_counter()
+        await asyncio.gather(*[virtual_user(i) for i in range(args.concurrency)])
+        wall_s = time.perf_counter() - wall_started
+        await lag_monitor.stop()
+
+    rss_after = current_rss_bytes()
+    active_sessions = count_active_sessions(app_module) - sessions_before
+    total_requests = sum(len(v) for v in recorder.latencies_ms.values())
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "budget")},
+        "wall_time_s": round(wall_s, 3),
+        "throughput_rps": round(total_requests / wall_s, 2) if wall_s else None,
+        "requests_total": total_requests,
+        "errors_total": sum(recorder.errors.values()),
+        "endpoints": {
+            route: {
+                "latency_ms": summarize(latencies),
+                "throughput_rps": round(len(latencies) / wall_s, 2) if wall_s else None,
+                "errors": recorder.errors.get(route, 0),
+                "status_codes": dict(recorder.status_codes[route]),
+            }
+            for route, latencies in sorted(recorder.latencies_ms.items())
+        },
+        "event_loop_lag_ms": summarize(lag_monitor.lags_ms),
+        "memory": {
+            "rss_before_mb": round(rss_before / 2**20, 2),
+            "rss_after_mb": round(rss_after / 2**20, 2),
+            "negotiations_started": negotiations_started,
+            "active_sessions": active_sessions,
+            "rss_per_active_session_kb": round((rss_after - rss_before) / 1024 / active_sessions, 2) if active_sessions > 0 else None,
+        },
+    }
+
+
+def check_budgets(report: dict, budgets: List[str]) -> List[str]:
+    """Returns a violation message for every ROUTE=P99_MS budget the report exceeds."""
+    violations = []
+    for budget in budgets:
+        route, _, limit = budget.rpartition("=")
+        p99 = report["endpoints"].get(route, {}).get("latency_ms", {}).get("p99")
+        if p99 is not None and p99 > float(limit):
+            violations.append(f"{route} p99 {p99} ms exceeds budget {limit} ms")
+    return violations
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load and latency benchmark for the AI Diplomacy Toolkit API.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent virtual users.")
+    parser.add_argument("--sessions", type=int, default=50, help="Total number of workload units (negotiations or facilitation runs).")
+    parser.add_argument("--negotiation-ratio", type=float, default=0.7, help="Share of workload units that are negotiations; the rest are facilitation runs.")
+    parser.add_argument("--agents", type=int, default=3, help="AI negotiators per session.")
+    parser.add_argument("--turns", type=int, default=4, help="User turns per negotiation.")
+    parser.add_argument("--feedback-ratio", type=float, default=0.5, help="Share of negotiations that request feedback at the end.")
+    parser.add_argument("--facilitate-messages", type=int, default=5, help="Messages per facilitation run.")
+    parser.add_argument("--audio-ratio", type=float, default=0.2, help="Share of user inputs sent as audio instead of text.")
+    parser.add_argument("--audio-transport", choices=["base64", "binary"], default="base64", help="How audio inputs are uploaded: base64 in JSON or raw bytes to the /audio endpoints.")
+    parser.add_argument("--audio-bytes", type=int, default=16000, help="Size of each synthetic audio upload.")
+    parser.add_argument("--lag-interval-ms", type=float, default=10.0, help="Event-loop lag sampling interval.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request client timeout in seconds.")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed for the workload mix.")
+    parser.add_argument("--output", help="Also write the JSON report to this file.")
+    parser.add_argument("--budget", action="append", default=[], help="ROUTE=P99_MS latency budget; exits non-zero when exceeded. Repeatable.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Keep stdout clean for the JSON report; the app's own diagnostics go to stderr.
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run_benchmark(args))
+    violations = check_budgets(report, args.budget)
+    report["budget_violations"] = violations
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
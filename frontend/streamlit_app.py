@@ -3,8 +3,8 @@
 import streamlit as st
 import httpx
 import asyncio
+import base64
 from typing import List, Dict, Any, Optional
-import base64 # Needed for encoding/decoding audio
 from streamlit_mic_recorder import mic_recorder # NEW: For microphone input
 
 # --- Configuration ---
@@ -67,37 +67,47 @@ async def start_negotiation_async(scenario_id: str, user_persona: str, ai_negoti
     except httpx.RequestError as e:
         st.error(f"Network error: {e}. Is FastAPI server running?")
 
-async def submit_user_turn_async(session_id: str, message: Optional[str] = None, audio_input_b64: Optional[str] = None): # MODIFIED
+async def submit_user_turn_async(session_id: str, message: Optional[str] = None, audio_bytes: Optional[bytes] = None, audio_mime: str = "audio/webm"): # MODIFIED
     try:
         # Add user's text message to history immediately for display
         if message:
             st.session_state.negotiation_history.append({"speaker_id": "user", "message": message})
-        elif audio_input_b64:
+        elif audio_bytes:
              # Placeholder for transcribed text, will update if actual transcription available
              st.session_state.negotiation_history.append({"speaker_id": "user", "message": "*(Transcribing audio...)*"}) 
 
-        response = await client.post(
-            "/negotiate/turn",
-            json={
-                "session_id": session_id,
-                "speaker_id": "user",
-                "message": message, # Send text if available
-                "audio_input_b64": audio_input_b64 # Send audio if available
-            }
-        )
+        if audio_bytes:
+            # Upload the recording as binary multipart instead of base64 JSON
+            response = await client.post(
+                "/negotiate/turn/audio",
+                data={"session_id": session_id, "speaker_id": "user", "inline_audio": "true"},
+                files={"audio": ("recording", audio_bytes, audio_mime)}
+            )
+        else:
+            response = await client.post(
+                "/negotiate/turn",
+                json={
+                    "session_id": session_id,
+                    "speaker_id": "user",
+                    "message": message,
+                    # Reply audio comes back in this response: /audio/{id} lives in the memory of whichever
+                    # worker served the turn, and the viewer's browser may not reach API_BASE_URL at all
+                    "inline_audio": True
+                }
+            )
         response.raise_for_status()
         data = response.json()
         
         # Update negotiation history with actual transcribed text (if audio was sent)
         # And add AI responses (with audio)
         st.session_state.negotiation_history = [
-            {"speaker_id": h["speaker_id"], "message": h["message"], "audio_output_b64": h.get("audio_output_b64")}
+            {"speaker_id": h["speaker_id"], "message": h["message"], "audio_bytes": base64.b64decode(h["audio_output_b64"]) if h.get("audio_output_b64") else None}
             for h in data["ai_responses"] # Overwrite or merge based on history management
         ]
         # Re-add user's message after FastAPI confirms transcription
         if message:
              st.session_state.negotiation_history.insert(0, {"speaker_id": "user", "message": message})
-        elif audio_input_b64 and data["ai_responses"]: # If audio was sent, first AI response might contain transcribed text
+        elif audio_bytes and data["ai_responses"]: # If audio was sent, first AI response might contain transcribed text
             # This is a simplified way; ideally, FastAPI returns the transcribed text directly
             # For now, we assume the first AI response implies the user's turn was processed.
             st.session_state.negotiation_history[0]["message"] = f"*(Audio input transcribed)*" # Update placeholder
@@ -113,9 +123,16 @@ async def submit_user_turn_async(session_id: str, message: Optional[str] = None,
 
 async def get_feedback_async(session_id: str):
     try:
-        response = await client.get(f"/negotiate/{session_id}/feedback")
-        response.raise_for_status()
-        data = response.json()
+        # Feedback is usually generated in the background by now; otherwise long-poll until it is ready
+        for _ in range(10):
+            response = await client.get(f"/negotiate/{session_id}/feedback", params={"wait": 25}, timeout=35)
+            response.raise_for_status()
+            data = response.json()
+            if data.get("status") != "pending":
+                break
+        else:
+            st.warning("Feedback is still being generated. Please try again shortly.")
+            return
         st.subheader("Negotiation Feedback")
         st.write(f"**Outcome:** {data['final_outcome']}")
         st.write(f"**Summary:** {data['feedback_summary']}")
@@ -127,22 +144,28 @@ async def get_feedback_async(session_id: str):
     except httpx.RequestError as e:
         st.error(f"Network error: {e}. Is FastAPI server running?")
 
-async def facilitate_dialogue_async(speaker_id: str, message: Optional[str] = None, audio_input_b64: Optional[str] = None): # MODIFIED
-    if not message and not audio_input_b64:
+async def facilitate_dialogue_async(speaker_id: str, message: Optional[str] = None, audio_bytes: Optional[bytes] = None, audio_mime: str = "audio/webm"): # MODIFIED
+    if not message and not audio_bytes:
         st.warning("Please enter a message or record audio to analyze.")
         return
 
     try:
-        payload = {
-            "session_id": "temp_facilitator_session", # Placeholder
-            "speaker_id": speaker_id,
-            "message": message, # Send text if available
-            "audio_input_b64": audio_input_b64 # Send audio if available
-        }
-        response = await client.post(
-            "/dialogue/facilitate",
-            json=payload
-        )
+        if audio_bytes:
+            response = await client.post(
+                "/dialogue/facilitate/audio",
+                data={"session_id": "temp_facilitator_session", "speaker_id": speaker_id},
+                files={"audio": ("recording", audio_bytes, audio_mime)}
+            )
+        else:
+            payload = {
+                "session_id": "temp_facilitator_session", # Placeholder
+                "speaker_id": speaker_id,
+                "message": message
+            }
+            response = await client.post(
+                "/dialogue/facilitate",
+                json=payload
+            )
         response.raise_for_status()
         data = response.json()
         st.info(f"**Sentiment Score:** {data['sentiment_score']:.2f} (Escalation: {data['escalation_flag']})")
@@ -206,10 +229,8 @@ with col1:
             for turn in st.session_state.negotiation_history:
                 speaker_name = turn["speaker_id"].replace('_', ' ').title()
                 st.markdown(f"**{speaker_name}:** {turn['message']}")
-                if turn.get("audio_output_b64"): # Play audio if available
-                    # Streamlit expects base64 decoded bytes for st.audio
-                    audio_bytes = base64.b64decode(turn["audio_output_b64"])
-                    st.audio(audio_bytes, format='audio/mp3', sample_rate=44100) # Assuming MP3 from TTS
+                if turn.get("audio_bytes"): # Play audio if available
+                    st.audio(turn["audio_bytes"], format='audio/mp3')
 
 
         # --- User Input Section (Text or Voice) ---
@@ -230,13 +251,12 @@ with col1:
             st.session_state.user_text_input = "" # Clear text area
             st.rerun()
         elif audio_recorder_data and st.session_state.session_id:
-            # audio_recorder_data will contain {'bytes': b'...', 'type': 'audio/webm'} or similar
-            # Need to base64 encode the bytes to send to FastAPI
+            # audio_recorder_data will contain {'bytes': b'...', 'format': 'webm'} or similar
+            # The raw bytes are uploaded as-is (multipart), no base64 round-trip needed
             audio_bytes = audio_recorder_data['bytes']
-            audio_b64 = base64.b64encode(audio_bytes).decode('utf-8')
             
             st.info("Sending audio for transcription and AI response...")
-            asyncio.run(submit_user_turn_async(st.session_state.session_id, audio_input_b64=audio_b64))
+            asyncio.run(submit_user_turn_async(st.session_state.session_id, audio_bytes=audio_bytes))
             st.rerun() # Rerun to update chat history
 
 
@@ -268,9 +288,8 @@ with col2:
         st.session_state.facil_text_input = "" # Clear text area
     elif facil_audio_recorder_data:
         audio_bytes = facil_audio_recorder_data['bytes']
-        audio_b64 = base64.b64encode(audio_bytes).decode('utf-8')
         st.info("Sending audio for analysis...")
-        asyncio.run(facilitate_dialogue_async(dialogue_speaker, audio_input_b64=audio_b64))
+        asyncio.run(facilitate_dialogue_async(dialogue_speaker, audio_bytes=audio_bytes))
 
 st.markdown("---")
 st.markdown("For Deep Funding AI for Peace Hackathon. Built for SingularityNET Marketplace.")
\ No newline at end of file
@@ -1,19 +1,31 @@
 # main.py
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from dotenv import load_dotenv # Import dotenv
 load_dotenv() # Load environment variables from .env file
 
-import asyncio
+import math
+import os
+import json
 import uvicorn
+from contextlib import asynccontextmanager
 
 # Import the updated services and models
 from src.models.llm_agent import LLMAgent
+from src.models.model_registry import get_model_registry
 from src.services.negotiation_service import NegotiationService
 from src.services.audio_service import AudioService # NEW
+from src.services.session_store import SessionConflictError
+from src.services.warmup import BackendWarmup
+from src.utils.logging_config import configure_logging
+from src.utils.metrics import REGISTRY
+from src.utils.resilience import RequestBudgetMiddleware, UpstreamOverloadedError, get_upstream
+from src.utils.tracing import TraceMiddleware, current_trace
+from src.utils.worker_pools import get_pool, pool_stats, run_in_pool
 
 # Pydantic models for request/response bodies (Modified for audio)
 class AINegotiator(BaseModel):
@@ -25,17 +37,44 @@ class StartNegotiationRequest(BaseModel):
     scenario_id: str
     user_persona: str
     ai_negotiators: List[AINegotiator]
+    include_timings: bool = False # Return the per-stage breakdown of this request in 'timings'
+
+class AgentTiming(BaseModel):
+    llm_ms: Optional[float] = None # Time spent waiting for the LLM reply
+    tts_ms: Optional[float] = None # Time spent synthesizing the reply audio
+    total_ms: Optional[float] = None # Wall time of the agent's whole turn
 
 class AITurnResponse(BaseModel): # MODIFIED: Added audio_output_b64
     speaker_id: str
     message: str
-    audio_output_b64: Optional[str] = None # Base64 encoded MP3 audio
+    audio_id: Optional[str] = None # ID of the synthesized MP3, fetchable from GET /audio/{audio_id}
+    audio_url: Optional[str] = None # Relative URL of the synthesized MP3
+    audio_output_b64: Optional[str] = None # Base64 encoded MP3 audio (only when inline_audio was requested)
+    timing: Optional[AgentTiming] = None # Per-agent latency breakdown (turns only)
 
 class UserTurn(BaseModel): # MODIFIED: Added optional audio_input_b64
     session_id: str
     speaker_id: str
     message: Optional[str] = None # Text message (optional if audio is provided)
     audio_input_b64: Optional[str] = None # Base64 encoded audio from microphone
+    inline_audio: bool = False # Compatibility mode: also return reply audio as base64 in audio_output_b64
+    include_timings: bool = False # Return the per-stage breakdown of this request in 'timings'
+
+class SpanTiming(BaseModel):
+    name: str # Stage, e.g. 'take_turn', 'agent_turn', 'llm.generate', 'stt.transcribe', 'tts.synthesize'
+    span_id: str
+    parent_id: Optional[str] = None # Enclosing stage; None for top-level stages
+    start_ms: float # Offset from the start of the request
+    duration_ms: Optional[float] = None
+    status: str # 'ok' or 'error'
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = {} # e.g. ai_id, call_site, cache_hit, token counts
+
+class RequestTimings(BaseModel):
+    trace_id: str # Also returned in the X-Trace-Id response header and logged with every record
+    total_ms: float
+    spans: List[SpanTiming]
+    dropped_spans: Optional[int] = None # Spans beyond TRACE_MAX_SPANS that were not recorded
 
 class NegotiationResponse(BaseModel):
     session_id: Optional[str] = None
@@ -43,6 +82,7 @@ class NegotiationResponse(BaseModel):
     current_status: str
     agreed_points: List[str]
     next_action_hint: str
+    timings: Optional[RequestTimings] = None # Only when the request set include_timings
 
 class DialogueFacilitateRequest(BaseModel): # MODIFIED: Added optional audio_input_b64
     session_id: str # Can be a placeholder like "temp_session" for facilitator
@@ -54,19 +94,64 @@ class DialogueFacilitateResponse(BaseModel):
     sentiment_score: float
     escalation_flag: bool
     intervention: Optional[str]
+    tier: Optional[str] = None # Which tier answered: 'lexicon' (local fast path), 'cache' or 'llm'
 
-# Initialize FastAPI app
-app = FastAPI(
-    title="AI Diplomacy Toolkit API (Google Cloud Edition)",
-    description="Backend for AI Diplomacy simulations and dialogue facilitation.",
-    version="1.0.0"
-)
+class DialogueSegment(BaseModel):
+    speaker_id: str
+    message: str
+
+class DialogueFacilitateBatchRequest(BaseModel):
+    session_id: str # Can be a placeholder like "temp_session" for facilitator
+    segments: List[DialogueSegment]
+
+class DialogueFacilitateBatchResponse(BaseModel):
+    results: List[DialogueFacilitateResponse] # One analysis per segment, in request order
+
+# Upper bound on segments accepted by one /dialogue/facilitate/batch request
+MAX_FACILITATE_BATCH_SEGMENTS = int(os.getenv("MAX_FACILITATE_BATCH_SEGMENTS", "500"))
+# Longest long-poll accepted by GET /negotiate/{session_id}/feedback?wait=...
+FEEDBACK_MAX_WAIT_S = float(os.getenv("FEEDBACK_MAX_WAIT_S", "30"))
+# Time budget per request; upstream calls made for a request time out when it runs out
+REQUEST_BUDGET_S = float(os.getenv("REQUEST_BUDGET_S", "60"))
+
+# Structured JSON logs on stdout (LOG_FORMAT=text for local development)
+configure_logging()
 
 # Initialize services
+# Cloud clients are created lazily on first use; WARMUP_ON_STARTUP pre-initializes them in the background.
 # LLM agent (now uses Google Cloud Gemini)
 llm_agent_instance = LLMAgent()
 audio_service_instance = AudioService() # NEW: Instantiate AudioService
 negotiation_service = NegotiationService(llm_agent_instance, audio_service_instance) # MODIFIED: Pass audio_service
+backend_warmup = BackendWarmup.from_env(audio_service_instance)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serving starts immediately; warm-up continues in the background and is reported by /ready
+    backend_warmup.start()
+    yield
+
+# Initialize FastAPI app
+app = FastAPI(
+    title="AI Diplomacy Toolkit API (Google Cloud Edition)",
+    description="Backend for AI Diplomacy simulations and dialogue facilitation.",
+    version="1.0.0",
+    lifespan=lifespan
+)
+# Every request gets a trace (ID from X-Trace-Id/traceparent, echoed back) logged as one JSON record with its stages
+app.add_middleware(RequestBudgetMiddleware, budget_s=REQUEST_BUDGET_S)
+app.add_middleware(TraceMiddleware, exclude_paths=("/", "/ready", "/metrics"))
+
+def _too_many_requests(e: UpstreamOverloadedError) -> HTTPException:
+    """Sheds a request an upstream limiter could not admit: 429 with a Retry-After hint instead of a late 500."""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after_s))})
+
+def _with_timings(response_data: Dict[str, Any], include_timings: bool) -> Dict[str, Any]:
+    """Adds the current request's stage timings to a response when the client asked for them."""
+    trace = current_trace()
+    if include_timings and trace is not None:
+        return {**response_data, "timings": trace.timings()}
+    return response_data
 
 # --- API Endpoints ---
 
@@ -79,16 +164,65 @@ async def get_personas():
     """Returns a list of available AI persona types."""
     return {"personas": list(negotiation_service.persona_prompts.keys())}
 
+@app.get("/ready")
+async def readiness():
+    """Reports which backends are warm. Returns 503 while the startup warm-up is still running."""
+    report = backend_warmup.readiness()
+    return Response(content=json.dumps(report), media_type="application/json", status_code=200 if report["ready"] else 503)
+
+@app.get("/stats/caches")
+async def get_cache_stats():
+    """Returns hit/miss counters for the service caches."""
+    return _cache_stats()
+
+def _cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        "tts": audio_service_instance.tts_cache.stats(),
+        "llm_models": get_model_registry().stats(),
+        "facilitator": negotiation_service.facilitator_cache.stats(),
+        "audio_store": negotiation_service.audio_store.stats()
+    }
+
+# Session and cache metrics are read from the existing stats at scrape time, so they cost nothing per request
+REGISTRY.callback("diplomacy_active_sessions", "Sessions currently held by the session store.", lambda: len(negotiation_service.session_store))
+REGISTRY.callback("diplomacy_session_store_bytes", "Estimated size of the sessions held in memory (memory backend only).", lambda: negotiation_service.session_store.stats().get("bytes"))
+REGISTRY.callback("diplomacy_cache_hits_total", "Cache hits, by cache.", lambda: {(name, ): stats.get("hits") for name, stats in _cache_stats().items()}, ("cache",), "counter")
+REGISTRY.callback("diplomacy_cache_misses_total", "Cache misses, by cache.", lambda: {(name, ): stats.get("misses") for name, stats in _cache_stats().items()}, ("cache",), "counter")
+REGISTRY.callback("diplomacy_cache_hit_ratio", "Cache hit ratio since startup, by cache.", lambda: {(name, ): stats.get("hit_rate") for name, stats in _cache_stats().items()}, ("cache",))
+
+@app.get("/stats/upstreams")
+async def get_upstream_stats():
+    """Returns circuit breaker state, limiter queue depth and in-flight calls, and policy per upstream."""
+    return {name: get_upstream(name).stats() for name in ("llm", "stt", "tts")}
+
+@app.get("/stats/pools")
+async def get_pool_stats():
+    """Returns size, running and queued work, and utilization of each worker pool (one per upstream)."""
+    return pool_stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this worker process (text exposition format)."""
+    # Rendered off the loop: the session metrics query the session store, which may be SQLite or Redis
+    return Response(content=await get_pool("sessions").run(REGISTRY.render), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/stats/sessions")
+async def get_session_stats():
+    """Returns session store size and eviction counters."""
+    return await run_in_pool("sessions", negotiation_service.session_store.stats)
+
 @app.post("/negotiate/start", response_model=NegotiationResponse)
 async def start_negotiation_endpoint(request: StartNegotiationRequest):
     """Starts a new negotiation session."""
     try:
-        response_data = negotiation_service.start_negotiation(
+        response_data = await negotiation_service.start_negotiation(
             request.scenario_id,
             request.user_persona,
             [ai.dict() for ai in request.ai_negotiators]
         )
-        return NegotiationResponse(**response_data)
+        return NegotiationResponse(**_with_timings(response_data, request.include_timings))
+    except UpstreamOverloadedError as e:
+        raise _too_many_requests(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start negotiation: {e}")
 
@@ -103,19 +237,72 @@ async def take_negotiation_turn_endpoint(request: UserTurn):
             request.session_id,
             request.speaker_id,
             message=request.message, # Pass text if provided
-            audio_input_b64=request.audio_input_b64 # Pass audio if provided
+            audio_input_b64=request.audio_input_b64, # Pass audio if provided
+            inline_audio=request.inline_audio
         )
-        return NegotiationResponse(**response_data)
+        return NegotiationResponse(**_with_timings(response_data, request.include_timings))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except SessionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UpstreamOverloadedError as e:
+        raise _too_many_requests(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process negotiation turn: {e}")
 
+def _format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/negotiate/turn/stream")
+async def stream_negotiation_turn_endpoint(request: UserTurn):
+    """
+    Submits a user's turn and streams the AI responses as Server-Sent Events:
+    user_turn, agent_delta (token deltas), audio_segment (ordered per-sentence audio), agent_finished,
+    agent_audio_done, agent_error and a final status event.
+    """
+    if not request.message and not request.audio_input_b64:
+        raise HTTPException(status_code=400, detail="Either 'message' or 'audio_input_b64' must be provided.")
+
+    try:
+        events = await negotiation_service.stream_turn(
+            request.session_id,
+            request.speaker_id,
+            message=request.message,
+            audio_input_b64=request.audio_input_b64,
+            inline_audio=request.inline_audio
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UpstreamOverloadedError as e:
+        raise _too_many_requests(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to process negotiation turn: {e}")
+
+    async def sse_stream():
+        try:
+            async for event, data in events:
+                yield _format_sse(event, data)
+        except Exception as e:
+            yield _format_sse("error", {"detail": f"Failed to process negotiation turn: {e}"})
+
+    return StreamingResponse(
+        sse_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # Keep proxies from buffering the stream
+    )
+
 @app.get("/negotiate/{session_id}/feedback")
-async def get_negotiation_feedback_endpoint(session_id: str):
-    """Gets feedback for a completed negotiation session."""
+async def get_negotiation_feedback_endpoint(session_id: str, wait: float = 0.0):
+    """
+    Gets feedback for a negotiation session. Feedback is generated in the background once the session ends
+    (or on the first request) and cached until the conversation changes. While it is being generated the
+    response is 202 {"status": "pending"} with a Retry-After header; 'wait' long-polls for up to that many
+    seconds (at most FEEDBACK_MAX_WAIT_S) before answering.
+    """
     try:
-        feedback = await negotiation_service.get_feedback(session_id)
+        feedback = await negotiation_service.get_feedback(session_id, wait_s=min(max(wait, 0.0), FEEDBACK_MAX_WAIT_S))
+        if feedback["status"] == "pending":
+            return Response(content=json.dumps(feedback), media_type="application/json", status_code=202, headers={"Retry-After": "1"})
         return feedback
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -134,27 +321,180 @@ async def facilitate_dialogue_endpoint(request: DialogueFacilitateRequest):
         if not audio_service_instance: # Should not happen if initialized correctly
             raise HTTPException(status_code=500, detail="Audio service is not available.")
         try:
-            # Run synchronous transcription in a separate thread
-            text_to_analyze = await asyncio.to_thread(
-                audio_service_instance.transcribe_audio, request.audio_input_b64
+            # Run synchronous transcription on the STT worker pool
+            text_to_analyze = await run_in_pool(
+                "stt", audio_service_instance.transcribe_audio, request.audio_input_b64, call_site="facilitate"
             )
+        except UpstreamOverloadedError as e:
+            raise _too_many_requests(e)
         except Exception as e:
             # Handle transcription specific error
             raise HTTPException(status_code=500, detail=f"Audio transcription failed: {e}")
 
+    return await _facilitate_text(request.session_id, request.speaker_id, text_to_analyze)
+
+async def _facilitate_text(session_id: str, speaker_id: str, text_to_analyze: Optional[str]) -> DialogueFacilitateResponse:
     if not text_to_analyze: # If audio was provided but transcription failed or returned empty, or no text message
         raise HTTPException(status_code=400, detail="Failed to get text from audio or no text message provided.")
 
     try:
         analysis = await negotiation_service.facilitate_dialogue(
-            request.session_id,
-            request.speaker_id,
+            session_id,
+            speaker_id,
             message=text_to_analyze
         )
         return DialogueFacilitateResponse(**analysis)
+    except UpstreamOverloadedError as e:
+        raise _too_many_requests(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to facilitate dialogue: {e}")
 
+@app.post("/dialogue/facilitate/batch", response_model=DialogueFacilitateBatchResponse)
+async def facilitate_dialogue_batch_endpoint(request: DialogueFacilitateBatchRequest):
+    """Analyzes many dialogue segments at once, e.g. when moderating a live multi-party chat."""
+    if not request.segments:
+        raise HTTPException(status_code=400, detail="'segments' must contain at least one segment.")
+    if len(request.segments) > MAX_FACILITATE_BATCH_SEGMENTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_FACILITATE_BATCH_SEGMENTS} segments can be analyzed per request.")
+    if any(not segment.message for segment in request.segments):
+        raise HTTPException(status_code=400, detail="Every segment needs a non-empty 'message'.")
+
+    try:
+        analyses = await negotiation_service.facilitate_dialogue_batch(
+            request.session_id,
+            [segment.dict() for segment in request.segments]
+        )
+        return DialogueFacilitateBatchResponse(results=[DialogueFacilitateResponse(**analysis) for analysis in analyses])
+    except UpstreamOverloadedError as e:
+        raise _too_many_requests(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to facilitate dialogue batch: {e}")
+
+# --- Binary audio transport ---
+
+async def _read_audio_upload(request: Request) -> Tuple[Dict[str, str], bytes]:
+    """
+    Reads an audio upload sent either as multipart/form-data (an 'audio' file part plus form fields)
+    or as a raw request body (e.g. Content-Type: audio/webm) with the fields in the query string.
+    Returns (fields, audio_bytes).
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("audio")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart uploads must include an 'audio' file part.")
+        audio_bytes = await upload.read()
+        fields = {key: value for key, value in form.items() if isinstance(value, str)}
+    else:
+        audio_bytes = await request.body()
+        fields = dict(request.query_params)
+    if not audio_bytes:
+        raise HTTPException(status_code=400, detail="The audio upload is empty.")
+    return fields, audio_bytes
+
+def _require_field(fields: Dict[str, str], name: str, default: Optional[str] = None) -> str:
+    value = fields.get(name, default)
+    if not value:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be provided.")
+    return value
+
+@app.post("/negotiate/turn/audio", response_model=NegotiationResponse)
+async def take_negotiation_audio_turn_endpoint(request: Request):
+    """
+    Submits a spoken user turn as binary audio (multipart 'audio' part or raw body) instead of base64 JSON.
+    Fields: session_id, speaker_id (default 'user'), inline_audio (default false), include_timings (default false).
+    """
+    fields, audio_bytes = await _read_audio_upload(request)
+    session_id = _require_field(fields, "session_id")
+    speaker_id = _require_field(fields, "speaker_id", "user")
+
+    try:
+        response_data = await negotiation_service.take_turn(
+            session_id,
+            speaker_id,
+            audio_input=audio_bytes,
+            inline_audio=fields.get("inline_audio", "").lower() in ("1", "true", "yes")
+        )
+        return NegotiationResponse(**_with_timings(response_data, fields.get("include_timings", "").lower() in ("1", "true", "yes")))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except SessionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UpstreamOverloadedError as e:
+        raise _too_many_requests(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to process negotiation turn: {e}")
+
+@app.post("/dialogue/facilitate/audio", response_model=DialogueFacilitateResponse)
+async def facilitate_dialogue_audio_endpoint(request: Request):
+    """
+    Analyzes a spoken dialogue segment sent as binary audio (multipart 'audio' part or raw body).
+    Fields: session_id (default 'temp_facilitator_session'), speaker_id.
+    """
+    fields, audio_bytes = await _read_audio_upload(request)
+    session_id = _require_field(fields, "session_id", "temp_facilitator_session")
+    speaker_id = _require_field(fields, "speaker_id")
+
+    try:
+        text_to_analyze = await run_in_pool("stt", audio_service_instance.transcribe_audio_bytes, audio_bytes, call_site="facilitate")
+    except UpstreamOverloadedError as e:
+        raise _too_many_requests(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Audio transcription failed: {e}")
+
+    return await _facilitate_text(session_id, speaker_id, text_to_analyze)
+
+def _parse_byte_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single 'bytes=' range into an inclusive (start, end) pair.
+    Returns None for headers we don't handle (multiple ranges, other units) so the full body is sent.
+    Raises ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if not start_text: # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError("Empty suffix range.")
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        raise ValueError(f"Malformed range '{range_header}'.")
+    if start >= size or start > end:
+        raise ValueError(f"Range '{range_header}' not satisfiable.")
+    return start, min(end, size - 1)
+
+@app.get("/audio/{audio_id}")
+async def get_audio_endpoint(audio_id: str, request: Request):
+    """Returns a synthesized reply's audio by ID, with HTTP Range support for seeking/partial fetches."""
+    clip = negotiation_service.audio_store.get(audio_id)
+    if clip is None:
+        raise HTTPException(status_code=404, detail="Audio not found or expired.")
+    audio_bytes, media_type = clip
+    size = len(audio_bytes)
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "private, max-age=900"}
+
+    range_header = request.headers.get("range")
+    if range_header:
+        try:
+            byte_range = _parse_byte_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            return Response(
+                content=audio_bytes[start:end + 1],
+                status_code=206,
+                media_type=media_type,
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"}
+            )
+    return Response(content=audio_bytes, media_type=media_type, headers=headers)
+
 # If running directly (e.g., for local development)
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
@@ -1,54 +1,69 @@
 # src/models/llm_agent.py
 
-from vertexai.generative_models import GenerativeModel, ChatSession, Content, Part
-from google.api_core.exceptions import GoogleAPIError
-import os
-from typing import List, Dict, Any, Optional
-import vertexai
-
-# --- Configuration for Google Cloud LLM ---
-# Initialize Vertex AI for your project.
-# GCP_PROJECT_ID must be set as an environment variable.
-GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID")
-if not GCP_PROJECT_ID:
-    raise ValueError(
-        "The GCP_PROJECT_ID environment variable is not set. "
-        "Please set it to your Google Cloud Project ID."
-    )
-# Default region 'us-central1' is generally fine.
-vertexai.init(project=GCP_PROJECT_ID, location="us-central1")
+import logging
+import time
+from typing import List, Dict, Any, Iterator, Optional
+
+from src.models.llm_backends import LLMBackend, get_default_backend
+from src.models.model_registry import ModelRegistry, get_model_registry
+from src.utils.metrics import LLM_LATENCY, LLM_TOKENS, UPSTREAM_ERRORS
+from src.utils.resilience import UpstreamOverloadedError, get_upstream
+from src.utils.tracing import span
+
+logger = logging.getLogger("diplomacy.llm")
+
+# --- Configuration for the LLM backend ---
+# The backend is chosen with the LLM_BACKEND environment variable ('vertex' by default, or 'stub'
+# for offline load testing). The Vertex backend initializes Vertex AI lazily on first use and
+# requires GCP_PROJECT_ID to be set at that point.
+# Model handles are shared through the process-wide ModelRegistry and resolved on first use;
+# an LLMAgent only owns its chat.
 
 class LLMAgent:
-    def __init__(self, model_name: str = "gemini-1.5-pro-preview-0514", system_instruction: Optional[str] = None):
+    def __init__(self, model_name: str = "gemini-1.5-pro-preview-0514", system_instruction: Optional[str] = None, backend: Optional[LLMBackend] = None, registry: Optional[ModelRegistry] = None, call_site: str = "default"):
         """
-        Initializes the LLM agent to use Google's Gemini model via Vertex AI.
+        Initializes the LLM agent on top of a pluggable LLM backend (Google's Gemini via Vertex AI by default).
 
         Args:
             model_name: The name of the Gemini model to use.
             system_instruction: Optional system-level instructions for the LLM.
-                                This is passed directly to the GenerativeModel.
+                                Applied per chat; the model handle itself is shared.
+            backend: Optional backend override. Defaults to the process-wide backend.
+            registry: Optional model registry. Defaults to the process-wide registry.
+            call_site: Label for latency/token metrics (e.g. 'turn', 'feedback').
         """
         self.model_name = model_name
-        self.model = GenerativeModel(
-            self.model_name,
-            system_instruction=Content(parts=[Part.from_text(system_instruction)]) if system_instruction else None
-        )
-        self.chat_session: Optional[ChatSession] = None
+        self.system_instruction = system_instruction
+        self._backend = backend
+        self._registry = registry
+        self._model: Optional[Any] = None
+        self.call_site = call_site
+        self.chat_session: Optional[Any] = None
+        self._initial_messages: List[Dict[str, str]] = []
+        self._messages_sent = 0
+
+    @property
+    def backend(self) -> LLMBackend:
+        # Resolved on first use, so constructing an agent never initializes a cloud SDK
+        if self._backend is None:
+            self._backend = get_default_backend()
+        return self._backend
+
+    @property
+    def model(self) -> Any:
+        if self._model is None:
+            self._model = (self._registry or get_model_registry()).get_model(self.backend, self.model_name)
+        return self._model
 
     def start_new_session(self, initial_messages: Optional[List[Dict[str, str]]] = None):
         """
         Starts a new chat session with the LLM.
         Initial messages can be provided to seed the conversation history.
+        Each message is a dict with 'role' ('user' or 'assistant'/'model') and 'content'.
         """
-        history_contents: List[Content] = []
-        if initial_messages:
-            for msg in initial_messages:
-                role = "user" if msg["role"] == "user" else "model" # Vertex AI uses 'user'/'model'
-                history_contents.append(
-                    Content(role=role, parts=[Part.from_text(msg["content"])])
-                )
-        
-        self.chat_session = self.model.start_chat(history=history_contents if history_contents else None)
+        self._initial_messages = list(initial_messages or [])
+        self._messages_sent = 0
+        self.chat_session = self.backend.start_chat(self.model, self._initial_messages, self.system_instruction)
 
     def generate_response(self, user_message: str) -> str:
         """
@@ -57,13 +72,57 @@ class LLMAgent:
         if self.chat_session is None:
             raise ValueError("Chat session has not been started. Call start_new_session() first.")
 
-        try:
-            response = self.chat_session.send_message(user_message)
-            return response.text
-        except GoogleAPIError as e:
-            print(f"Google Cloud Vertex AI API error: {e}")
-            # Consider more specific error handling or re-raising with context
-            raise
-        except Exception as e:
-            print(f"Error generating response from LLM: {e}")
-            raise
\ No newline at end of file
+        with span("llm.generate", call_site=self.call_site, backend=self.backend.name, model=self.model_name) as llm_span:
+            # Until the first message, each attempt can open its own chat from the initial messages, so retried and
+            # hedged attempts never share chat state. Later messages retry on the live chat without hedging
+            # (backends only record an exchange in the chat once it succeeded).
+            fresh = self._messages_sent == 0
+
+            def attempt(timeout_s: Optional[float]):
+                chat = self.backend.start_chat(self.model, self._initial_messages, self.system_instruction) if fresh else self.chat_session
+                # The SDK request gets the attempt's deadline too, so an abandoned attempt stops instead of running on
+                return chat, self.backend.send_message(chat, user_message, timeout_s=timeout_s)
+
+            start = time.perf_counter()
+            try:
+                self.chat_session, reply = get_upstream("llm").call(attempt, call_site=self.call_site, hedge=fresh)
+                self._messages_sent += 1
+            except UpstreamOverloadedError:
+                raise # Shed before reaching the model; not an upstream error
+            except Exception as e:
+                UPSTREAM_ERRORS.labels("llm", self.call_site).inc()
+                logger.warning("LLM call failed", extra={"backend": self.backend.name, "call_site": self.call_site, "error": str(e)})
+                raise
+            LLM_LATENCY.labels(self.call_site).observe(time.perf_counter() - start)
+            llm_span.set(prompt_tokens=reply.prompt_tokens, response_tokens=reply.response_tokens)
+        if reply.prompt_tokens is not None:
+            LLM_TOKENS.labels(self.call_site, "prompt").inc(reply.prompt_tokens)
+        if reply.response_tokens is not None:
+            LLM_TOKENS.labels(self.call_site, "response").inc(reply.response_tokens)
+        return reply.text
+
+
+    def generate_response_stream(self, user_message: str) -> Iterator[str]:
+        """
+        Generates a response from the LLM and yields it as text deltas while the model produces it.
+        The full reply is the concatenation of the yielded deltas.
+        """
+        if self.chat_session is None:
+            raise ValueError("Chat session has not been started. Call start_new_session() first.")
+
+        with span("llm.stream", call_site=self.call_site, backend=self.backend.name, model=self.model_name) as llm_span:
+            start = time.perf_counter()
+            try:
+                # Streamed replies are not retried, but they count against the LLM's rate and concurrency limits
+                with get_upstream("llm").admitted():
+                    for index, delta in enumerate(self.backend.send_message_stream(self.chat_session, user_message)):
+                        if index == 0:
+                            llm_span.set(ttft_ms=round((time.perf_counter() - start) * 1000, 1))
+                        yield delta
+            except UpstreamOverloadedError:
+                raise # Shed before reaching the model; not an upstream error
+            except Exception as e:
+                UPSTREAM_ERRORS.labels("llm", self.call_site).inc()
+                logger.warning("LLM stream failed", extra={"backend": self.backend.name, "call_site": self.call_site, "error": str(e)})
+                raise
+            LLM_LATENCY.labels(self.call_site).observe(time.perf_counter() - start)
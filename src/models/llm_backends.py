@@ -0,0 +1,335 @@
+# src/models/llm_backends.py
+
+import functools
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Protocol, Sequence, Tuple, Union
+
+from src.utils.resilience import RetryableUpstreamError
+
+@dataclass
+class LLMReply:
+    """A single model reply plus token usage, when the backend reports it."""
+    text: str
+    prompt_tokens: Optional[int] = None
+    response_tokens: Optional[int] = None
+
+class LLMBackend(Protocol):
+    """
+    The contract LLMAgent relies on. A backend turns a model_name into a model handle (shared by every
+    agent on that model), opens chats on that model with their own system instruction and sends
+    messages through a chat. Model and chat handles are opaque to the caller.
+    """
+    name: str
+
+    def create_model(self, model_name: str) -> Any: ...
+
+    def start_chat(self, model: Any, history: List[Dict[str, str]], system_instruction: Optional[str] = None) -> Any: ...
+
+    def send_message(self, chat: Any, message: str, timeout_s: Optional[float] = None) -> LLMReply: ...
+
+    def send_message_stream(self, chat: Any, message: str) -> Iterator[str]: ...
+
+    def warm_up(self) -> None: ...
+
+    @property
+    def is_warm(self) -> bool: ...
+
+
+class _TimeoutPredictionClient:
+    """
+    Forwards to a shared Vertex prediction client, adding a per-request timeout to generation calls.
+    The chat API takes no timeout argument, so this is how an attempt's deadline reaches the RPC.
+    """
+    _GENERATION_METHODS = ("generate_content", "stream_generate_content")
+
+    def __init__(self, client: Any, timeout_s: float):
+        self._client = client
+        self._timeout_s = timeout_s
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._client, name)
+        if name in self._GENERATION_METHODS:
+            return functools.partial(attribute, timeout=self._timeout_s)
+        return attribute
+
+
+class VertexBackend:
+    """Google Cloud Gemini via Vertex AI. The SDK is imported and initialized on first use."""
+    name = "vertex"
+
+    def __init__(self, project_id: Optional[str] = None, location: str = "us-central1"):
+        self.project_id = project_id
+        self.location = location
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _ensure_initialized(self):
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            import vertexai
+
+            # GCP_PROJECT_ID must be set as an environment variable (or passed explicitly).
+            project_id = self.project_id or os.getenv("GCP_PROJECT_ID")
+            if not project_id:
+                raise ValueError(
+                    "The GCP_PROJECT_ID environment variable is not set. "
+                    "Please set it to your Google Cloud Project ID."
+                )
+            vertexai.init(project=project_id, location=self.location)
+            self._initialized = True
+
+    def warm_up(self):
+        """Initializes Vertex AI and imports the generative models SDK ahead of the first request."""
+        self._ensure_initialized()
+        import vertexai.generative_models # noqa: F401 (the import itself is the slow part)
+
+    @property
+    def is_warm(self) -> bool:
+        return self._initialized
+
+    # Lazily created gRPC clients of a GenerativeModel; the expensive part of a model handle
+    _CLIENT_ATTRIBUTES = ("_prediction_client_value", "_prediction_async_client_value")
+
+    def create_model(self, model_name: str) -> Any:
+        self._ensure_initialized()
+        from vertexai.generative_models import GenerativeModel
+
+        model = GenerativeModel(model_name)
+        model._prediction_client # Build the client once here, for every chat on this model to share
+        return model
+
+    def _chat_model(self, model: Any, system_instruction: Optional[str]) -> Any:
+        # The SDK only takes a system instruction at model construction, and per-request timeouts through the
+        # client. Each chat therefore gets a thin copy of the shared handle that reuses its clients.
+        from vertexai.generative_models import GenerativeModel, Content, Part
+
+        chat_model = GenerativeModel(
+            model._model_name,
+            system_instruction=Content(parts=[Part.from_text(system_instruction)]) if system_instruction else None
+        )
+        for attribute in self._CLIENT_ATTRIBUTES:
+            client = getattr(model, attribute, None)
+            if client is not None:
+                setattr(chat_model, attribute, client)
+        chat_model._shared_prediction_client = model._prediction_client
+        return chat_model
+
+    def start_chat(self, model: Any, history: List[Dict[str, str]], system_instruction: Optional[str] = None) -> Any:
+        from vertexai.generative_models import Content, Part
+
+        model = self._chat_model(model, system_instruction)
+        history_contents = []
+        for msg in history:
+            role = "user" if msg["role"] == "user" else "model" # Vertex AI uses 'user'/'model'
+            history_contents.append(
+                Content(role=role, parts=[Part.from_text(msg["content"])])
+            )
+        return model.start_chat(history=history_contents if history_contents else None)
+
+    @staticmethod
+    def _set_timeout(chat: Any, timeout_s: Optional[float]):
+        # A chat is used by one attempt at a time, so its model copy can carry that attempt's timeout
+        chat_model = getattr(chat, "_model", None)
+        client = getattr(chat_model, "_shared_prediction_client", None)
+        if client is not None:
+            chat_model._prediction_client_value = _TimeoutPredictionClient(client, timeout_s) if timeout_s is not None else client
+
+    def send_message(self, chat: Any, message: str, timeout_s: Optional[float] = None) -> LLMReply:
+        self._set_timeout(chat, timeout_s)
+        response = chat.send_message(message)
+        usage = getattr(response, "usage_metadata", None)
+        return LLMReply(
+            text=response.text,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            response_tokens=getattr(usage, "candidates_token_count", None)
+        )
+
+    def send_message_stream(self, chat: Any, message: str) -> Iterator[str]:
+        # The chat session only records the exchange once the stream has been fully consumed
+        for chunk in chat.send_message(message, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class StubBackendError(RetryableUpstreamError):
+    """Injected failure raised by StubBackend according to its error_rate. Treated as transient, like a 503."""
+
+
+def _stub_batch_facilitation_reply(message: str) -> str:
+    # One neutral analysis per "[n] ..." statement line of a packed facilitator prompt
+    indices = [int(n) for n in re.findall(r"^\[(\d+)\] ", message, re.MULTILINE)]
+    return json.dumps({"segment_results": [
+        {"index": i, "sentiment_score": 0.1, "escalation_flag": False, "intervention": None} for i in indices
+    ]})
+
+# Replies are picked by the first rule whose marker appears in the prompt; the template is the fallback.
+# A rule's template may also be a callable taking the prompt. The default rules keep the facilitator
+# and feedback JSON parsing on their happy path.
+DEFAULT_STUB_REPLY_RULES: Tuple[Tuple[str, Union[str, Callable[[str], str]]], ...] = (
+    ("'segment_results'", _stub_batch_facilitation_reply),
+    ("'sentiment_score'", '{{"sentiment_score": 0.1, "escalation_flag": false, "intervention": null}}'),
+    ("'key_moments'", '{{"key_moments": ["Stub moment for {model_name}."], "effective_strategies": [], "areas_for_improvement": [], "suggestions": ["Ask more open questions."], "positions": "Unchanged."}}'),
+    ("'final_outcome'", '{{"final_outcome": "Partial Agreement", "feedback_summary": "Stub feedback for {model_name}.", "specific_suggestions": ["Ask more open questions."]}}'),
+)
+DEFAULT_STUB_REPLY_TEMPLATE = "[{model_name} #{turn}] I have considered your point about \"{excerpt}\" and I remain open to a fair arrangement."
+
+class _StubModel:
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+class _StubChat:
+    def __init__(self, model: _StubModel, history: List[Dict[str, str]], system_instruction: Optional[str] = None):
+        self.model = model
+        self.history = list(history)
+        self.system_instruction = system_instruction
+
+class StubBackend:
+    """
+    In-process stand-in for Vertex AI used for offline load and latency testing.
+
+    Args:
+        ttft_s: Simulated time to first token, in seconds.
+        tokens_per_s: Simulated generation rate once the first token has arrived.
+        error_rate: Probability (0.0-1.0) that a call raises StubBackendError.
+        replies: Canned replies served round-robin. Overrides the rules and template when given.
+        reply_template: str.format template with {message}, {excerpt}, {model_name}, {turn} and {system_instruction}.
+        reply_rules: (marker, template) pairs checked against the prompt before reply_template.
+        seed: Seed for the error injection RNG, for reproducible runs.
+    """
+    name = "stub"
+
+    def __init__(
+        self,
+        ttft_s: float = 0.05,
+        tokens_per_s: float = 50.0,
+        error_rate: float = 0.0,
+        replies: Optional[Sequence[str]] = None,
+        reply_template: str = DEFAULT_STUB_REPLY_TEMPLATE,
+        reply_rules: Sequence[Tuple[str, Union[str, Callable[[str], str]]]] = DEFAULT_STUB_REPLY_RULES,
+        seed: Optional[int] = None,
+    ):
+        self.ttft_s = max(0.0, ttft_s)
+        self.tokens_per_s = tokens_per_s
+        self.error_rate = error_rate
+        self.replies = list(replies) if replies else None
+        self.reply_template = reply_template
+        self.reply_rules = tuple(reply_rules)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    @classmethod
+    def from_env(cls) -> "StubBackend":
+        seed = os.getenv("STUB_LLM_SEED")
+        return cls(
+            ttft_s=float(os.getenv("STUB_LLM_TTFT_MS", "50")) / 1000,
+            tokens_per_s=float(os.getenv("STUB_LLM_TOKENS_PER_SEC", "50")),
+            error_rate=float(os.getenv("STUB_LLM_ERROR_RATE", "0")),
+            reply_template=os.getenv("STUB_LLM_REPLY_TEMPLATE", DEFAULT_STUB_REPLY_TEMPLATE),
+            seed=int(seed) if seed else None,
+        )
+
+    def warm_up(self):
+        pass
+
+    @property
+    def is_warm(self) -> bool:
+        return True
+
+    def create_model(self, model_name: str) -> Any:
+        return _StubModel(model_name)
+
+    def start_chat(self, model: Any, history: List[Dict[str, str]], system_instruction: Optional[str] = None) -> Any:
+        return _StubChat(model, history, system_instruction)
+
+    def _next_call(self) -> Tuple[int, bool]:
+        with self._lock:
+            self._calls += 1
+            return self._calls, self._rng.random() < self.error_rate
+
+    def _render(self, chat: _StubChat, message: str, call_number: int) -> str:
+        if self.replies:
+            return self.replies[(call_number - 1) % len(self.replies)]
+        template = self.reply_template
+        for marker, rule_template in self.reply_rules:
+            if marker in message:
+                if callable(rule_template):
+                    return rule_template(message)
+                template = rule_template
+                break
+        return template.format(
+            message=message,
+            excerpt=" ".join(message.split()[-8:]),
+            model_name=chat.model.model_name,
+            turn=len(chat.history) // 2 + 1,
+            system_instruction=chat.system_instruction or "",
+        )
+
+    def send_message(self, chat: Any, message: str, timeout_s: Optional[float] = None) -> LLMReply:
+        # timeout_s is accepted for parity with the real backends; simulated latency is cut short by the caller instead
+        call_number, should_fail = self._next_call()
+        time.sleep(self.ttft_s)
+        if should_fail:
+            raise StubBackendError(f"Injected stub LLM failure on call {call_number}.")
+
+        text = self._render(chat, message, call_number)
+        response_tokens = len(text.split())
+        if self.tokens_per_s > 0:
+            time.sleep(response_tokens / self.tokens_per_s)
+
+        chat.history.append({"role": "user", "content": message})
+        chat.history.append({"role": "model", "content": text})
+        return LLMReply(text=text, prompt_tokens=len(message.split()), response_tokens=response_tokens)
+
+    def send_message_stream(self, chat: Any, message: str) -> Iterator[str]:
+        call_number, should_fail = self._next_call()
+        time.sleep(self.ttft_s)
+        if should_fail:
+            raise StubBackendError(f"Injected stub LLM failure on call {call_number}.")
+
+        text = self._render(chat, message, call_number)
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if i > 0 and self.tokens_per_s > 0:
+                time.sleep(1 / self.tokens_per_s)
+            yield word if i == 0 else " " + word
+
+        chat.history.append({"role": "user", "content": message})
+        chat.history.append({"role": "model", "content": text})
+
+
+_default_backend: Optional[LLMBackend] = None
+_default_backend_lock = threading.Lock()
+
+def create_backend_from_env() -> LLMBackend:
+    """Builds the backend selected by LLM_BACKEND ('vertex', the default, or 'stub')."""
+    backend_name = os.getenv("LLM_BACKEND", "vertex").lower()
+    if backend_name == "stub":
+        return StubBackend.from_env()
+    if backend_name == "vertex":
+        return VertexBackend()
+    raise ValueError(f"Unknown LLM_BACKEND '{backend_name}'. Expected 'vertex' or 'stub'.")
+
+def get_default_backend() -> LLMBackend:
+    """Returns the process-wide backend, creating it from the environment on first use."""
+    global _default_backend
+    if _default_backend is None:
+        with _default_backend_lock:
+            if _default_backend is None:
+                _default_backend = create_backend_from_env()
+    return _default_backend
+
+def set_default_backend(backend: Optional[LLMBackend]):
+    """Overrides the process-wide backend (e.g. a StubBackend for load tests). None resets it."""
+    global _default_backend
+    with _default_backend_lock:
+        _default_backend = backend
@@ -0,0 +1,79 @@
+# src/models/model_registry.py
+
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, Optional
+
+from src.models.llm_backends import LLMBackend
+from src.utils.cache import LRUCache
+
+class ModelRegistry:
+    """
+    Bounded cache of backend model handles keyed by (backend, model_name).
+
+    Building a model (e.g. a Vertex GenerativeModel with its prediction client) is the expensive
+    part of an LLMAgent; chats are cheap. Every agent on a model therefore shares one handle, and
+    the system instruction and chat state are set per chat. A handle is built once per key: callers
+    asking for a key that is being built wait for it, while other keys are built in parallel.
+
+    Args:
+        max_models: Maximum number of model handles kept, least recently used evicted first.
+    """
+
+    def __init__(self, max_models: int = 256):
+        self._models = LRUCache(max_models)
+        self._pending: Dict[Hashable, Future] = {} # Keys being built -> their result
+        self._pending_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ModelRegistry":
+        return cls(max_models=int(os.getenv("LLM_MODEL_REGISTRY_SIZE", "256")))
+
+    def get_model(self, backend: LLMBackend, model_name: str) -> Any:
+        # Keyed on the backend object itself, so swapping the default backend never returns stale handles
+        key = (backend, model_name)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._pending_lock:
+            # Another thread may have built it meanwhile, or be building it now
+            if key in self._models:
+                return self._models.get(key)
+            pending = self._pending.get(key)
+            building = pending is None
+            if building:
+                pending = self._pending[key] = Future()
+        if not building:
+            return pending.result()
+        try:
+            model = backend.create_model(model_name)
+        except BaseException as e:
+            with self._pending_lock:
+                del self._pending[key]
+            pending.set_exception(e) # Waiters fail too; the next caller tries again
+            raise
+        with self._pending_lock:
+            self._models.put(key, model)
+            del self._pending[key]
+        pending.set_result(model)
+        return model
+
+    def clear(self):
+        self._models.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._models.stats()
+
+
+_default_registry: Optional[ModelRegistry] = None
+_default_registry_lock = threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    """Returns the process-wide model registry, sized from LLM_MODEL_REGISTRY_SIZE."""
+    global _default_registry
+    if _default_registry is None:
+        with _default_registry_lock:
+            if _default_registry is None:
+                _default_registry = ModelRegistry.from_env()
+    return _default_registry
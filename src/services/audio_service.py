@@ -1,75 +1,188 @@
 # src/services/audio_service.py
 
 import base64
-from google.cloud import speech_v1p1beta1 as speech
-from google.cloud import texttospeech_v1 as tts
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
 from google.api_core.exceptions import GoogleAPIError
 
+from src.services.audio_stubs import StubSpeechClient, StubTextToSpeechClient
+from src.services.tts_cache import TTSCache, tts_cache_key
+from src.utils.metrics import STT_LATENCY, TTS_LATENCY, UPSTREAM_ERRORS
+from src.utils.resilience import UpstreamOverloadedError, get_upstream
+from src.utils.tracing import span
+
+logger = logging.getLogger("diplomacy.audio")
+
+# The Cloud Speech/TTS modules pull in gRPC and large protobuf packages, so they are imported on first use.
+def _speech_module():
+    from google.cloud import speech_v1p1beta1 as speech
+    return speech
+
+def _tts_module():
+    from google.cloud import texttospeech_v1 as tts
+    return tts
+
+def _wait_for_channel(client: Any, timeout_s: float):
+    """Blocks until a Google Cloud client's gRPC channel is connected. No-op for clients without one."""
+    channel = getattr(getattr(client, "transport", None), "grpc_channel", None)
+    if channel is None:
+        return
+    import grpc
+    grpc.channel_ready_future(channel).result(timeout=timeout_s)
+
 class AudioService:
-    def __init__(self):
-        self.stt_client = speech.SpeechClient()
-        self.tts_client = tts.TextToSpeechClient()
+    def __init__(self, stt_client: Optional[Any] = None, tts_client: Optional[Any] = None, tts_cache: Optional[TTSCache] = None):
+        """
+        Args:
+            stt_client: Optional Speech-to-Text client override.
+            tts_client: Optional Text-to-Speech client override.
+            tts_cache: Optional synthesis cache. Defaults to one configured from TTS_CACHE_* variables.
+        When not given, AUDIO_BACKEND selects the Google Cloud clients ('google', default)
+        or the in-process stubs ('stub') used for offline load testing. Clients are created on
+        first use (or by warm_up()), so a text-only deployment never builds them.
+        """
+        self.use_stub = os.getenv("AUDIO_BACKEND", "google").lower() == "stub"
+        self._stt_client = stt_client
+        self._tts_client = tts_client
+        self._client_lock = threading.Lock()
+        self.tts_cache = tts_cache or TTSCache.from_env()
+
+    @property
+    def stt_client(self) -> Any:
+        if self._stt_client is None:
+            with self._client_lock:
+                if self._stt_client is None:
+                    self._stt_client = StubSpeechClient.from_env() if self.use_stub else _speech_module().SpeechClient()
+        return self._stt_client
+
+    @property
+    def tts_client(self) -> Any:
+        if self._tts_client is None:
+            with self._client_lock:
+                if self._tts_client is None:
+                    self._tts_client = StubTextToSpeechClient.from_env() if self.use_stub else _tts_module().TextToSpeechClient()
+        return self._tts_client
+
+    def warm_up_stt(self, timeout_s: float = 30.0):
+        """Creates the Speech-to-Text client and waits for its channel to connect."""
+        _speech_module() # Request types are needed on the first call as well
+        _wait_for_channel(self.stt_client, timeout_s)
 
-    def transcribe_audio(self, audio_content_b64: str, sample_rate_hertz: int = 44100, language_code: str = "en-US") -> str:
+    def warm_up_tts(self, timeout_s: float = 30.0):
+        """Creates the Text-to-Speech client and waits for its channel to connect."""
+        _tts_module()
+        _wait_for_channel(self.tts_client, timeout_s)
+
+    def warm_status(self) -> Dict[str, bool]:
+        """Which audio clients have been created so far."""
+        return {"stt": self._stt_client is not None, "tts": self._tts_client is not None}
+
+    def transcribe_audio(self, audio_content_b64: str, sample_rate_hertz: int = 44100, language_code: str = "en-US", call_site: str = "default") -> str:
         """
         Converts base64 encoded audio to text using Google Cloud Speech-to-Text.
+        Kept for JSON clients; binary uploads should call transcribe_audio_bytes directly.
+        """
+        return self.transcribe_audio_bytes(base64.b64decode(audio_content_b64), sample_rate_hertz, language_code, call_site)
+
+    def transcribe_audio_bytes(self, audio_content_bytes: bytes, sample_rate_hertz: int = 44100, language_code: str = "en-US", call_site: str = "default") -> str:
+        """
+        Converts raw audio bytes to text using Google Cloud Speech-to-Text.
         Assumes audio is in MP3 format for simplicity from frontend (Streamlit mic recorder).
         """
-        try:
-            audio_content_bytes = base64.b64decode(audio_content_b64)
-            audio = speech.RecognitionAudio(content=audio_content_bytes)
-            
-            # Using MP3 encoding as it's common for web-captured audio
-            config = speech.RecognitionConfig(
-                encoding=speech.RecognitionConfig.AudioEncoding.MP3, 
-                sample_rate_hertz=sample_rate_hertz,
-                language_code=language_code,
-                enable_automatic_punctuation=True,
-            )
-            
-            response = self.stt_client.recognize(config=config, audio=audio)
-            
-            if response.results:
-                transcript = response.results[0].alternatives[0].transcript
-                print(f"Transcribed audio: {transcript}")
-                return transcript
-            return ""
-        except GoogleAPIError as e:
-            print(f"Google Cloud Speech-to-Text API error: {e}")
-            raise
-        except Exception as e:
-            print(f"Error transcribing audio: {e}")
-            raise
-
-    def synthesize_speech(self, text: str, language_code: str = "en-US", voice_name: str = "en-US-Neural2-C") -> str:
+        with span("stt.transcribe", call_site=call_site, audio_bytes=len(audio_content_bytes)) as stt_span:
+            try:
+                speech = _speech_module()
+                audio = speech.RecognitionAudio(content=audio_content_bytes)
+                
+                # Using MP3 encoding as it's common for web-captured audio
+                config = speech.RecognitionConfig(
+                    encoding=speech.RecognitionConfig.AudioEncoding.MP3, 
+                    sample_rate_hertz=sample_rate_hertz,
+                    language_code=language_code,
+                    enable_automatic_punctuation=True,
+                )
+                
+                start = time.perf_counter()
+                # Deadline, retries, hedging and circuit breaking come from the shared upstream policy
+                response = get_upstream("stt").call(
+                    lambda timeout_s: self.stt_client.recognize(config=config, audio=audio, timeout=timeout_s),
+                    call_site=call_site
+                )
+                STT_LATENCY.labels(call_site).observe(time.perf_counter() - start)
+                
+                if response.results:
+                    transcript = response.results[0].alternatives[0].transcript
+                    stt_span.set(chars=len(transcript))
+                    logger.debug("Transcribed audio", extra={"call_site": call_site, "transcript": transcript})
+                    return transcript
+                stt_span.set(chars=0)
+                return ""
+            except UpstreamOverloadedError:
+                raise # Shed by the limiter before reaching the API
+            except GoogleAPIError as e:
+                UPSTREAM_ERRORS.labels("stt", call_site).inc()
+                logger.warning("Google Cloud Speech-to-Text API error", extra={"call_site": call_site, "error": str(e)})
+                raise
+            except Exception as e:
+                UPSTREAM_ERRORS.labels("stt", call_site).inc()
+                logger.warning("Error transcribing audio", extra={"call_site": call_site, "error": str(e)})
+                raise
+
+    def synthesize_speech(self, text: str, language_code: str = "en-US", voice_name: str = "en-US-Neural2-C", call_site: str = "default") -> str:
         """
         Converts text to base64 encoded audio (MP3) using Google Cloud Text-to-Speech.
+        Kept for JSON clients; binary responses should call synthesize_speech_bytes directly.
+        """
+        return base64.b64encode(self.synthesize_speech_bytes(text, language_code, voice_name, call_site)).decode('utf-8')
+
+    def synthesize_speech_bytes(self, text: str, language_code: str = "en-US", voice_name: str = "en-US-Neural2-C", call_site: str = "default") -> bytes:
         """
-        try:
-            synthesis_input = tts.SynthesisInput(text=text)
-            
-            # Select a voice (Neural2 voices are high quality)
-            voice = tts.VoiceSelectionParams(
-                language_code=language_code,
-                name=voice_name,
-                ssml_gender=tts.SsmlVoiceGender.NEUTRAL,
-            )
-            
-            # Select the type of audio file to return
-            audio_config = tts.AudioConfig(
-                audio_encoding=tts.AudioEncoding.MP3
-            )
-            
-            response = self.tts_client.synthesize_speech(
-                input=synthesis_input, voice=voice, audio_config=audio_config
-            )
-            
-            audio_content_b64 = base64.b64encode(response.audio_content).decode('utf-8')
-            print(f"Synthesized speech for text: {text[:50]}...") # Print first 50 chars
-            return audio_content_b64
-        except GoogleAPIError as e:
-            print(f"Google Cloud Text-to-Speech API error: {e}")
-            raise
-        except Exception as e:
-            print(f"Error synthesizing speech: {e}")
-            raise
\ No newline at end of file
+        Converts text to MP3 audio bytes using Google Cloud Text-to-Speech.
+        Identical requests are served from the TTS cache without calling the API.
+        """
+        with span("tts.synthesize", call_site=call_site, chars=len(text)) as tts_span:
+            cache_key = tts_cache_key(text, language_code, voice_name, "MP3")
+            cached_audio = self.tts_cache.get(cache_key)
+            tts_span.set(cache_hit=cached_audio is not None)
+            if cached_audio is not None:
+                return cached_audio
+
+            try:
+                tts = _tts_module()
+                synthesis_input = tts.SynthesisInput(text=text)
+                
+                # Select a voice (Neural2 voices are high quality)
+                voice = tts.VoiceSelectionParams(
+                    language_code=language_code,
+                    name=voice_name,
+                    ssml_gender=tts.SsmlVoiceGender.NEUTRAL,
+                )
+                
+                # Select the type of audio file to return
+                audio_config = tts.AudioConfig(
+                    audio_encoding=tts.AudioEncoding.MP3
+                )
+                
+                start = time.perf_counter()
+                response = get_upstream("tts").call(
+                    lambda timeout_s: self.tts_client.synthesize_speech(input=synthesis_input, voice=voice, audio_config=audio_config, timeout=timeout_s),
+                    call_site=call_site
+                )
+                TTS_LATENCY.labels(call_site).observe(time.perf_counter() - start)
+                
+                self.tts_cache.put(cache_key, response.audio_content)
+                logger.debug("Synthesized speech", extra={"call_site": call_site, "text": text[:50]}) # First 50 chars
+                return response.audio_content
+            except UpstreamOverloadedError:
+                raise # Shed by the limiter before reaching the API
+            except GoogleAPIError as e:
+                UPSTREAM_ERRORS.labels("tts", call_site).inc()
+                logger.warning("Google Cloud Text-to-Speech API error", extra={"call_site": call_site, "error": str(e)})
+                raise
+            except Exception as e:
+                UPSTREAM_ERRORS.labels("tts", call_site).inc()
+                logger.warning("Error synthesizing speech", extra={"call_site": call_site, "error": str(e)})
+                raise
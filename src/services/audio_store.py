@@ -0,0 +1,44 @@
+# src/services/audio_store.py
+
+import os
+import uuid
+from typing import Optional, Tuple
+
+from src.utils.cache import LRUCache
+
+class AudioStore:
+    """
+    Short-lived, size-bounded store for synthesized audio, so responses can reference audio by ID
+    (GET /audio/{audio_id}) instead of inlining base64 blobs.
+
+    Clips live in the memory of the process that synthesized them. With several workers or replicas
+    (uvicorn --workers N, SESSION_BACKEND=sqlite/redis) route a client's requests to the same process
+    (sticky sessions), or have clients request inline audio instead.
+
+    Args:
+        max_bytes: Total audio bytes kept; the least recently fetched clips are dropped first.
+        ttl_s: Seconds a clip stays fetchable after it was stored; expired clips are dropped as new ones arrive.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20, ttl_s: float = 900.0):
+        self.ttl_s = ttl_s
+        # Entry count is effectively unbounded; the byte budget is what matters for audio
+        self._clips = LRUCache(max_entries=2**31, max_bytes=max_bytes, size_fn=lambda clip: len(clip[0]), ttl_s=ttl_s)
+
+    @classmethod
+    def from_env(cls) -> "AudioStore":
+        return cls(
+            max_bytes=int(os.getenv("AUDIO_STORE_MAX_BYTES", str(256 * 2**20))),
+            ttl_s=float(os.getenv("AUDIO_STORE_TTL_S", "900")),
+        )
+
+    def put(self, audio_bytes: bytes, media_type: str = "audio/mpeg") -> str:
+        audio_id = uuid.uuid4().hex
+        self._clips.put(audio_id, (audio_bytes, media_type))
+        return audio_id
+
+    def get(self, audio_id: str) -> Optional[Tuple[bytes, str]]:
+        return self._clips.get(audio_id)
+
+    def stats(self):
+        return self._clips.stats()
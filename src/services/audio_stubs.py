@@ -0,0 +1,43 @@
+# src/services/audio_stubs.py
+
+import os
+import time
+from types import SimpleNamespace
+
+# In-process stand-ins for the Google Cloud Speech-to-Text and Text-to-Speech clients.
+# They expose the same call shapes AudioService uses, so offline load tests exercise the
+# real request building and response handling code without any network access.
+
+class StubSpeechClient:
+    """Mimics speech.SpeechClient.recognize with a fixed latency and transcript."""
+
+    def __init__(self, latency_s: float = 0.1, transcript: str = "I would like to discuss a fair deal for both sides."):
+        self.latency_s = latency_s
+        self.transcript = transcript
+
+    @classmethod
+    def from_env(cls) -> "StubSpeechClient":
+        return cls(latency_s=float(os.getenv("STUB_STT_LATENCY_MS", "100")) / 1000)
+
+    def recognize(self, config=None, audio=None, timeout=None):
+        time.sleep(self.latency_s)
+        alternative = SimpleNamespace(transcript=self.transcript, confidence=0.9)
+        return SimpleNamespace(results=[SimpleNamespace(alternatives=[alternative])])
+
+
+class StubTextToSpeechClient:
+    """Mimics tts.TextToSpeechClient.synthesize_speech, returning bytes sized like real MP3 output."""
+
+    def __init__(self, latency_s: float = 0.1, bytes_per_char: int = 100):
+        self.latency_s = latency_s
+        self.bytes_per_char = bytes_per_char
+
+    @classmethod
+    def from_env(cls) -> "StubTextToSpeechClient":
+        return cls(latency_s=float(os.getenv("STUB_TTS_LATENCY_MS", "100")) / 1000)
+
+    def synthesize_speech(self, input=None, voice=None, audio_config=None, timeout=None):
+        time.sleep(self.latency_s)
+        text = getattr(input, "text", "") or ""
+        # ~12 kB per second of 96 kbps MP3, roughly 8 characters of speech per second
+        return SimpleNamespace(audio_content=b"\xff\xfb" * max(1, len(text) * self.bytes_per_char // 2))
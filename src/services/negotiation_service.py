@@ -1,147 +1,498 @@
 # src/services/negotiation_service.py
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Tuple
+import asyncio
+import base64
+import functools
 import json
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
 import uuid
+import weakref
+from contextlib import asynccontextmanager
 
 # Import the updated LLMAgent and the new AudioService
 from src.models.llm_agent import LLMAgent
 from src.services.audio_service import AudioService # NEW
+from src.services.audio_store import AudioStore
+from src.services.session_store import SessionConflictError, SessionStore, create_session_store_from_env
+from src.utils.cache import LRUCache
+from src.utils.metrics import FACILITATOR_ANSWERS
+from src.utils.resilience import Reservation, UpstreamOverloadedError, get_upstream, request_budget
+from src.utils.sentiment_lexicon import LexiconSentimentScorer
+from src.utils.text_chunking import SentenceChunker
+from src.utils.tracing import current_trace_id, span, start_trace
+from src.utils.worker_pools import run_in_pool
+
+logger = logging.getLogger("diplomacy.negotiation")
+
+# Upper bound on how many AI negotiators are processed (LLM + TTS) at the same time within one turn.
+DEFAULT_MAX_CONCURRENT_AGENTS = int(os.getenv("MAX_CONCURRENT_AGENTS", "4"))
+# Upper bound on concurrent sentence synthesis calls within one streamed turn.
+DEFAULT_MAX_CONCURRENT_TTS_SEGMENTS = int(os.getenv("MAX_CONCURRENT_TTS_SEGMENTS", "6"))
+# Batch facilitation packs this many segments into one LLM request...
+DEFAULT_FACILITATOR_BATCH_SIZE = int(os.getenv("FACILITATOR_BATCH_SIZE", "10"))
+# ...and keeps at most this many of those requests in flight per batch.
+DEFAULT_MAX_CONCURRENT_FACILITATOR_CALLS = int(os.getenv("MAX_CONCURRENT_FACILITATOR_CALLS", "4"))
+# Optional local lexicon tier in front of the facilitator LLM (off by default: it trades some accuracy for latency).
+# Only short single-statement messages with positive cues, no escalation, sarcasm, conditional or imperative cues
+# and a lexicon score of at least the threshold are answered locally; everything else goes to the LLM.
+DEFAULT_FACILITATOR_FAST_PATH = os.getenv("FACILITATOR_FAST_PATH", "0").lower() in ("1", "true", "yes", "on")
+DEFAULT_FACILITATOR_FAST_PATH_THRESHOLD = float(os.getenv("FACILITATOR_FAST_PATH_THRESHOLD", "0.5"))
+DEFAULT_FACILITATOR_FAST_PATH_MAX_WORDS = int(os.getenv("FACILITATOR_FAST_PATH_MAX_WORDS", "12"))
+# LLM facilitator results are cached by normalized message text; bump the version whenever the analysis prompts change.
+FACILITATOR_PROMPT_VERSION = "1"
+DEFAULT_FACILITATOR_CACHE_MAX_ENTRIES = int(os.getenv("FACILITATOR_CACHE_MAX_ENTRIES", "4096"))
+DEFAULT_FACILITATOR_CACHE_TTL_S = float(os.getenv("FACILITATOR_CACHE_TTL_S", "3600"))
+
+# Entering one of these session statuses starts feedback generation in the background.
+FEEDBACK_TRIGGER_STATUSES = ("ended", "agreement_proposed")
+# A failed feedback job is kept this long for get_feedback to report, then forgotten so the next request retries.
+FEEDBACK_FAILURE_RETENTION_S = 60.0
+# Longer transcripts are split into windows of about this many (estimated) tokens, analyzed concurrently and merged.
+DEFAULT_FEEDBACK_WINDOW_TOKENS = int(os.getenv("FEEDBACK_WINDOW_TOKENS", "3000"))
+DEFAULT_MAX_CONCURRENT_FEEDBACK_WINDOWS = int(os.getenv("MAX_CONCURRENT_FEEDBACK_WINDOWS", "4"))
+
+# Rolling summarization: once the not-yet-summarized history exceeds this many (estimated) tokens, older turns are
+# folded into a running summary in the background, keeping the most recent turns verbatim. 0 disables it.
+DEFAULT_CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "2000"))
+DEFAULT_SUMMARY_KEEP_RECENT_TURNS = int(os.getenv("SUMMARY_KEEP_RECENT_TURNS", "6"))
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about 4 characters per token for English), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_facilitator_message(message: str) -> str:
+    """Folds case, Unicode compatibility forms, punctuation and whitespace, so near-identical messages share a cache entry."""
+    folded = unicodedata.normalize("NFKC", message).casefold()
+    return _WHITESPACE.sub(" ", _NON_WORD.sub(" ", folded)).strip()
 
 class NegotiationService:
-    def __init__(self, llm_agent: LLMAgent, audio_service: AudioService): # MODIFIED
+    def __init__(self, llm_agent: LLMAgent, audio_service: AudioService, max_concurrent_agents: int = DEFAULT_MAX_CONCURRENT_AGENTS, max_concurrent_tts_segments: int = DEFAULT_MAX_CONCURRENT_TTS_SEGMENTS, audio_store: Optional[AudioStore] = None, session_store: Optional[SessionStore] = None, facilitator_batch_size: int = DEFAULT_FACILITATOR_BATCH_SIZE, max_concurrent_facilitator_calls: int = DEFAULT_MAX_CONCURRENT_FACILITATOR_CALLS, sentiment_scorer: Optional[LexiconSentimentScorer] = None, fast_path: Optional[bool] = None, fast_path_threshold: float = DEFAULT_FACILITATOR_FAST_PATH_THRESHOLD, fast_path_max_words: int = DEFAULT_FACILITATOR_FAST_PATH_MAX_WORDS, facilitator_cache: Optional[LRUCache] = None, conversation_token_budget: int = DEFAULT_CONVERSATION_TOKEN_BUDGET, summary_keep_recent_turns: int = DEFAULT_SUMMARY_KEEP_RECENT_TURNS, feedback_window_tokens: int = DEFAULT_FEEDBACK_WINDOW_TOKENS, max_concurrent_feedback_windows: int = DEFAULT_MAX_CONCURRENT_FEEDBACK_WINDOWS): # MODIFIED
         self.llm_agent = llm_agent
         self.audio_service = audio_service # NEW: Inject AudioService
-        self.sessions: Dict[str, Dict[str, Any]] = {}
+        # Synthesized replies are kept here and referenced by ID instead of being inlined as base64
+        self.audio_store = audio_store if audio_store is not None else AudioStore.from_env()
+        # Bounded store with idle TTL and LRU eviction (SESSION_* variables); SESSION_BACKEND=sqlite/redis
+        # shares sessions between worker processes, so any worker can serve any turn
+        self.session_store = session_store if session_store is not None else create_session_store_from_env()
+        # Caps the per-turn fan-out so a large panel of negotiators cannot flood the upstream APIs
+        self.max_concurrent_agents = max(1, max_concurrent_agents)
+        self.max_concurrent_tts_segments = max(1, max_concurrent_tts_segments)
+        self.facilitator_batch_size = max(1, facilitator_batch_size)
+        self.max_concurrent_facilitator_calls = max(1, max_concurrent_facilitator_calls)
+        # None disables the local fast path, so every facilitation goes to the LLM
+        # fast_path=False always disables the lexicon tier; None enables it when a scorer is given, else follows FACILITATOR_FAST_PATH
+        if fast_path is None:
+            fast_path = sentiment_scorer is not None or DEFAULT_FACILITATOR_FAST_PATH
+        self.sentiment_scorer = (sentiment_scorer if sentiment_scorer is not None else LexiconSentimentScorer()) if fast_path else None
+        self.fast_path_threshold = fast_path_threshold
+        self.fast_path_max_words = fast_path_max_words
+        # Successful LLM analyses, keyed by (prompt version, normalized message); FACILITATOR_CACHE_MAX_ENTRIES=0 disables it
+        self.facilitator_cache = facilitator_cache if facilitator_cache is not None else LRUCache(DEFAULT_FACILITATOR_CACHE_MAX_ENTRIES, ttl_s=DEFAULT_FACILITATOR_CACHE_TTL_S)
+        self.conversation_token_budget = conversation_token_budget
+        self.summary_keep_recent_turns = max(1, summary_keep_recent_turns)
+        self.feedback_window_tokens = max(1, feedback_window_tokens)
+        self.max_concurrent_feedback_windows = max(1, max_concurrent_feedback_windows)
+        self._summary_tasks: Dict[str, asyncio.Task] = {} # At most one background summarization per session
+        self._feedback_tasks: Dict[str, Tuple[int, asyncio.Task]] = {} # session_id -> (history_version, feedback job)
+        self._session_backend = type(self.session_store).__name__ # Span attribute for session load/save
         self.persona_prompts = {
             "hardliner": "You are a hardline negotiator. Your goal is to cede no ground and maximize your nation's gains, even at the risk of escalating tensions. Stick firmly to your initial stance and historical claims. Do not compromise easily.",
             "compromiser": "You are a pragmatic compromiser. Your goal is to find common ground and achieve a mutually beneficial resolution, avoiding escalation. Be open to flexible solutions and resource sharing.",
             "emotional_stakeholder": "You represent the deeply affected populace. Your goal is to ensure the safety, cultural heritage, and livelihoods of the people in the disputed zone are protected. Emphasize human suffering and the need for justice, appealing to empathy."
         }
 
-    def start_negotiation(self, scenario_id: str, user_persona: str, ai_negotiators: List[Dict[str, str]]):
-        session_id = str(uuid.uuid4())
+    async def start_negotiation(self, scenario_id: str, user_persona: str, ai_negotiators: List[Dict[str, str]]):
+        with span("start_negotiation", scenario_id=scenario_id, agents=len(ai_negotiators)) as start_span:
+            session_id = str(uuid.uuid4())
+            start_span.set(session_id=session_id)
         
-        # Initialize LLM for each AI persona
-        ai_llm_configs = {}
-        initial_ai_responses = []
-
-        # Prepare system instructions for each AI agent
-        system_instructions_map = {}
-        for ai_info in ai_negotiators:
-            persona_type = ai_info["persona_type"]
-            initial_stance = ai_info["initial_stance"]
-            base_prompt = self.persona_prompts.get(persona_type, "You are a negotiator.")
-            full_prompt = f"{base_prompt} Your initial stance: '{initial_stance}'."
-            system_instructions_map[ai_info["id"]] = full_prompt
-
-        # Start LLM sessions for each AI and get initial greetings
-        for ai_info in ai_negotiators:
-            ai_id = ai_info["id"]
-            # A new LLMAgent instance for each AI, passing system instructions at initialization
-            ai_llm_instance = LLMAgent(system_instruction=system_instructions_map[ai_id])
-            
-            # Start session with initial context (system instructions will be part of the first prompt)
-            # System instructions are now handled by the model itself.
-            ai_llm_instance.start_new_session() 
-            ai_llm_configs[ai_id] = ai_llm_instance
-
-            # Generate initial greeting from AI based on its stance
-            greeting_prompt = f"As the {ai_info['persona_type']} representing {ai_id}, provide a brief opening statement to the user representing {user_persona} about this negotiation."
-            try:
-                greeting_message = ai_llm_instance.generate_response(greeting_prompt)
-                initial_ai_responses.append({
-                    "speaker_id": ai_id,
-                    "message": greeting_message
-                })
-            except Exception as e:
-                print(f"Error generating initial greeting for {ai_id}: {e}")
-                initial_ai_responses.append({
-                    "speaker_id": ai_id,
-                    "message": f"Error: Could not generate initial greeting. ({e})"
-                })
-
-
-        self.sessions[session_id] = {
-            "scenario_id": scenario_id,
-            "user_persona": user_persona,
-            "ai_negotiators": ai_negotiators,
-            "ai_llm_configs": ai_llm_configs, # Store LLM instances
-            "conversation_history": [], # Store all text turns
-            "current_status": "ongoing",
-            "agreed_points": [],
-            "next_action_hint": "Please make your opening statement."
-        }
+            # Prepare system instructions for each AI agent
+            system_instructions_map = {}
+            for ai_info in ai_negotiators:
+                persona_type = ai_info["persona_type"]
+                initial_stance = ai_info["initial_stance"]
+                base_prompt = self.persona_prompts.get(persona_type, "You are a negotiator.")
+                # Persona, identity and stance are stated once here; turn prompts only carry new messages
+                full_prompt = f"{base_prompt} You speak for {ai_info['id']}. Your initial stance: '{initial_stance}'."
+                system_instructions_map[ai_info["id"]] = full_prompt
+
+            # Start LLM sessions for each AI and get initial greetings, all agents at once
+            agent_semaphore = asyncio.Semaphore(self.max_concurrent_agents)
+            async with self._agent_fan_out(len(ai_negotiators)):
+                agent_results = await self._gather_or_shed([
+                    self._start_agent(ai_info, system_instructions_map[ai_info["id"]], user_persona, agent_semaphore)
+                    for ai_info in ai_negotiators
+                ])
+
+            # Keep each agent as a compact transcript; live chat objects are rebuilt per turn (gather() keeps negotiator order)
+            agent_transcripts = {}
+            initial_ai_responses = []
+            for turn_index, (ai_info, (transcript, greeting_response)) in enumerate(zip(ai_negotiators, agent_results)):
+                for entry in transcript:
+                    entry["turn_index"] = turn_index # Position of the greeting in conversation_history
+                agent_transcripts[ai_info["id"]] = transcript
+                initial_ai_responses.append(greeting_response)
+
+            session = {
+                "scenario_id": scenario_id,
+                "user_persona": user_persona,
+                "ai_negotiators": ai_negotiators,
+                "system_instructions": system_instructions_map, # Persona + stance per agent
+                "agent_transcripts": agent_transcripts, # Per-agent chat history as plain role/content dicts
+                "agent_cursors": {ai_info["id"]: 0 for ai_info in ai_negotiators}, # First history index each agent has not seen yet
+                "conversation_history": [], # Store all text turns
+                "summary": "", # Running summary of conversation_history[:summarized_turns]
+                "summarized_turns": 0,
+                "history_version": 0, # Bumped on every turn; keys the stored feedback
+                "current_status": "ongoing",
+                "agreed_points": [],
+                "next_action_hint": "Please make your opening statement."
+            }
         
-        # Add initial AI responses to history
-        self.sessions[session_id]["conversation_history"].extend(initial_ai_responses)
+            # Add initial AI responses to history
+            session["conversation_history"].extend(initial_ai_responses)
+            await self._save_session(session_id, session)
+
+            return {
+                "session_id": session_id,
+                "ai_responses": initial_ai_responses,
+                **self._status_payload(session)
+            }
+
+    async def take_turn(self, session_id: str, speaker_id: str, message: Optional[str] = None, audio_input_b64: Optional[str] = None, audio_input: Optional[bytes] = None, inline_audio: bool = False): # MODIFIED
+        """
+        Processes a user's turn (text, base64 audio or raw audio bytes) and returns every AI negotiator's reply.
+        Reply audio is returned as an audio_id/audio_url; inline_audio=True also inlines it as base64 (legacy clients).
+        """
+        with span("take_turn", session_id=session_id, speaker_id=speaker_id) as turn_span:
+            session = await self._get_session(session_id)
+            base_version = session.get("history_version", 0)
+            # Admit the whole turn up front: shed it now rather than after some agents already ran
+            async with self._agent_fan_out(len(session["ai_negotiators"])):
+                # --- Handle User Input (Text or Audio) ---
+                user_text_message, error_response = await self._resolve_user_input(session, message, audio_input_b64, audio_input)
+                if error_response:
+                    return error_response
+
+                # Record user's turn in history
+                session["conversation_history"].append({"speaker_id": speaker_id, "message": user_text_message})
+
+                # Fan out to every AI negotiator at once; gather() keeps the results in negotiator order
+                agent_semaphore = asyncio.Semaphore(self.max_concurrent_agents)
+                turn_prompts = self._build_turn_prompts(session)
+                turn_span.set(agents=len(turn_prompts))
+                seen_until = len(session["conversation_history"]) # Agents that reply have now seen everything up to the user's turn
+                # A shed or cancelled turn never reaches the save below, so it leaves no trace and the client can retry it
+                agent_results = await self._gather_or_shed([
+                    self._run_agent_turn(ai_info["id"], self._agent_factory(session, ai_info["id"]), turn_prompt, agent_semaphore, inline_audio)
+                    for ai_info, turn_prompt in turn_prompts
+                ])
+
+                # Record AI turns in history in a stable order, skipping agents that failed
+                ai_responses_data = []
+                for (ai_info, turn_prompt), (ai_response, succeeded) in zip(turn_prompts, agent_results):
+                    ai_responses_data.append(ai_response)
+                    if succeeded:
+                        self._record_agent_reply(session, ai_info["id"], turn_prompt, ai_response["message"], seen_until)
+
+                session["history_version"] = base_version + 1
+                previous_status = session["current_status"]
+                self._update_status(session, user_text_message)
+                if not await self._save_session(session_id, session, expected_version=base_version):
+                    raise SessionConflictError("The session was updated by another turn; please retry.")
+                self._maybe_schedule_summary(session_id, session)
+                self._maybe_schedule_feedback(session_id, session, previous_status)
+
+                return {
+                    "ai_responses": ai_responses_data,
+                    **self._status_payload(session)
+                }
+
+    async def stream_turn(self, session_id: str, speaker_id: str, message: Optional[str] = None, audio_input_b64: Optional[str] = None, audio_input: Optional[bytes] = None, inline_audio: bool = False) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of take_turn. Validates the session and resolves the user input up front,
+        then returns an async iterator of (event, data) pairs:
+            user_turn       the (transcribed) user message
+            agent_delta     a chunk of an agent's reply as the model produces it
+            audio_segment   synthesized audio for the next sentence(s) of an agent's reply, in order
+            agent_finished  an agent's complete reply
+            agent_audio_done  all audio segments of an agent have been sent; includes timing
+            agent_error     an agent that failed this turn
+            status          the session status after the turn (always last)
+        """
+        session = await self._get_session(session_id)
+        # Admit the whole turn before any work starts, so an overloaded turn is still a plain 429
+        reservation = await self._reserve_agent_calls(len(session["ai_negotiators"]))
+        try:
+            user_text_message, error_response = await self._resolve_user_input(session, message, audio_input_b64, audio_input)
+        except BaseException:
+            reservation.release()
+            raise
+        if error_response:
+            reservation.release()
+            return self._single_event("status", error_response)
+
+        # The user turn is only staged for the prompts: it enters the session together with the replies once the
+        # stream completes, so a client that disconnects (or a cancelled stream) leaves the session untouched
+        session["conversation_history"].append({"speaker_id": speaker_id, "message": user_text_message})
+        turn_prompts = self._build_turn_prompts(session)
+        seen_until = len(session["conversation_history"])
+        session["conversation_history"].pop()
+        events = self._stream_turn_events(session_id, session, speaker_id, user_text_message, turn_prompts, seen_until, inline_audio, reservation)
+        weakref.finalize(events, reservation.release) # A stream that is never iterated never reaches its own release
+        return events
+
+    async def _stream_turn_events(self, session_id: str, session: Dict[str, Any], speaker_id: str, user_text_message: str, turn_prompts, seen_until: int, inline_audio: bool, reservation: Reservation):
+        agent_tasks = []
+        try:
+            yield "user_turn", {"speaker_id": speaker_id, "message": user_text_message}
+
+            queue: asyncio.Queue = asyncio.Queue()
+            agent_semaphore = asyncio.Semaphore(self.max_concurrent_agents)
+            tts_semaphore = asyncio.Semaphore(self.max_concurrent_tts_segments)
+            with reservation.use(): # The agent tasks inherit it
+                agent_tasks = [
+                    asyncio.create_task(self._stream_agent_turn(ai_info["id"], self._agent_factory(session, ai_info["id"]), turn_prompt, agent_semaphore, tts_semaphore, queue, inline_audio))
+                    for ai_info, turn_prompt in turn_prompts
+                ]
+            all_done = asyncio.gather(*agent_tasks)
+            all_done.add_done_callback(lambda _: queue.put_nowait(None))
+
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            # The client may disconnect mid-stream; don't leave agents running for nobody
+            for task in agent_tasks:
+                task.cancel()
+            reservation.release()
+
+        # Commit the staged user turn, then the AI turns in a stable order, skipping agents that failed
+        session["conversation_history"].append({"speaker_id": speaker_id, "message": user_text_message})
+        for (ai_info, turn_prompt), task in zip(turn_prompts, agent_tasks):
+            if not task.cancelled() and task.result() is not None:
+                ai_id, ai_response_text = task.result()
+                self._record_agent_reply(session, ai_id, turn_prompt, ai_response_text, seen_until)
 
+        base_version = session.get("history_version", 0)
+        session["history_version"] = base_version + 1
+        previous_status = session["current_status"]
+        self._update_status(session, user_text_message)
+        if not await self._save_session(session_id, session, expected_version=base_version):
+            raise SessionConflictError("The session was updated by another turn; please retry.")
+        self._maybe_schedule_summary(session_id, session)
+        self._maybe_schedule_feedback(session_id, session, previous_status)
+        yield "status", self._status_payload(session)
+
+    async def _stream_agent_turn(self, ai_id: str, make_agent: Callable[[], LLMAgent], turn_prompt: str, semaphore: asyncio.Semaphore, tts_semaphore: asyncio.Semaphore, queue: asyncio.Queue, inline_audio: bool):
+        """
+        Streams one agent's reply into the shared event queue. Complete sentences are sent to TTS
+        while the model is still generating, and their audio is emitted as ordered segments.
+        Returns (ai_id, reply) on success and None on failure.
+        """
+        with span("agent_stream_turn", ai_id=ai_id):
+            async with semaphore:
+                loop = asyncio.get_running_loop()
+                started = time.perf_counter()
+                timing = {"ttft_ms": None, "first_audio_ms": None, "llm_ms": None, "audio_tail_ms": None, "total_ms": None}
+                chunker = SentenceChunker()
+                segment_tasks: asyncio.Queue = asyncio.Queue() # Synthesis tasks in text order; None ends the stream
+
+                def schedule_segment(text: str):
+                    segment_tasks.put_nowait((text, asyncio.create_task(self._synthesize_segment(text, tts_semaphore, inline_audio))))
+
+                def on_delta(delta: str):
+                    # Runs on the event loop, in the order the deltas were produced
+                    queue.put_nowait(("agent_delta", {"speaker_id": ai_id, "delta": delta}))
+                    for sentence in chunker.feed(delta):
+                        schedule_segment(sentence)
+
+                def produce() -> str:
+                    # Runs in a worker thread; hands each delta to the event loop as soon as it arrives
+                    parts = []
+                    for delta in make_agent().generate_response_stream(turn_prompt):
+                        if not parts:
+                            timing["ttft_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                        parts.append(delta)
+                        loop.call_soon_threadsafe(on_delta, delta)
+                    return "".join(parts)
+
+                async def emit_segments() -> int:
+                    # Segments are synthesized concurrently but emitted strictly in text order
+                    index = 0
+                    while True:
+                        item = await segment_tasks.get()
+                        if item is None:
+                            return index
+                        text, task = item
+                        try:
+                            audio_fields = await task
+                            if timing["first_audio_ms"] is None:
+                                timing["first_audio_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                        except Exception as e:
+                            logger.warning("Error synthesizing audio segment", extra={"ai_id": ai_id, "error": str(e)})
+                            audio_fields = self._audio_fields(None, inline_audio)
+                        await queue.put(("audio_segment", {"speaker_id": ai_id, "index": index, "text": text, **audio_fields}))
+                        index += 1
+
+                emitter = asyncio.create_task(emit_segments())
+                try:
+                    ai_response_text = await run_in_pool("llm", produce)
+                except Exception as e:
+                    logger.warning("Error streaming AI response", extra={"ai_id": ai_id, "error": str(e)})
+                    await queue.put(("agent_error", {"speaker_id": ai_id, "message": f"Error: Could not generate response. ({e})"}))
+                    segment_tasks.put_nowait(None)
+                    await emitter
+                    return None
+                except asyncio.CancelledError:
+                    emitter.cancel()
+                    raise
+                llm_done = time.perf_counter()
+                timing["llm_ms"] = round((llm_done - started) * 1000, 1)
+
+                # Produce() returned, so every delta callback was already queued on the loop ahead of us
+                remainder = chunker.flush()
+                if remainder:
+                    schedule_segment(remainder)
+                segment_tasks.put_nowait(None)
+                await queue.put(("agent_finished", {"speaker_id": ai_id, "message": ai_response_text, "timing": timing}))
+
+                segment_count = await emitter
+                # Audio still outstanding after the last token; most synthesis overlapped with generation
+                timing["audio_tail_ms"] = round((time.perf_counter() - llm_done) * 1000, 1)
+                timing["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                await queue.put(("agent_audio_done", {"speaker_id": ai_id, "segments": segment_count, "timing": timing}))
+                return ai_id, ai_response_text
+
+    async def _synthesize_segment(self, text: str, tts_semaphore: asyncio.Semaphore, inline_audio: bool) -> Dict[str, Optional[str]]:
+        async with tts_semaphore:
+            audio_bytes = await run_in_pool("tts", self.audio_service.synthesize_speech_bytes, text, call_site="turn")
+        return self._audio_fields(audio_bytes, inline_audio)
+
+    def _audio_fields(self, audio_bytes: Optional[bytes], inline_audio: bool) -> Dict[str, Optional[str]]:
+        """Stores synthesized audio and returns the response fields that reference it."""
+        if audio_bytes is None:
+            return {"audio_id": None, "audio_url": None, "audio_output_b64": None}
+        audio_id = self.audio_store.put(audio_bytes, "audio/mpeg")
         return {
-            "session_id": session_id,
-            "ai_responses": initial_ai_responses,
-            "current_status": self.sessions[session_id]["current_status"],
-            "agreed_points": self.sessions[session_id]["agreed_points"],
-            "next_action_hint": self.sessions[session_id]["next_action_hint"]
+            "audio_id": audio_id,
+            "audio_url": f"/audio/{audio_id}",
+            "audio_output_b64": base64.b64encode(audio_bytes).decode('utf-8') if inline_audio else None
         }
 
-    async def take_turn(self, session_id: str, speaker_id: str, message: Optional[str] = None, audio_input_b64: Optional[str] = None): # MODIFIED
-        if session_id not in self.sessions:
+    async def _get_session(self, session_id: str) -> Dict[str, Any]:
+        session = await self._read_session(session_id)
+        if session is None:
             raise ValueError("Session not found.")
+        return session
 
-        session = self.sessions[session_id]
-        
-        # --- Handle User Input (Text or Audio) ---
+    async def _read_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with span("session.load", backend=self._session_backend):
+            return await self._session_io(self.session_store.get, session_id)
+
+    async def _save_session(self, session_id: str, session: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Writes the session back. With expected_version, only if nobody changed its history meanwhile (see SessionStore)."""
+        with span("session.save", backend=self._session_backend) as save_span:
+            saved = await self._session_io(self.session_store.put, session_id, session, expected_version)
+            if not saved:
+                save_span.set(conflict=True)
+            return saved
+
+    async def _session_io(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # Shared stores do disk or network I/O (and SQLite may wait out another process's write lock), so they
+        # run on their own pool; the in-memory store is a dict lookup and stays on the loop
+        if self.session_store.blocking:
+            return await run_in_pool("sessions", fn, *args)
+        return fn(*args)
+
+    @staticmethod
+    async def _single_event(event: str, data: Dict[str, Any]):
+        yield event, data
+
+    @staticmethod
+    async def _reserve_agent_calls(agents: int) -> Reservation:
+        """Admits one LLM call per agent at once (see Upstream.reserve); raises UpstreamOverloadedError otherwise."""
+        return await run_in_pool("llm", get_upstream("llm").reserve, agents)
+
+    @asynccontextmanager
+    async def _agent_fan_out(self, agents: int):
+        """Runs the block with a reservation for its agents' LLM calls, handing unused slots back at the end."""
+        reservation = await self._reserve_agent_calls(agents)
+        try:
+            with reservation.use():
+                yield reservation
+        finally:
+            reservation.release()
+
+    @staticmethod
+    async def _gather_or_shed(awaitables) -> List[Any]:
+        """
+        gather() for the fan-out of one request. If any part is shed by an upstream limiter the whole request is,
+        so the remaining parts are cancelled instead of spending quota on a response nobody will get.
+        """
+        tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+        try:
+            return await asyncio.gather(*tasks)
+        except UpstreamOverloadedError:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    async def _resolve_user_input(self, session: Dict[str, Any], message: Optional[str], audio_input_b64: Optional[str], audio_input: Optional[bytes] = None):
+        """Returns (user_text_message, None), or (None, error_response) when there is no usable input."""
         user_text_message = message
-        if audio_input_b64:
+        if audio_input or audio_input_b64:
             try:
-                user_text_message = self.audio_service.transcribe_audio(audio_input_b64)
-                print(f"Transcribed user audio to: {user_text_message}")
+                # Transcription blocks on the Speech SDK, so it runs on the STT pool rather than the event loop
+                if audio_input:
+                    user_text_message = await run_in_pool("stt", self.audio_service.transcribe_audio_bytes, audio_input, call_site="turn")
+                else:
+                    user_text_message = await run_in_pool("stt", self.audio_service.transcribe_audio, audio_input_b64, call_site="turn")
+                logger.debug("Transcribed user audio", extra={"transcript": user_text_message})
+            except UpstreamOverloadedError:
+                raise # Shed: the caller answers 429 rather than an error turn
             except Exception as e:
-                return {"ai_responses": [], "current_status": "error", "agreed_points": [], "next_action_hint": f"Audio transcription failed: {e}"}
+                return None, {"ai_responses": [], "current_status": "error", "agreed_points": [], "next_action_hint": f"Audio transcription failed: {e}"}
 
         if not user_text_message:
-            return {"ai_responses": [], "current_status": session["current_status"], "agreed_points": session["agreed_points"], "next_action_hint": "No valid input provided."}
+            return None, {"ai_responses": [], "current_status": session["current_status"], "agreed_points": session["agreed_points"], "next_action_hint": "No valid input provided."}
+        return user_text_message, None
 
+    def _build_turn_prompts(self, session: Dict[str, Any]) -> List[Tuple[Dict[str, str], str]]:
+        """
+        Returns (ai_info, turn_prompt) for every AI negotiator in the session. Each agent's chat already holds
+        its earlier exchanges (and persona/stance live in its system instruction), so the prompt carries only
+        the turns from the user and the other agents that this agent has not seen yet.
+        """
+        history = session["conversation_history"]
+        # Turns folded into the summary reach the agent through the summary instead
+        summarized_turns = session.get("summarized_turns", 0)
+        agent_cursors = session.setdefault("agent_cursors", {})
 
-        # Record user's turn in history
-        session["conversation_history"].append({"speaker_id": speaker_id, "message": user_text_message})
-
-        ai_responses_data = []
-        
-        # Craft prompt for AI agents
-        # Include a summary of history for context, or pass full history
-        conversation_context = "\n".join([f"{t['speaker_id'].replace('_', ' ').title()}: {t['message']}" for t in session["conversation_history"][-5:]]) # Last 5 turns for context
-        
+        turn_prompts = []
         for ai_info in session["ai_negotiators"]:
-            ai_id = ai_info["id"]
-            ai_llm_instance = session["ai_llm_configs"][ai_id]
-            
-            # Combine system instructions, context, and user message for the AI's turn
-            turn_prompt = f"Given the conversation context below, and your role as {ai_info['persona_type']} (initial stance: '{ai_info['initial_stance']}'), respond to the user's latest statement: '{user_text_message}'\n\nConversation Context (recent):\n{conversation_context}\n\nYour response:"
-            
-            try:
-                ai_response_text = ai_llm_instance.generate_response(turn_prompt)
-                
-                # --- Synthesize AI response to audio ---
-                ai_audio_b64 = self.audio_service.synthesize_speech(ai_response_text) # NEW
-                
-                ai_responses_data.append({
-                    "speaker_id": ai_id,
-                    "message": ai_response_text,
-                    "audio_output_b64": ai_audio_b64 # NEW
-                })
-                # Record AI's turn in history
-                session["conversation_history"].append({"speaker_id": ai_id, "message": ai_response_text})
-
-            except Exception as e:
-                print(f"Error generating AI response for {ai_id}: {e}")
-                ai_responses_data.append({
-                    "speaker_id": ai_id,
-                    "message": f"Error: Could not generate response. ({e})",
-                    "audio_output_b64": None
-                })
-
+            start = max(agent_cursors.get(ai_info["id"], 0), summarized_turns)
+            new_turns = "\n".join([
+                f"{t['speaker_id'].replace('_', ' ').title()}: {t['message']}"
+                for t in history[start:] if t["speaker_id"] != ai_info["id"]
+            ])
+            turn_prompt = f"Respond to the user's latest statement. New messages since your last reply:\n{new_turns}"
+            turn_prompts.append((ai_info, turn_prompt))
+        return turn_prompts
 
+    @staticmethod
+    def _update_status(session: Dict[str, Any], user_text_message: str):
         # Simple logic for agreement/status update (can be expanded with LLM analysis)
         if "agreement" in user_text_message.lower() or "deal" in user_text_message.lower():
             session["current_status"] = "agreement_proposed"
@@ -151,59 +502,372 @@ class NegotiationService:
             session["current_status"] = "ended"
             session["next_action_hint"] = "Negotiation concluded."
 
+    @staticmethod
+    def _status_payload(session: Dict[str, Any]) -> Dict[str, Any]:
         return {
-            "ai_responses": ai_responses_data,
             "current_status": session["current_status"],
             "agreed_points": session["agreed_points"],
             "next_action_hint": session["next_action_hint"]
         }
 
-    async def get_feedback(self, session_id: str):
-        if session_id not in self.sessions:
-            raise ValueError("Session not found.")
-        
-        session = self.sessions[session_id]
-        
-        # Use LLM to analyze conversation and provide feedback
-        feedback_prompt = (
-            "Analyze the following negotiation conversation and provide feedback on the user's performance. "
-            "Identify key moments, effective strategies used, areas for improvement, and suggest alternative approaches. "
-            "Also, provide a final outcome based on the conversation status (e.g., 'Agreement Reached', 'Stalemate', 'Escalated').\n\n"
-            "Conversation History:\n" + 
-            "\n".join([f"{t['speaker_id'].replace('_', ' ').title()}: {t['message']}" for t in session["conversation_history"]]) +
-            f"\n\nUser's Initial Persona: {session['user_persona']}"
-        )
-        
-        # Create a temporary LLM for feedback (doesn't need to be part of the session's AI configs)
-        feedback_llm = LLMAgent()
-        feedback_llm.start_new_session() 
-        
-        try:
-            feedback_response_json_str = feedback_llm.generate_response(feedback_prompt + "\n\nProvide feedback in a JSON format with keys: 'final_outcome', 'feedback_summary', 'specific_suggestions' (as a list of strings).")
+    async def _start_agent(self, ai_info: Dict[str, str], system_instruction: str, user_persona: str, semaphore: asyncio.Semaphore):
+        """
+        Generates one AI negotiator's opening statement and returns (transcript, greeting_response).
+        Building the agent and calling the model block on the Google SDK, so both run on the LLM worker pool.
+        """
+        ai_id = ai_info["id"]
+        # Generate initial greeting from AI based on its stance
+        greeting_prompt = f"As the {ai_info['persona_type']} representing {ai_id}, provide a brief opening statement to the user representing {user_persona} about this negotiation."
+        with span("agent_greeting", ai_id=ai_id):
+            async with semaphore:
+                try:
+                    greeting_message = await run_in_pool(
+                        "llm",
+                        lambda: self._create_agent(system_instruction, call_site="greeting").generate_response(greeting_prompt)
+                    )
+                    transcript = [
+                        {"role": "user", "content": greeting_prompt},
+                        {"role": "model", "content": greeting_message}
+                    ]
+                    return transcript, {
+                        "speaker_id": ai_id,
+                        "message": greeting_message
+                    }
+                except UpstreamOverloadedError:
+                    raise
+                except Exception as e:
+                    logger.warning("Error generating initial greeting", extra={"ai_id": ai_id, "error": str(e)})
+                    return [], {
+                        "speaker_id": ai_id,
+                        "message": f"Error: Could not generate initial greeting. ({e})"
+                    }
+
+    @staticmethod
+    def _create_agent(system_instruction: str, initial_messages: Optional[List[Dict[str, str]]] = None, call_site: str = "turn") -> LLMAgent:
+        # A new LLMAgent instance for each AI, passing system instructions at initialization
+        ai_llm_instance = LLMAgent(system_instruction=system_instruction, call_site=call_site)
+        # System instructions are handled by the model itself; prior turns seed the chat history.
+        ai_llm_instance.start_new_session(initial_messages)
+        return ai_llm_instance
+
+    def _agent_factory(self, session: Dict[str, Any], ai_id: str) -> Callable[[], LLMAgent]:
+        """
+        Returns a callable that rebuilds the agent's chat state from its stored transcript.
+        Sessions keep only plain-data transcripts; the live chat objects exist for the duration of a turn.
+        """
+        system_instruction = session["system_instructions"][ai_id]
+        # Snapshot (the turn appends afterwards) of the exchanges not yet folded into the summary
+        summarized_turns = session.get("summarized_turns", 0)
+        transcript = [entry for entry in session["agent_transcripts"][ai_id] if entry.get("turn_index", 0) >= summarized_turns]
+        if session.get("summary"):
+            transcript = [
+                {"role": "user", "content": f"Summary of the negotiation so far:\n{session['summary']}"},
+                {"role": "model", "content": "Understood. I will continue the negotiation from there."}
+            ] + transcript
+        return functools.partial(self._create_agent, system_instruction, transcript)
+
+    @staticmethod
+    def _record_agent_reply(session: Dict[str, Any], ai_id: str, turn_prompt: str, ai_response_text: str, seen_until: int):
+        turn_index = len(session["conversation_history"]) # Position of this reply in conversation_history
+        session.setdefault("agent_cursors", {})[ai_id] = seen_until
+        session["conversation_history"].append({"speaker_id": ai_id, "message": ai_response_text})
+        session["agent_transcripts"][ai_id].extend([
+            {"role": "user", "content": turn_prompt, "turn_index": turn_index},
+            {"role": "model", "content": ai_response_text, "turn_index": turn_index}
+        ])
+
+    # --- Rolling summarization ---
+
+    def _maybe_schedule_summary(self, session_id: str, session: Dict[str, Any]):
+        """Starts a background summarization once the unsummarized history exceeds the token budget."""
+        if self.conversation_token_budget <= 0 or session_id in self._summary_tasks:
+            return
+        recent = session["conversation_history"][session.get("summarized_turns", 0):]
+        if len(recent) <= self.summary_keep_recent_turns:
+            return
+        if sum(estimate_tokens(turn["message"]) for turn in recent) <= self.conversation_token_budget:
+            return
+        task = asyncio.create_task(self._summarize_session(session_id, current_trace_id()))
+        self._summary_tasks[session_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(session_id, None))
+
+    async def _summarize_session(self, session_id: str, scheduled_by: Optional[str] = None):
+        """Folds all but the most recent turns into the running summary, between turns and off the request path."""
+        # Its own trace: the request that scheduled it has usually finished by now
+        with start_trace("summarize_session", session_id=session_id, scheduled_by=scheduled_by), request_budget(None):
+            session = await self._read_session(session_id)
+            if session is None:
+                return
+            start = session.get("summarized_turns", 0)
+            end = len(session["conversation_history"]) - self.summary_keep_recent_turns
+            if end <= start:
+                return
+            summary_prompt = (
+                "You maintain a running summary of a diplomatic negotiation. Update the summary below with the new turns. "
+                "Keep every party's positions, concessions, proposals, agreed points and open disputes; drop pleasantries. "
+                "Reply with the updated summary only, in at most 250 words.\n\n"
+                f"Current summary:\n{session.get('summary') or '(none yet)'}\n\n"
+                "New turns:\n" +
+                "\n".join([f"{t['speaker_id'].replace('_', ' ').title()}: {t['message']}" for t in session["conversation_history"][start:end]])
+            )
+            try:
+                summary = await run_in_pool("llm", self._one_shot_completion, summary_prompt, "summary")
+            except Exception as e:
+                logger.warning("Error summarizing session", extra={"session_id": session_id, "error": str(e)})
+                return
+
+            # Turns may have landed while the summary was generated; re-read and apply only if nobody else folded meanwhile
+            session = await self._read_session(session_id)
+            if session is None or session.get("summarized_turns", 0) != start:
+                return
+            version = session.get("history_version", 0)
+            session["summary"] = summary.strip()
+            session["summarized_turns"] = end
+            for ai_id, transcript in session["agent_transcripts"].items():
+                session["agent_transcripts"][ai_id] = [entry for entry in transcript if entry.get("turn_index", 0) >= end]
+            if not await self._save_session(session_id, session, expected_version=version):
+                # A turn landed between the re-read and the write; the next turn schedules a fresh summary
+                logger.info("Dropped summary of a concurrently updated session", extra={"session_id": session_id})
+                return
+            logger.info("Summarized session", extra={"session_id": session_id, "first_turn": start, "last_turn": end - 1})
+
+    async def _run_agent_turn(self, ai_id: str, make_agent: Callable[[], LLMAgent], turn_prompt: str, semaphore: asyncio.Semaphore, inline_audio: bool = False):
+        """
+        Runs one AI negotiator's turn: LLM reply, then TTS as soon as the text is available.
+        The blocking SDK calls run on the LLM and TTS worker pools so several agents can progress in parallel.
+        Returns the response entry and whether it succeeded (only successful replies enter the history).
+        """
+        with span("agent_turn", ai_id=ai_id):
+            async with semaphore:
+                started = time.perf_counter()
+                timing = {"llm_ms": None, "tts_ms": None, "total_ms": None}
+                try:
+                    ai_response_text = await run_in_pool("llm", lambda: make_agent().generate_response(turn_prompt))
+                    llm_done = time.perf_counter()
+                    timing["llm_ms"] = round((llm_done - started) * 1000, 1)
+
+                    # --- Synthesize AI response to audio ---
+                    try:
+                        ai_audio_bytes = await run_in_pool("tts", self.audio_service.synthesize_speech_bytes, ai_response_text, call_site="turn")
+                    except UpstreamOverloadedError as e:
+                        # The reply is already paid for; send it as text only rather than shedding the turn
+                        logger.warning("TTS shed, returning reply without audio", extra={"ai_id": ai_id, "error": str(e)})
+                        ai_audio_bytes = None
+                    timing["tts_ms"] = round((time.perf_counter() - llm_done) * 1000, 1)
+                    timing["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+                    return {
+                        "speaker_id": ai_id,
+                        "message": ai_response_text,
+                        **self._audio_fields(ai_audio_bytes, inline_audio),
+                        "timing": timing
+                    }, True
+                except UpstreamOverloadedError:
+                    raise
+                except Exception as e:
+                    logger.warning("Error generating AI response", extra={"ai_id": ai_id, "error": str(e)})
+                    timing["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                    return {
+                        "speaker_id": ai_id,
+                        "message": f"Error: Could not generate response. ({e})",
+                        **self._audio_fields(None, inline_audio),
+                        "timing": timing
+                    }, False
+
+    async def get_feedback(self, session_id: str, wait_s: float = 0.0) -> Dict[str, Any]:
+        """
+        Returns feedback for the session's current history version. Feedback is generated in the background
+        (started when the session ends or an agreement is proposed, or by the first request) and stored on the
+        session, so repeat calls are free. Until it is ready the result is {"status": "pending"}; wait_s > 0
+        long-polls for up to that many seconds first.
+        """
+        with span("get_feedback", session_id=session_id) as feedback_span:
+            session = await self._get_session(session_id)
+            version = session.get("history_version", 0)
+            stored = session.get("feedback")
+            feedback_span.set(history_version=version, cached=bool(stored and stored["history_version"] == version))
+            if stored and stored["history_version"] == version:
+                return {"status": "ready", "history_version": version, **stored["result"]}
+
+            task = self._feedback_job(session_id, session)
+            if task.done() or wait_s > 0:
+                try:
+                    # shield(): a client giving up on the long-poll must not cancel the shared job
+                    feedback = await asyncio.wait_for(asyncio.shield(task), wait_s if wait_s > 0 else None)
+                    return {"status": "ready", "history_version": version, **feedback}
+                except asyncio.TimeoutError:
+                    pass
+                except asyncio.CancelledError:
+                    if not task.cancelled():
+                        raise # This request was cancelled, not the job
+                    # The job was cancelled (shutdown); the next request starts a new one
+                except Exception as e:
+                    # Reported once; the next request starts a fresh attempt
+                    self._feedback_tasks.pop(session_id, None)
+                    return {
+                        "status": "failed",
+                        "history_version": version,
+                        "final_outcome": session["current_status"],
+                        "feedback_summary": f"Error generating detailed feedback: {e}",
+                        "specific_suggestions": ["Ensure LLM service is running and accessible."]
+                    }
+            return {"status": "pending", "history_version": version}
+
+    def _maybe_schedule_feedback(self, session_id: str, session: Dict[str, Any], previous_status: str):
+        """
+        Starts generating feedback as soon as a session is over, so it is usually ready before anyone asks.
+        Only the turn that moves the session into a trigger status does so; turns after that leave it to get_feedback.
+        """
+        if session["current_status"] in FEEDBACK_TRIGGER_STATUSES and session["current_status"] != previous_status:
+            stored = session.get("feedback")
+            if not stored or stored["history_version"] != session.get("history_version", 0):
+                self._feedback_job(session_id, session)
+
+    def _feedback_job(self, session_id: str, session: Dict[str, Any]) -> asyncio.Task:
+        """Returns the in-flight feedback job for the session's current history version, starting one if needed."""
+        version = session.get("history_version", 0)
+        running = self._feedback_tasks.get(session_id)
+        if running is not None and running[0] == version:
+            return running[1]
+        # An older job keeps running (its worker thread cannot be interrupted) and still answers its own waiters
+        task = asyncio.create_task(self._generate_feedback(session_id, version, current_trace_id()))
+        self._feedback_tasks[session_id] = (version, task)
+
+        def forget(done: asyncio.Task):
+            if self._feedback_tasks.get(session_id, (None, None))[1] is done:
+                del self._feedback_tasks[session_id]
+
+        def forget_when_done(done: asyncio.Task):
+            if done.cancelled() or done.exception() is None:
+                forget(done)
+            else:
+                # Failures stay until a request has reported them (see get_feedback), or until nobody asked in time
+                asyncio.get_running_loop().call_later(FEEDBACK_FAILURE_RETENTION_S, forget, done)
+        task.add_done_callback(forget_when_done)
+        return task
+
+    async def _generate_feedback(self, session_id: str, version: int, scheduled_by: Optional[str] = None) -> Dict[str, Any]:
+        """Generates feedback for one history version and stores it on the session if that version is still current."""
+        # Not bound by the budget of the request that happened to start it
+        with start_trace("generate_feedback", session_id=session_id, history_version=version, scheduled_by=scheduled_by), request_budget(None):
+            session = await self._get_session(session_id)
+            try:
+                feedback_response_json_str = await self._feedback_completion(session)
+            except Exception as e:
+                logger.warning("Error generating feedback", extra={"session_id": session_id, "error": str(e)})
+                raise
             # Attempt to parse as JSON. If not JSON, return raw text.
             try:
-                feedback_data = json.loads(feedback_response_json_str)
+                feedback_data = json.loads(self._strip_json_fence(feedback_response_json_str))
             except json.JSONDecodeError:
-                print(f"Warning: Feedback not in JSON format. Raw response: {feedback_response_json_str}")
+                logger.warning("Feedback not in JSON format", extra={"session_id": session_id, "raw_response": feedback_response_json_str})
                 feedback_data = {
                     "final_outcome": session["current_status"],
                     "feedback_summary": "Could not parse detailed feedback. Raw LLM response: " + feedback_response_json_str,
                     "specific_suggestions": []
                 }
-            
+
+            # A turn may have landed meanwhile; only a result for the current history is stored
+            session = await self._read_session(session_id)
+            if session is not None and session.get("history_version", 0) == version:
+                session["feedback"] = {"history_version": version, "result": feedback_data}
+                await self._save_session(session_id, session, expected_version=version)
             return feedback_data
-        except Exception as e:
-            print(f"Error generating feedback: {e}")
-            return {
-                "final_outcome": session["current_status"],
-                "feedback_summary": f"Error generating detailed feedback: {e}",
-                "specific_suggestions": ["Ensure LLM service is running and accessible."]
-            }
+
+    async def _feedback_completion(self, session: Dict[str, Any]) -> str:
+        """
+        Returns the raw feedback reply. Short sessions take a single LLM call. Longer ones are split into windows of
+        about feedback_window_tokens that are analyzed concurrently (map), and the partial findings are merged in one
+        final call (reduce), so latency and prompt size stay roughly flat as sessions grow.
+        """
+        windows = self._feedback_windows(session["conversation_history"])
+        output_format = "Provide feedback in a JSON format with keys: 'final_outcome', 'feedback_summary', 'specific_suggestions' (as a list of strings)."
+        if len(windows) <= 1:
+            feedback_prompt = (
+                "Analyze the following negotiation conversation and provide feedback on the user's performance. "
+                "Identify key moments, effective strategies used, areas for improvement, and suggest alternative approaches. "
+                "Also, provide a final outcome based on the conversation status (e.g., 'Agreement Reached', 'Stalemate', 'Escalated').\n\n"
+                "Conversation History:\n" +
+                (windows[0] if windows else "") +
+                f"\n\nUser's Initial Persona: {session['user_persona']}\n\n{output_format}"
+            )
+            return await run_in_pool("llm", self._one_shot_completion, feedback_prompt, "feedback")
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_feedback_windows)
+        findings = await asyncio.gather(*[
+            self._analyze_feedback_window(session, index, len(windows), window, semaphore) for index, window in enumerate(windows)
+        ], return_exceptions=True)
+        partials = [finding for finding in findings if not isinstance(finding, BaseException)]
+        if not partials:
+            raise findings[0]
+
+        reduce_prompt = (
+            "You are reviewing a long negotiation that was analyzed in consecutive parts. Merge the per-part findings below "
+            "into feedback on the user's performance over the whole negotiation: the key moments, the strategies that worked, "
+            "areas for improvement and alternative approaches. Also, provide a final outcome based on the conversation status "
+            "(e.g., 'Agreement Reached', 'Stalemate', 'Escalated').\n\n"
+            f"User's Initial Persona: {session['user_persona']}\n"
+            f"Current Status: {session['current_status']}\n"
+            f"Parts analyzed: {len(partials)} of {len(windows)}\n\n"
+            "Findings per part:\n" + "\n".join(json.dumps(partial) for partial in partials) +
+            f"\n\n{output_format}"
+        )
+        with span("feedback.reduce", parts=len(partials), windows=len(windows)):
+            return await run_in_pool("llm", self._one_shot_completion, reduce_prompt, "feedback")
+
+    def _feedback_windows(self, history: List[Dict[str, str]]) -> List[str]:
+        """Splits the full conversation (not the rolling summary) into consecutive windows of about feedback_window_tokens."""
+        windows: List[str] = []
+        lines: List[str] = []
+        tokens = 0
+        for turn_number, t in enumerate(history, start=1):
+            line = f"[{turn_number}] {t['speaker_id'].replace('_', ' ').title()}: {t['message']}"
+            line_tokens = estimate_tokens(line)
+            if lines and tokens + line_tokens > self.feedback_window_tokens:
+                windows.append("\n".join(lines))
+                lines, tokens = [], 0
+            lines.append(line)
+            tokens += line_tokens
+        if lines:
+            windows.append("\n".join(lines))
+        return windows
+
+    async def _analyze_feedback_window(self, session: Dict[str, Any], index: int, count: int, window: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        window_prompt = (
+            f"Below is part {index + 1} of {count} of a negotiation transcript; turns are numbered. Analyze only this part "
+            f"and the user's performance in it. The user's persona is {session['user_persona']}.\n\n"
+            f"{window}\n\n"
+            "Provide the output in JSON format with keys: 'key_moments', 'effective_strategies', 'areas_for_improvement' and "
+            "'suggestions' (each a list of short strings, citing turn numbers where useful), and 'positions' (a short string "
+            "describing where each party stands at the end of this part)."
+        )
+        async with semaphore:
+            with span("feedback.window", index=index, windows=count):
+                raw_response = await run_in_pool("llm", self._one_shot_completion, window_prompt, "feedback")
+        try:
+            findings = json.loads(self._strip_json_fence(raw_response))
+        except json.JSONDecodeError:
+            findings = None
+        # Unparseable findings are still useful to the merge step as free text
+        return {"part": index + 1, **(findings if isinstance(findings, dict) else {"notes": raw_response.strip()})}
 
     async def facilitate_dialogue(self, session_id: str, speaker_id: str, message: str): # MODIFIED: Add session_id for context if desired
         """Analyzes a dialogue segment and provides de-escalation suggestions."""
+        with span("facilitate_dialogue", speaker_id=speaker_id, chars=len(message)) as facilitate_span:
+            analysis = await self._analyze_segment(session_id, speaker_id, message)
+            facilitate_span.set(tier=analysis["tier"])
+        FACILITATOR_ANSWERS.labels(analysis["tier"]).inc()
+        return analysis
+
+    async def _analyze_segment(self, session_id: str, speaker_id: str, message: str) -> Dict[str, Any]:
         # For simple facilitator, session_id might just be a placeholder.
         # For more complex, it could use past dialogue history.
+        fast_analysis = self._fast_path_analysis(message)
+        if fast_analysis is not None:
+            return fast_analysis
+        cached_analysis = self._cached_analysis(message)
+        if cached_analysis is not None:
+            return cached_analysis
         
         analysis_prompt = (
             f"Analyze the following statement from '{speaker_id}' in a dialogue context: '{message}'. "
@@ -213,40 +877,208 @@ class NegotiationService:
             "Provide the output in JSON format with keys: 'sentiment_score' (float between -1.0 to 1.0), 'escalation_flag' (boolean), 'intervention' (string, or null if no intervention needed)."
         )
 
-        facilitator_llm = LLMAgent()
-        facilitator_llm.start_new_session() 
-
         try:
-            raw_response = facilitator_llm.generate_response(analysis_prompt)
-            # Attempt to parse as JSON. If not JSON, try to extract parts or return default.
-            try:
-                analysis = json.loads(raw_response)
-            except json.JSONDecodeError:
-                print(f"Warning: Facilitator output not in JSON format. Raw: {raw_response}")
-                # Fallback to basic parsing if JSON fails
-                sentiment_match = "neutral"
-                if "positive" in raw_response.lower(): sentiment_match = "positive"
-                elif "negative" in raw_response.lower(): sentiment_match = "negative"
-
-                escalation_flag = "true" in raw_response.lower() and "escalation flag: true" in raw_response.lower()
-
-                intervention_text = "N/A"
-                if "intervention:" in raw_response.lower():
-                    intervention_text = raw_response.split("intervention:")[-1].strip().split("\n")[0] # Basic extraction
-
-                analysis = {
-                    "sentiment_score": 0.0, # Cannot determine precisely without JSON
-                    "escalation_flag": escalation_flag,
-                    "intervention": intervention_text
-                }
-                if sentiment_match == "positive": analysis["sentiment_score"] = 0.8
-                elif sentiment_match == "negative": analysis["sentiment_score"] = -0.8
-                
+            raw_response = await run_in_pool("llm", self._one_shot_completion, analysis_prompt, "facilitate")
+            analysis, complete = self._parse_facilitator_analysis(raw_response)
+            if complete:
+                self._cache_analysis(message, analysis)
             return analysis
+        except UpstreamOverloadedError:
+            raise
         except Exception as e:
-            print(f"Error in dialogue facilitation: {e}")
-            return {
-                "sentiment_score": 0.0,
-                "escalation_flag": True, # Default to true on error for safety
-                "intervention": f"Error processing dialogue: {e}. Check LLM service."
-            }
\ No newline at end of file
+            logger.warning("Error in dialogue facilitation", extra={"error": str(e)})
+            return self._facilitator_error(e)
+
+    async def facilitate_dialogue_batch(self, session_id: str, segments: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Analyzes many (speaker_id, message) segments. Segments are packed facilitator_batch_size at a time
+        into one structured LLM request, with at most max_concurrent_facilitator_calls requests in flight.
+        Segments the local fast path or the result cache can answer never reach the LLM.
+        Returns one analysis per segment, in input order.
+        """
+        with span("facilitate_dialogue_batch", segments=len(segments)) as batch_span:
+            analyses = [
+                self._fast_path_analysis(segment["message"]) or self._cached_analysis(segment["message"])
+                for segment in segments
+            ]
+            pending = [i for i, analysis in enumerate(analyses) if analysis is None]
+            semaphore = asyncio.Semaphore(self.max_concurrent_facilitator_calls)
+            chunks = [pending[i:i + self.facilitator_batch_size] for i in range(0, len(pending), self.facilitator_batch_size)]
+            batch_span.set(llm_segments=len(pending), chunks=len(chunks))
+            chunk_results = await self._gather_or_shed([
+                self._facilitate_chunk(session_id, [segments[i] for i in chunk], semaphore) for chunk in chunks
+            ])
+        for chunk, chunk_result in zip(chunks, chunk_results):
+            for i, analysis in zip(chunk, chunk_result):
+                analyses[i] = analysis
+        for analysis in analyses:
+            FACILITATOR_ANSWERS.labels(analysis["tier"]).inc()
+        return analyses
+
+    def _fast_path_analysis(self, message: str) -> Optional[Dict[str, Any]]:
+        """Answers clearly benign messages from the local lexicon. Returns None when the LLM should decide."""
+        if self.sentiment_scorer is None:
+            return None
+        score = self.sentiment_scorer.score(message)
+        # No positive evidence, mixed cues (sarcasm), escalation cues or a low score are all ambiguous
+        if score.escalation_hits or score.is_mixed or score.positive_hits == 0 or score.sentiment_score < self.fast_path_threshold:
+            return None
+        # So is anything a word list cannot read: several statements ("We respect you. Leave."), demands and
+        # conditions ("we agree - after you surrender"), words it does not know ("thanks, good riddance"),
+        # or simply more text than a short acknowledgement
+        if (score.sentences > 1 or score.imperative_hits or score.conditional_hits or score.unknown_words
+                or score.words > self.fast_path_max_words):
+            return None
+        return {
+            "sentiment_score": score.sentiment_score,
+            "escalation_flag": False,
+            "intervention": None,
+            "tier": "lexicon"
+        }
+
+    async def _facilitate_chunk(self, session_id: str, chunk: List[Dict[str, str]], semaphore: asyncio.Semaphore) -> List[Dict[str, Any]]:
+        analyses: List[Optional[Dict[str, Any]]] = [None] * len(chunk)
+        if len(chunk) > 1:
+            statements = "\n".join(f"[{i}] From '{segment['speaker_id']}': '{segment['message']}'" for i, segment in enumerate(chunk))
+            batch_prompt = (
+                "Analyze each of the numbered statements below from a multi-party dialogue. "
+                "For each one, determine its sentiment, assign an escalation flag (True if highly escalatory, False otherwise) and, "
+                "if it is escalatory or negative, provide a single, short de-escalation or constructive intervention suggestion. "
+                "Provide the output in JSON format with the key 'segment_results': a list with one entry per statement, each with keys: "
+                "'index' (the statement number), 'sentiment_score' (float between -1.0 to 1.0), 'escalation_flag' (boolean), "
+                "'intervention' (string, or null if no intervention needed).\n\n"
+                f"{statements}"
+            )
+            async with semaphore:
+                try:
+                    with span("facilitate_chunk", segments=len(chunk)) as chunk_span:
+                        raw_response = await run_in_pool("llm", self._one_shot_completion, batch_prompt, "facilitate")
+                        analyses = self._parse_facilitator_batch(raw_response, len(chunk))
+                        chunk_span.set(parsed=sum(1 for analysis in analyses if analysis is not None))
+                    for segment, analysis in zip(chunk, analyses):
+                        if analysis is not None:
+                            self._cache_analysis(segment["message"], analysis)
+                except UpstreamOverloadedError:
+                    raise # Falling back to one request per segment would only add load
+                except Exception as e:
+                    logger.warning("Error in batch dialogue facilitation, analyzing segments one by one", extra={"segments": len(chunk), "error": str(e)})
+
+        # Single segments, and any the packed reply did not cover, get their own request
+        async def analyze_one(segment: Dict[str, str]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._analyze_segment(session_id, segment["speaker_id"], segment["message"])
+
+        missing = [i for i, analysis in enumerate(analyses) if analysis is None]
+        for i, analysis in zip(missing, await self._gather_or_shed([analyze_one(chunk[i]) for i in missing])):
+            analyses[i] = analysis
+        return analyses
+
+    def _cached_analysis(self, message: str) -> Optional[Dict[str, Any]]:
+        cached = self.facilitator_cache.get((FACILITATOR_PROMPT_VERSION, normalize_facilitator_message(message)))
+        return {**cached, "tier": "cache"} if cached is not None else None
+
+    def _cache_analysis(self, message: str, analysis: Dict[str, Any]):
+        # Only fully parsed LLM analyses are cached; errors and best-effort fallbacks must not be replayed
+        self.facilitator_cache.put((FACILITATOR_PROMPT_VERSION, normalize_facilitator_message(message)), analysis)
+
+    @staticmethod
+    def _one_shot_completion(prompt: str, call_site: str) -> str:
+        # Blocking single-prompt LLM round-trip; callers run it on the LLM worker pool. The model handle comes from the registry.
+        one_shot_llm = LLMAgent(call_site=call_site)
+        one_shot_llm.start_new_session()
+        return one_shot_llm.generate_response(prompt)
+
+    @staticmethod
+    def _strip_json_fence(raw_response: str) -> str:
+        # Models often wrap JSON in a ```json ... ``` block
+        text = raw_response.strip()
+        if text.startswith("```"):
+            text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+        return text
+
+    @classmethod
+    def _parse_facilitator_analysis(cls, raw_response: str) -> Tuple[Dict[str, Any], bool]:
+        """
+        Returns (analysis, complete). A JSON reply must carry every field (ValueError otherwise, so the caller
+        answers with _facilitator_error); a non-JSON reply gets a best-effort keyword reading with complete=False.
+        """
+        try:
+            parsed = json.loads(cls._strip_json_fence(raw_response))
+        except json.JSONDecodeError:
+            logger.warning("Facilitator output not in JSON format", extra={"raw_response": raw_response})
+            # Fallback to basic parsing if JSON fails
+            sentiment_match = "neutral"
+            if "positive" in raw_response.lower(): sentiment_match = "positive"
+            elif "negative" in raw_response.lower(): sentiment_match = "negative"
+
+            escalation_flag = "true" in raw_response.lower() and "escalation flag: true" in raw_response.lower()
+
+            intervention_text = "N/A"
+            if "intervention:" in raw_response.lower():
+                intervention_text = raw_response.split("intervention:")[-1].strip().split("\n")[0] # Basic extraction
+
+            analysis = {
+                "sentiment_score": 0.0, # Cannot determine precisely without JSON
+                "escalation_flag": escalation_flag,
+                "intervention": intervention_text,
+                "tier": "llm"
+            }
+            if sentiment_match == "positive": analysis["sentiment_score"] = 0.8
+            elif sentiment_match == "negative": analysis["sentiment_score"] = -0.8
+            return analysis, False
+
+        analysis = cls._facilitator_entry(parsed)
+        if analysis is None:
+            raise ValueError(f"Facilitator reply is missing or has malformed fields: {raw_response[:200]}")
+        return analysis, True
+
+    @staticmethod
+    def _facilitator_entry(entry: Any) -> Optional[Dict[str, Any]]:
+        """Validates one analysis from the model and clamps it to the response schema. Returns None if it is unusable."""
+        if not isinstance(entry, dict):
+            return None
+        escalation_flag = entry.get("escalation_flag")
+        if isinstance(escalation_flag, str) and escalation_flag.strip().lower() in ("true", "false"):
+            escalation_flag = escalation_flag.strip().lower() == "true"
+        if not isinstance(escalation_flag, bool) or "intervention" not in entry:
+            return None
+        try:
+            sentiment_score = float(entry["sentiment_score"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not math.isfinite(sentiment_score):
+            return None
+        intervention = entry["intervention"]
+        return {
+            "sentiment_score": max(-1.0, min(1.0, sentiment_score)),
+            "escalation_flag": escalation_flag,
+            "intervention": str(intervention) if intervention is not None else None,
+            "tier": "llm"
+        }
+
+    @classmethod
+    def _parse_facilitator_batch(cls, raw_response: str, count: int) -> List[Optional[Dict[str, Any]]]:
+        """Maps a packed reply back to its segments by index. Entries that are missing or malformed stay None."""
+        analyses: List[Optional[Dict[str, Any]]] = [None] * count
+        try:
+            results = json.loads(cls._strip_json_fence(raw_response))["segment_results"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            logger.warning("Batch facilitator output not in the expected JSON format", extra={"raw_response": raw_response})
+            return analyses
+        for position, entry in enumerate(results if isinstance(results, list) else []):
+            analysis = cls._facilitator_entry(entry)
+            if analysis is None:
+                continue
+            index = entry.get("index", position)
+            if isinstance(index, int) and 0 <= index < count:
+                analyses[index] = analysis
+        return analyses
+
+    @staticmethod
+    def _facilitator_error(e: Exception) -> Dict[str, Any]:
+        return {
+            "sentiment_score": 0.0,
+            "escalation_flag": True, # Default to true on error for safety
+            "intervention": f"Error processing dialogue: {e}. Check LLM service.",
+            "tier": "llm"
+        }
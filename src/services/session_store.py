@@ -0,0 +1,443 @@
+# src/services/session_store.py
+
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("diplomacy.sessions")
+
+# Rough per-object overheads used by estimate_session_size (CPython dict/list/str headers).
+SESSION_BASE_BYTES = 2048
+TURN_OVERHEAD_BYTES = 200
+
+def estimate_session_size(session: Dict[str, Any]) -> int:
+    """Cheap approximation of a session's memory footprint, used for the byte cap."""
+    size = SESSION_BASE_BYTES
+    for turn in session.get("conversation_history", []):
+        size += TURN_OVERHEAD_BYTES + len(turn.get("message", "")) + len(turn.get("speaker_id", ""))
+    for transcript in session.get("agent_transcripts", {}).values():
+        for entry in transcript:
+            size += TURN_OVERHEAD_BYTES + len(entry["content"])
+    for instruction in session.get("system_instructions", {}).values():
+        size += len(instruction)
+    size += len(session.get("summary", ""))
+    return size
+
+# Bumped whenever the persisted session layout changes incompatibly
+SESSION_FORMAT_VERSION = 1
+
+def serialize_session(session: Dict[str, Any]) -> str:
+    """Encodes a session for an out-of-process store. Sessions are plain JSON-compatible data."""
+    return json.dumps({"v": SESSION_FORMAT_VERSION, "session": session}, ensure_ascii=False, separators=(",", ":"))
+
+def deserialize_session(data) -> Optional[Dict[str, Any]]:
+    """Decodes serialize_session() output. Returns None for payloads written in another format version."""
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    payload = json.loads(data)
+    if payload.get("v") != SESSION_FORMAT_VERSION:
+        return None
+    return payload["session"]
+
+
+class SessionConflictError(RuntimeError):
+    """The session changed in the store (e.g. a turn served by another worker) after it was read; the write was dropped."""
+
+
+class SessionStore:
+    """
+    Storage interface for negotiation sessions. get() returns None for unknown or expired sessions;
+    callers put() a session back after mutating it so the store can account for its new size.
+    Stores with blocking=True do disk or network I/O; async callers run them off the event loop.
+
+    put() with expected_version is an optimistic compare-and-set: the write only happens if the stored
+    session still has that history_version, and put() returns False (writing nothing) otherwise.
+    """
+    blocking = True
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, session_id: str, session: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self)}
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local session store with an idle TTL and LRU eviction once either the session count
+    or the estimated total size exceeds its cap. Like the out-of-process stores it hands out and keeps
+    copies, so a caller's changes only land through put() and concurrent turns conflict the same way.
+
+    Args:
+        max_sessions: Maximum number of sessions kept.
+        max_bytes: Cap on the summed estimate_session_size() of all sessions.
+        idle_ttl_s: Sessions not touched for this many seconds are dropped.
+        size_fn: Size estimator for a session.
+        on_evict: Optional callback(session_id, session, reason) invoked for every eviction.
+    """
+    blocking = False
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        max_bytes: int = 256 * 2**20,
+        idle_ttl_s: float = 3600.0,
+        size_fn: Callable[[Dict[str, Any]], int] = estimate_session_size,
+        on_evict: Optional[Callable[[str, Dict[str, Any], str], None]] = None,
+    ):
+        self.max_sessions = max(1, max_sessions)
+        self.max_bytes = max_bytes
+        self.idle_ttl_s = idle_ttl_s
+        self.size_fn = size_fn
+        self.on_evict = on_evict
+        # session_id -> (session, size, last_access); ordered from least to most recently used
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = {"idle": 0, "max_sessions": 0, "max_bytes": 0}
+
+    @classmethod
+    def from_env(cls) -> "InMemorySessionStore":
+        return cls(
+            max_sessions=int(os.getenv("SESSION_MAX_COUNT", "1000")),
+            max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(256 * 2**20))),
+            idle_ttl_s=float(os.getenv("SESSION_IDLE_TTL_S", "3600")),
+        )
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        evicted = []
+        with self._lock:
+            self._expire_idle_locked(evicted)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                session, size, _ = entry
+                self._sessions[session_id] = (session, size, time.monotonic())
+                self._sessions.move_to_end(session_id)
+        self._notify(evicted)
+        return copy.deepcopy(entry[0]) if entry is not None else None
+
+    def put(self, session_id: str, session: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        size = self.size_fn(session)
+        session = copy.deepcopy(session) # The caller keeps using its own copy after the write
+        evicted = []
+        with self._lock:
+            if expected_version is not None:
+                current = self._sessions.get(session_id)
+                if current is None or current[0].get("history_version", 0) != expected_version:
+                    return False
+            previous = self._sessions.pop(session_id, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._sessions[session_id] = (session, size, time.monotonic())
+            self._total_bytes += size
+            self._expire_idle_locked(evicted)
+            # Evict least recently used sessions, but never the one just written
+            while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes):
+                reason = "max_sessions" if len(self._sessions) > self.max_sessions else "max_bytes"
+                oldest_id, (oldest, oldest_size, _) = self._sessions.popitem(last=False)
+                self._total_bytes -= oldest_size
+                self.evictions[reason] += 1
+                evicted.append((oldest_id, oldest, reason))
+        self._notify(evicted)
+        return True
+
+    def delete(self, session_id: str):
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                self._total_bytes -= entry[1]
+
+    def sweep(self) -> int:
+        """Drops idle sessions now (they are otherwise dropped lazily on access). Returns how many."""
+        evicted = []
+        with self._lock:
+            self._expire_idle_locked(evicted)
+        self._notify(evicted)
+        return len(evicted)
+
+    def _expire_idle_locked(self, evicted: list):
+        deadline = time.monotonic() - self.idle_ttl_s
+        # Entries are in access order, so expired ones are always at the front
+        while self._sessions:
+            oldest_id, (oldest, oldest_size, last_access) = next(iter(self._sessions.items()))
+            if last_access > deadline:
+                break
+            del self._sessions[oldest_id]
+            self._total_bytes -= oldest_size
+            self.evictions["idle"] += 1
+            evicted.append((oldest_id, oldest, "idle"))
+
+    def _notify(self, evicted: list):
+        for session_id, session, reason in evicted:
+            logger.info("Evicted session", extra={"session_id": session_id, "reason": reason})
+            if self.on_evict:
+                self.on_evict(session_id, session, reason)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "bytes": self._total_bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "idle_ttl_s": self.idle_ttl_s,
+            "evictions": dict(self.evictions),
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store backed by a SQLite database in WAL mode, shared by every worker process on a host
+    (e.g. uvicorn --workers N). Idle sessions and sessions beyond max_sessions are removed by a
+    sweep that runs at most every sweep_interval_s, piggybacked on writes.
+
+    Args:
+        path: Database file. Created if missing.
+        max_sessions: Maximum number of sessions kept; the least recently used are removed first.
+        idle_ttl_s: Sessions not touched for this many seconds are dropped.
+        sweep_interval_s: Minimum time between two sweeps triggered by put().
+        busy_timeout_ms: How long a writer waits for another process's write lock.
+    """
+
+    def __init__(self, path: str, max_sessions: int = 1000, idle_ttl_s: float = 3600.0, sweep_interval_s: float = 30.0, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.max_sessions = max(1, max_sessions)
+        self.idle_ttl_s = idle_ttl_s
+        self.sweep_interval_s = sweep_interval_s
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local() # sqlite3 connections must not be shared across threads
+        self._last_sweep = 0.0
+        self.evictions = {"idle": 0, "max_sessions": 0}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL") # Readers never block the writer and vice versa
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " history_version INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)")
+        if "history_version" not in [column[1] for column in conn.execute("PRAGMA table_info(sessions)")]:
+            # Databases written before compare-and-set support: backfill the version from the stored JSON
+            conn.execute("ALTER TABLE sessions ADD COLUMN history_version INTEGER NOT NULL DEFAULT 0")
+            conn.execute("UPDATE sessions SET history_version = COALESCE(json_extract(data, '$.session.history_version'), 0)")
+
+    @classmethod
+    def from_env(cls) -> "SQLiteSessionStore":
+        return cls(
+            path=os.getenv("SESSION_SQLITE_PATH", ".cache/sessions.sqlite3"),
+            max_sessions=int(os.getenv("SESSION_MAX_COUNT", "1000")),
+            idle_ttl_s=float(os.getenv("SESSION_IDLE_TTL_S", "3600")),
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode: every statement is its own short transaction
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL") # Durable enough in WAL mode, without an fsync per commit
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connection()
+        now = time.time() # Wall clock, so all processes agree on last_access
+        row = conn.execute(
+            "SELECT data FROM sessions WHERE session_id = ? AND last_access > ?",
+            (session_id, now - self.idle_ttl_s)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (now, session_id))
+        return deserialize_session(row[0])
+
+    def put(self, session_id: str, session: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        now = time.time()
+        version = session.get("history_version", 0)
+        if expected_version is None:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, last_access, history_version) VALUES (?, ?, ?, ?)",
+                (session_id, serialize_session(session), now, version)
+            )
+        else:
+            # One statement, so the version check and the write are atomic across processes
+            updated = self._connection().execute(
+                "UPDATE sessions SET data = ?, last_access = ?, history_version = ?"
+                " WHERE session_id = ? AND history_version = ? AND last_access > ?",
+                (serialize_session(session), now, version, session_id, expected_version, now - self.idle_ttl_s)
+            ).rowcount
+            if not updated:
+                return False
+        if time.monotonic() - self._last_sweep >= self.sweep_interval_s:
+            self.sweep()
+        return True
+
+    def delete(self, session_id: str):
+        self._connection().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def sweep(self) -> int:
+        """Drops idle sessions and trims the table to max_sessions. Returns how many were removed."""
+        self._last_sweep = time.monotonic()
+        conn = self._connection()
+        idle = conn.execute("DELETE FROM sessions WHERE last_access <= ?", (time.time() - self.idle_ttl_s,)).rowcount
+        overflow = conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            " SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        ).rowcount
+        self.evictions["idle"] += idle
+        self.evictions["max_sessions"] += overflow
+        if idle or overflow:
+            logger.info("Evicted sessions", extra={"idle": idle, "overflow": overflow, "path": self.path})
+        return idle + overflow
+
+    def __len__(self) -> int:
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM sessions WHERE last_access > ?", (time.time() - self.idle_ttl_s,)
+        ).fetchone()
+        return row[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "sqlite",
+            "sessions": len(self),
+            "path": self.path,
+            "max_sessions": self.max_sessions,
+            "idle_ttl_s": self.idle_ttl_s,
+            "evictions": dict(self.evictions), # Removed by this process's sweeps only
+        }
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Session store on a Redis-protocol server (Redis, Valkey, KeyDB, ...), shared across hosts.
+    Each session is one key whose expiry is refreshed on every access, so the idle TTL is enforced
+    by the server. A sorted set of last-access times backs len() and stats().
+
+    Args:
+        url: Server URL, e.g. redis://localhost:6379/0. Ignored when client is given.
+        client: A ready redis.Redis-compatible client (e.g. a local stand-in for testing).
+        idle_ttl_s: Sessions not touched for this many seconds expire.
+        key_prefix: Namespace for the keys this store writes.
+    """
+    # Compare-and-set retries when the key is touched between WATCH and EXEC without a version change
+    MAX_WATCH_ATTEMPTS = 5
+
+    def __init__(self, url: str = "redis://localhost:6379/0", client=None, idle_ttl_s: float = 3600.0, key_prefix: str = "diplomacy:session:"):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ValueError("SESSION_BACKEND=redis requires the 'redis' package (pip install redis).") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.idle_ttl_s = idle_ttl_s
+        self.key_prefix = key_prefix
+        self._index_key = key_prefix + "index"
+
+    @classmethod
+    def from_env(cls) -> "RedisSessionStore":
+        return cls(
+            url=os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0"),
+            idle_ttl_s=float(os.getenv("SESSION_IDLE_TTL_S", "3600")),
+            key_prefix=os.getenv("SESSION_REDIS_PREFIX", "diplomacy:session:"),
+        )
+
+    def _key(self, session_id: str) -> str:
+        return self.key_prefix + session_id
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        ttl_ms = int(self.idle_ttl_s * 1000)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self._key(session_id))
+        pipe.pexpire(self._key(session_id), ttl_ms)
+        data, _ = pipe.execute()
+        if data is None:
+            return None
+        self.client.zadd(self._index_key, {session_id: time.time()})
+        return deserialize_session(data)
+
+    def put(self, session_id: str, session: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        if expected_version is None:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.set(self._key(session_id), serialize_session(session), px=int(self.idle_ttl_s * 1000))
+            pipe.zadd(self._index_key, {session_id: time.time()})
+            pipe.execute()
+            return True
+
+        from redis.exceptions import WatchError
+        key = self._key(session_id)
+        with self.client.pipeline() as pipe:
+            for _ in range(self.MAX_WATCH_ATTEMPTS):
+                try:
+                    # WATCH/MULTI: the write is discarded if anyone touches the key between the check and EXEC
+                    pipe.watch(key)
+                    current = pipe.get(key)
+                    stored = deserialize_session(current) if current is not None else None
+                    if stored is None or stored.get("history_version", 0) != expected_version:
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.set(key, serialize_session(session), px=int(self.idle_ttl_s * 1000))
+                    pipe.zadd(self._index_key, {session_id: time.time()})
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    continue # Touched meanwhile (a read refreshing the TTL also counts); check the version again
+        logger.warning("Gave up writing a contended session", extra={"session_id": session_id})
+        return False
+
+    def delete(self, session_id: str):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(self._key(session_id))
+        pipe.zrem(self._index_key, session_id)
+        pipe.execute()
+
+    def __len__(self) -> int:
+        # Index entries older than the TTL belong to keys the server has already expired
+        self.client.zremrangebyscore(self._index_key, "-inf", time.time() - self.idle_ttl_s)
+        return self.client.zcard(self._index_key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis",
+            "sessions": len(self),
+            "key_prefix": self.key_prefix,
+            "idle_ttl_s": self.idle_ttl_s,
+        }
+
+
+def create_session_store_from_env() -> SessionStore:
+    """Selects the session store from SESSION_BACKEND: 'memory' (default), 'sqlite' or 'redis'."""
+    backend = os.getenv("SESSION_BACKEND", "memory").lower()
+    if backend == "memory":
+        return InMemorySessionStore.from_env()
+    if backend == "sqlite":
+        return SQLiteSessionStore.from_env()
+    if backend == "redis":
+        return RedisSessionStore.from_env()
+    raise ValueError(f"Unknown SESSION_BACKEND '{backend}'. Expected 'memory', 'sqlite' or 'redis'.")
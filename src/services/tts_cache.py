@@ -0,0 +1,188 @@
+# src/services/tts_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from src.utils.cache import LRUCache
+
+logger = logging.getLogger("diplomacy.tts_cache")
+
+def tts_cache_key(text: str, language_code: str, voice_name: str, encoding: str) -> str:
+    """Content address of a synthesis request: identical inputs always map to the same key."""
+    payload = json.dumps([text, language_code, voice_name, encoding], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskAudioCache:
+    """
+    On-disk tier of the TTS cache. One file per key, evicted least-recently-used once the
+    directory grows past max_bytes. Survives restarts and is shared by workers on the same host:
+    a key missing from this worker's index is looked up on disk, and the index is rebuilt from a
+    directory scan (at most every rescan_interval_s) before evicting, so the cap holds for the
+    directory as a whole rather than for each worker's own writes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ".mp3", rescan_interval_s: float = 30.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.rescan_interval_s = rescan_interval_s
+        self._index: "OrderedDict[str, int]" = OrderedDict() # key -> size, oldest first
+        self._total_bytes = 0
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._rescan()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _rescan(self):
+        """Rebuilds the index from the directory, in mtime (last use) order, and evicts down to max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue # Evicted by another worker meanwhile
+            entries.append((stat.st_mtime, name[:-len(self.suffix)], stat.st_size))
+        with self._lock:
+            self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+            self._total_bytes = sum(self._index.values())
+            self._scanned_at = time.monotonic()
+            self._evict_locked()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            indexed = key in self._index
+            if indexed:
+                self._index.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key)) # Keep LRU order across restarts and workers
+        except OSError:
+            # Never written, or removed by another worker or by hand; forget it
+            with self._lock:
+                if key in self._index:
+                    self._total_bytes -= self._index.pop(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            if not indexed and key not in self._index: # Written by another worker since our last scan
+                self._index[key] = len(data)
+                self._total_bytes += len(data)
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key)) # Atomic, so readers never see partial files
+        except OSError as e:
+            logger.warning("Could not write TTS cache entry", extra={"key": key, "error": str(e)})
+            return
+        if time.monotonic() - self._scanned_at >= self.rescan_interval_s:
+            self._rescan() # Picks up the entry just written and what other workers wrote
+            return
+        with self._lock:
+            if key in self._index:
+                self._total_bytes -= self._index.pop(key)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict_locked()
+
+    def _evict_locked(self):
+        while self._index and self._total_bytes > self.max_bytes:
+            oldest_key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(oldest_key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class TTSCache:
+    """
+    Two-tier synthesis cache keyed by (text, language_code, voice_name, encoding):
+    a bounded in-memory LRU in front of an optional on-disk tier.
+
+    Args:
+        max_entries: Maximum entries in the memory tier (0 disables it).
+        max_memory_bytes: Maximum audio bytes held in the memory tier.
+        disk_dir: Directory for the disk tier. None disables it.
+        max_disk_bytes: Size cap of the disk tier.
+        disk_rescan_s: How often at most the disk tier rescans its directory for other workers' entries.
+    """
+
+    def __init__(self, max_entries: int = 512, max_memory_bytes: int = 64 * 2**20, disk_dir: Optional[str] = None, max_disk_bytes: int = 512 * 2**20, disk_rescan_s: float = 30.0):
+        self.memory = LRUCache(max_entries, max_bytes=max_memory_bytes)
+        self.disk = DiskAudioCache(disk_dir, max_disk_bytes, rescan_interval_s=disk_rescan_s) if disk_dir else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "TTSCache":
+        return cls(
+            max_entries=int(os.getenv("TTS_CACHE_MAX_ENTRIES", "512")),
+            max_memory_bytes=int(os.getenv("TTS_CACHE_MAX_BYTES", str(64 * 2**20))),
+            disk_dir=os.getenv("TTS_CACHE_DIR") or None,
+            max_disk_bytes=int(os.getenv("TTS_CACHE_MAX_DISK_BYTES", str(512 * 2**20))),
+            disk_rescan_s=float(os.getenv("TTS_CACHE_DISK_RESCAN_S", "30")),
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.memory.get(key)
+        if data is None and self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                self.memory.put(key, data) # Promote to the memory tier
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        self.memory.put(key, data)
+        if self.disk is not None:
+            self.disk.put(key, data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
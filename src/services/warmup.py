@@ -0,0 +1,107 @@
+# src/services/warmup.py
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from src.models.llm_agent import LLMAgent
+from src.services.audio_service import AudioService
+from src.utils.worker_pools import run_in_pool
+
+logger = logging.getLogger("diplomacy.warmup")
+
+WARMUP_COMPONENTS = ("llm", "stt", "tts")
+
+def parse_warmup_components(value: Optional[str]) -> tuple:
+    """
+    Parses WARMUP_ON_STARTUP: empty/'0'/'false' disables warm-up, '1'/'true'/'all' warms every
+    backend, and a comma-separated list (e.g. 'llm' for a text-only deployment) picks components.
+    """
+    value = (value or "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return ()
+    if value in ("1", "true", "yes", "on", "all"):
+        return WARMUP_COMPONENTS
+    components = tuple(part.strip() for part in value.split(",") if part.strip())
+    unknown = [part for part in components if part not in WARMUP_COMPONENTS]
+    if unknown:
+        raise ValueError(f"Unknown WARMUP_ON_STARTUP component(s) {unknown}. Expected any of {list(WARMUP_COMPONENTS)}.")
+    return components
+
+
+class BackendWarmup:
+    """
+    Optionally pre-initializes the LLM backend and the audio clients in the background at startup,
+    and reports which backends are warm for the readiness endpoint.
+
+    Args:
+        audio_service: The AudioService whose clients are warmed.
+        components: Components to warm ('llm', 'stt', 'tts'). Empty disables warm-up.
+        timeout_s: Per-component limit for connecting a client's channel.
+    """
+
+    def __init__(self, audio_service: AudioService, components: Iterable[str] = (), timeout_s: float = 30.0):
+        self.audio_service = audio_service
+        self.components = tuple(components)
+        self.timeout_s = timeout_s
+        # component -> {"status": "pending"|"warming"|"warm"|"failed", "duration_ms", "error"}
+        self.state: Dict[str, Dict[str, Any]] = {name: {"status": "pending"} for name in self.components}
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, audio_service: AudioService) -> "BackendWarmup":
+        return cls(
+            audio_service,
+            components=parse_warmup_components(os.getenv("WARMUP_ON_STARTUP")),
+            timeout_s=float(os.getenv("WARMUP_TIMEOUT_S", "30")),
+        )
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Schedules the warm-up on the running loop without waiting for it."""
+        if self.components and self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def run(self):
+        steps: Dict[str, Callable[[], None]] = {
+            "llm": self._warm_llm,
+            "stt": lambda: self.audio_service.warm_up_stt(self.timeout_s),
+            "tts": lambda: self.audio_service.warm_up_tts(self.timeout_s),
+        }
+        await asyncio.gather(*[self._run_step(name, steps[name]) for name in self.components])
+
+    @staticmethod
+    def _warm_llm():
+        agent = LLMAgent()
+        agent.backend.warm_up()
+        agent.model # Builds and registers the default model handle
+
+    async def _run_step(self, name: str, step: Callable[[], None]):
+        self.state[name] = {"status": "warming"}
+        start = time.perf_counter()
+        try:
+            await run_in_pool(name, step) # Each step blocks on its own upstream's pool
+            self.state[name] = {"status": "warm", "duration_ms": round((time.perf_counter() - start) * 1000, 1)}
+            logger.info("Warmed up backend", extra={"backend": name, "duration_ms": self.state[name]["duration_ms"]})
+        except Exception as e:
+            # Not fatal: the backend still initializes lazily on its first request
+            self.state[name] = {"status": "failed", "duration_ms": round((time.perf_counter() - start) * 1000, 1), "error": str(e)}
+            logger.warning("Backend warm-up failed", extra={"backend": name, "error": str(e)})
+
+    @property
+    def done(self) -> bool:
+        return all(entry["status"] in ("warm", "failed") for entry in self.state.values())
+
+    def readiness(self) -> Dict[str, Any]:
+        """Per-backend warm flags (including backends initialized lazily by requests) and warm-up progress."""
+        audio_warm = self.audio_service.warm_status()
+        backends = {
+            "llm": {"warm": LLMAgent().backend.is_warm},
+            "stt": {"warm": audio_warm["stt"]},
+            "tts": {"warm": audio_warm["tts"]},
+        }
+        for name, entry in self.state.items():
+            backends[name].update({"warmup": entry["status"], **{k: v for k, v in entry.items() if k != "status"}})
+        return {"ready": self.done, "warmup_enabled": bool(self.components), "backends": backends}
@@ -0,0 +1,117 @@
+# src/utils/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache bounded by entry count and, optionally, total size and age.
+
+    Args:
+        max_entries: Maximum number of entries kept. 0 disables the cache.
+        max_bytes: Optional cap on the summed size of the values, as measured by size_fn.
+        size_fn: Returns the size of a value in bytes (defaults to len()).
+        ttl_s: Optional time-to-live; entries older than this are treated as missing, and dropped by the
+            next put() (or purge_expired()) even if nobody asks for them again.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None, size_fn: Callable[[Any], int] = len, ttl_s: Optional[float] = None):
+        self.max_entries = max(0, max_entries)
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._expires: "OrderedDict[Hashable, float]" = OrderedDict() # In expiry order: every entry gets the same ttl_s
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            if self.ttl_s is not None and self._expires[key] <= time.monotonic():
+                self._remove_locked(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries == 0:
+            return
+        size = self.size_fn(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return # Never cache a single value larger than the whole budget
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._total_bytes += size
+            if self.ttl_s is not None:
+                self._expires[key] = time.monotonic() + self.ttl_s
+                self._purge_expired_locked()
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self._total_bytes > self.max_bytes):
+                self._remove_locked(next(iter(self._entries)))
+                self.evictions += 1
+
+    def purge_expired(self) -> int:
+        """Drops every expired entry now. Returns how many were dropped."""
+        if self.ttl_s is None:
+            return 0
+        with self._lock:
+            return self._purge_expired_locked()
+
+    def _purge_expired_locked(self) -> int:
+        now = time.monotonic()
+        purged = 0
+        while self._expires:
+            key, expires_at = next(iter(self._expires.items()))
+            if expires_at > now:
+                break
+            self._remove_locked(key)
+            purged += 1
+        self.expirations += purged
+        return purged
+
+    def _remove_locked(self, key: Hashable):
+        del self._entries[key]
+        self._total_bytes -= self._sizes.pop(key)
+        self._expires.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._expires.clear()
+            self._total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        # Membership only: does not touch LRU order or the hit/miss counters
+        with self._lock:
+            return key in self._entries
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,56 @@
+# src/utils/logging_config.py
+
+import json
+import logging
+import os
+import sys
+import time
+from typing import Optional
+
+from src.utils.tracing import current_span_id, current_trace_id
+
+# Attributes every LogRecord has; anything else on a record came from extra={...} and is emitted as a field
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+class JsonLogFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line: timestamp, level, logger, message, the current trace
+    and span IDs, and any fields passed with extra={...}.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id, span_id = current_trace_id(), current_span_id()
+        if trace_id:
+            entry["trace_id"] = trace_id
+        if span_id:
+            entry["span_id"] = span_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value # extra fields win, e.g. a finished trace logs its own trace_id
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: Optional[str] = None, log_format: Optional[str] = None):
+    """
+    Sends the service's 'diplomacy.*' loggers to stdout. LOG_FORMAT selects 'json' (default, one object
+    per line) or 'text' for local development; LOG_LEVEL sets the level (INFO by default).
+    """
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    log_format = (log_format or os.getenv("LOG_FORMAT", "json")).lower()
+    handler = logging.StreamHandler(sys.stdout)
+    if log_format == "text":
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        handler.setFormatter(JsonLogFormatter())
+    root = logging.getLogger("diplomacy")
+    root.handlers = [handler]
+    root.setLevel(level)
+    root.propagate = False # uvicorn configures the root logger with its own format
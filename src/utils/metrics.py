@@ -0,0 +1,199 @@
+# src/utils/metrics.py
+
+import bisect
+import logging
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger("diplomacy.metrics")
+
+# Latency buckets in seconds, spanning cache hits (ms) to slow LLM generations (tens of seconds)
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Returns the child for these label values. Callers on hot paths can keep the child around."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "total", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    """Prometheus histogram. Observations only bump one bucket; cumulative counts are built at scrape time."""
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.total, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds + (math.inf,), counts):
+                cumulative += bucket_count
+                le = _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    A gauge or counter whose value is read from a callback at scrape time, so the code that owns the
+    state (session stores, caches) needs no instrumentation at all. The callback returns a number,
+    or a dict of label-value tuples to numbers; None values are skipped.
+    """
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], Union[float, Dict[Tuple[str, ...], Optional[float]], None]], labelnames: Sequence[str] = (), type_name: str = "gauge"):
+        super().__init__(name, help_text, labelnames)
+        self.callback = callback
+        self.type_name = type_name
+
+    def render(self) -> List[str]:
+        try:
+            result = self.callback()
+        except Exception as e:
+            logger.warning("Metric callback failed", extra={"metric": self.name, "error": str(e)})
+            return []
+        samples = result if isinstance(result, dict) else {(): result}
+        lines = self.header()
+        for values, value in samples.items():
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-local metrics registry rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, CallbackMetric):
+                return existing # Module reloads and repeated service construction share the metric
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(self, name: str, help_text: str, callback, labelnames: Sequence[str] = (), type_name: str = "gauge") -> CallbackMetric:
+        """Registers (or replaces) a metric computed at scrape time."""
+        return self._register(CallbackMetric(name, help_text, callback, labelnames, type_name))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# The process-wide registry served at GET /metrics
+REGISTRY = MetricsRegistry()
+
+# --- Application metrics ---
+# call_site names the code path that made the upstream call: greeting, turn, feedback, facilitate, summary.
+LLM_LATENCY = REGISTRY.histogram("diplomacy_llm_latency_seconds", "LLM call latency (full generation for streamed calls).", ("call_site",))
+LLM_TOKENS = REGISTRY.counter("diplomacy_llm_tokens_total", "Tokens reported by the LLM backend, by kind (prompt or response).", ("call_site", "kind"))
+STT_LATENCY = REGISTRY.histogram("diplomacy_stt_latency_seconds", "Speech-to-Text call latency.", ("call_site",))
+TTS_LATENCY = REGISTRY.histogram("diplomacy_tts_latency_seconds", "Text-to-Speech call latency (cache misses only).", ("call_site",))
+UPSTREAM_ERRORS = REGISTRY.counter("diplomacy_upstream_errors_total", "Failed upstream calls, by upstream (llm, stt, tts).", ("upstream", "call_site"))
+FACILITATOR_ANSWERS = REGISTRY.counter("diplomacy_facilitator_answers_total", "Facilitator analyses by the tier that answered (lexicon, cache, llm).", ("tier",))
@@ -0,0 +1,605 @@
+# src/utils/resilience.py
+
+import contextvars
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+from src.utils.metrics import REGISTRY
+from src.utils.tracing import span
+from src.utils.worker_pools import get_pool
+
+logger = logging.getLogger("diplomacy.resilience")
+
+T = TypeVar("T")
+
+class RetryableUpstreamError(RuntimeError):
+    """Base for transient upstream failures raised by our own code (e.g. injected stub failures)."""
+
+class UpstreamTimeoutError(TimeoutError):
+    """
+    An upstream call did not finish within its per-call timeout or the remaining request budget.
+    budget_limited is set when the request budget, not the upstream's own timeout, cut the attempt short.
+    """
+
+    def __init__(self, message: str, budget_limited: bool = False):
+        super().__init__(message)
+        self.budget_limited = budget_limited
+
+class CircuitOpenError(RuntimeError):
+    """The upstream's circuit breaker is open; the call was rejected without being attempted."""
+
+class UpstreamOverloadedError(RuntimeError):
+    """
+    The upstream's rate or concurrency limit is saturated and the call could not be admitted within its bounded
+    queue wait. Shed, not failed: the API answers 429 with retry_after_s as the Retry-After header.
+    """
+
+    def __init__(self, message: str, retry_after_s: float = 1.0):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+def _google_retryable_errors() -> tuple:
+    try:
+        from google.api_core import exceptions as gexc
+    except ImportError:
+        return ()
+    return (gexc.ServiceUnavailable, gexc.DeadlineExceeded, gexc.TooManyRequests, gexc.InternalServerError, gexc.Aborted, gexc.GatewayTimeout)
+
+_RETRYABLE_ERRORS = (RetryableUpstreamError, UpstreamTimeoutError, ConnectionError) + _google_retryable_errors()
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient failures (unavailable, throttled, timed out) are retried and count against the breaker; the rest are not."""
+    return isinstance(error, _RETRYABLE_ERRORS)
+
+UPSTREAM_ATTEMPTS = REGISTRY.counter("diplomacy_upstream_attempts_total", "Upstream call attempts, by outcome (ok, error, timeout).", ("upstream", "outcome"))
+UPSTREAM_RETRIES = REGISTRY.counter("diplomacy_upstream_retries_total", "Retries after a retryable upstream failure.", ("upstream",))
+UPSTREAM_HEDGES = REGISTRY.counter("diplomacy_upstream_hedges_total", "Hedged duplicate requests, by outcome (sent, won, throttled).", ("upstream", "outcome"))
+UPSTREAM_DEADLINE_EXCEEDED = REGISTRY.counter("diplomacy_upstream_deadline_exceeded_total", "Upstream calls abandoned because the per-call timeout or request budget ran out.", ("upstream",))
+CIRCUIT_REJECTIONS = REGISTRY.counter("diplomacy_circuit_breaker_rejections_total", "Calls rejected by an open circuit breaker.", ("upstream",))
+CIRCUIT_OPENED = REGISTRY.counter("diplomacy_circuit_breaker_opened_total", "Times a circuit breaker opened.", ("upstream",))
+UPSTREAM_QUEUE_WAIT = REGISTRY.histogram("diplomacy_upstream_queue_wait_seconds", "Time calls waited for an upstream's rate or concurrency limit.", ("upstream",))
+UPSTREAM_SHED = REGISTRY.counter("diplomacy_upstream_shed_total", "Calls shed by an upstream's limiter, by reason (queue_full, wait_timeout).", ("upstream", "reason"))
+
+# --- Request budget ---
+
+# Absolute time.monotonic() deadline of the current request; copied into tasks and worker threads like the trace
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("diplomacy_deadline", default=None)
+
+@contextmanager
+def request_budget(budget_s: Optional[float]) -> Iterator[None]:
+    """Sets the time budget for everything below (None lifts it, e.g. for background jobs started by a request)."""
+    token = _deadline.set(time.monotonic() + budget_s if budget_s is not None else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left in the current request budget, or None when there is no budget."""
+    deadline = _deadline.get()
+    return deadline - time.monotonic() if deadline is not None else None
+
+
+class RequestBudgetMiddleware:
+    """
+    ASGI middleware that gives every HTTP request a time budget. Upstream calls made while serving the
+    request time out when the budget runs out instead of stalling it. Clients can ask for a shorter
+    budget with an X-Request-Budget-Ms header.
+
+    Args:
+        app: The wrapped ASGI application.
+        budget_s: Default (and maximum) budget per request.
+    """
+
+    def __init__(self, app, budget_s: float = 60.0):
+        self.app = app
+        self.budget_s = budget_s
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget_s = self.budget_s
+        for key, value in scope.get("headers", []):
+            if key.lower() == b"x-request-budget-ms":
+                try:
+                    budget_s = min(budget_s, max(0.0, float(value) / 1000))
+                except ValueError:
+                    pass
+        with request_budget(budget_s):
+            await self.app(scope, receive, send)
+
+# --- Circuit breaker ---
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker. After failure_threshold retryable failures in a row the circuit
+    opens and calls fail fast for cooldown_s; then one trial call is let through (half-open) and its
+    outcome closes or re-opens the circuit.
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown_s: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raises CircuitOpenError unless a call may go ahead now."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_s:
+                self.state, self._trial_in_flight = self.HALF_OPEN, False
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+        CIRCUIT_REJECTIONS.labels(self.name).inc()
+        raise CircuitOpenError(f"Circuit breaker for '{self.name}' is open; retry in up to {self.cooldown_s:.0f}s.")
+
+    def release(self):
+        """Ends a call that says nothing about the upstream's health (e.g. cut short by the caller's budget)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.failure_threshold > 0 and (self.state == self.HALF_OPEN or self._failures >= self.failure_threshold):
+                if self.state != self.OPEN:
+                    CIRCUIT_OPENED.labels(self.name).inc()
+                    logger.warning("Circuit breaker opened", extra={"upstream": self.name, "consecutive_failures": self._failures})
+                self.state, self._opened_at = self.OPEN, time.monotonic()
+
+# --- Rate and concurrency limits ---
+
+class RateLimiter:
+    """
+    Admission control for one upstream: a token bucket (rate_per_s, refilling up to burst) and a cap on calls
+    in flight, shared by every thread calling the upstream. Callers that cannot be admitted at once queue for
+    a bounded time; when max_queue callers are already waiting, or the wait runs out, the call is shed with
+    UpstreamOverloadedError. A limit of 0 disables that limit.
+    """
+
+    def __init__(self, name: str, rate_per_s: float = 0.0, burst: float = 0.0, max_concurrency: int = 0, max_queue: int = 0):
+        self.name = name
+        self.rate_per_s = rate_per_s
+        self.burst = max(burst, 1.0) if rate_per_s > 0 else 0.0
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float):
+        if self.rate_per_s > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_per_s)
+        self._refilled_at = now
+
+    def _admissible(self, slots: int = 1) -> bool:
+        return (self.max_concurrency <= 0 or self.in_flight + slots <= self.max_concurrency) and (self.rate_per_s <= 0 or self._tokens >= slots)
+
+    def _admit(self, slots: int = 1):
+        self.in_flight += slots
+        if self.rate_per_s > 0:
+            self._tokens -= slots
+
+    def max_slots(self, slots: int) -> int:
+        """How many of slots can ever be admitted at once (0 when the limiter has no limits to reserve against)."""
+        if self.max_concurrency <= 0 and self.rate_per_s <= 0:
+            return 0
+        if self.max_concurrency > 0:
+            slots = min(slots, self.max_concurrency)
+        if self.rate_per_s > 0:
+            slots = min(slots, int(self.burst))
+        return max(0, slots)
+
+    def _shed(self, reason: str, message: str):
+        UPSTREAM_SHED.labels(self.name, reason).inc()
+        # Roughly when the queue ahead of a new caller will have drained
+        retry_after_s = (self.waiting + 1) / self.rate_per_s if self.rate_per_s > 0 else 1.0
+        raise UpstreamOverloadedError(message, retry_after_s=max(1.0, math.ceil(retry_after_s)))
+
+    def acquire(self, timeout_s: float, slots: int = 1) -> float:
+        """
+        Waits up to timeout_s for admission of slots calls at once and returns the time waited.
+        Every acquired slot needs a release().
+        """
+        started = time.monotonic()
+        deadline = started + max(0.0, timeout_s)
+        with self._condition:
+            self._refill(started)
+            if self.waiting == 0 and self._admissible(slots):
+                self._admit(slots)
+                return 0.0
+            if self.max_queue > 0 and self.waiting >= self.max_queue:
+                self._shed("queue_full", f"'{self.name}' is at capacity ({self.waiting} calls already queued).")
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._admissible(slots):
+                        self._admit(slots)
+                        waited = now - started
+                        UPSTREAM_QUEUE_WAIT.labels(self.name).observe(waited)
+                        return waited
+                    wait_s = deadline - now
+                    if wait_s <= 0:
+                        UPSTREAM_QUEUE_WAIT.labels(self.name).observe(now - started)
+                        self._shed("wait_timeout", f"'{self.name}' is at capacity; no slot freed up within {timeout_s:.2f}s.")
+                    if self.rate_per_s > 0 and self._tokens < slots:
+                        wait_s = min(wait_s, (slots - self._tokens) / self.rate_per_s)
+                    self._condition.wait(wait_s)
+            finally:
+                self.waiting -= 1
+                self._condition.notify() # The next waiter may be admissible too, or now at the head of the queue
+
+    def try_acquire(self, slots: int = 1) -> bool:
+        """Admits calls only if that needs no waiting and nobody is queued (used for optional extra work, e.g. hedges)."""
+        with self._condition:
+            self._refill(time.monotonic())
+            if self.waiting == 0 and self._admissible(slots):
+                self._admit(slots)
+                return True
+            return False
+
+    def release(self, slots: int = 1):
+        if slots <= 0:
+            return
+        with self._condition:
+            self.in_flight -= slots
+            self._condition.notify(slots)
+
+    def stats(self) -> Dict[str, object]:
+        with self._condition:
+            self._refill(time.monotonic())
+            return {
+                "in_flight": self.in_flight,
+                "queued": self.waiting,
+                "tokens": round(self._tokens, 2) if self.rate_per_s > 0 else None,
+                "rate_per_s": self.rate_per_s or None,
+                "max_concurrency": self.max_concurrency or None
+            }
+
+# --- Fan-out reservations ---
+
+# Reservations held by the current request; copied into tasks and worker threads like the request budget
+_reservations: contextvars.ContextVar[tuple] = contextvars.ContextVar("diplomacy_upstream_reservations", default=())
+
+class Reservation:
+    """
+    Admission slots an Upstream granted up front for a request's whole fan-out (see Upstream.reserve). Calls to
+    that upstream made under use() take over one unused slot each instead of queueing for admission on their own,
+    so a request is either admitted as a whole or shed before any of its work starts. release() hands the slots
+    nobody used back to the limiter; calls made after that, or beyond the reserved count, are admitted one by one.
+    """
+
+    def __init__(self, upstream: "Upstream", slots: int):
+        self.upstream = upstream
+        self.slots = slots
+        self._unused = slots
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self._unused <= 0:
+                return False
+            self._unused -= 1
+            return True
+
+    def release(self):
+        with self._lock:
+            unused, self._unused = self._unused, 0
+        self.upstream.limiter.release(unused)
+
+    @contextmanager
+    def use(self) -> Iterator["Reservation"]:
+        """Makes upstream calls below (including tasks and pool work started here) draw from this reservation."""
+        token = _reservations.set(_reservations.get() + (self,))
+        try:
+            yield self
+        finally:
+            _reservations.reset(token)
+
+# --- Upstream policy ---
+
+def _env_float(upstream: str, key: str, default: float) -> float:
+    # UPSTREAM_<NAME>_<KEY> overrides UPSTREAM_<KEY>, which overrides the built-in default
+    value = os.getenv(f"UPSTREAM_{upstream.upper()}_{key}") or os.getenv(f"UPSTREAM_{key}")
+    return float(value) if value else default
+
+@dataclass
+class UpstreamPolicy:
+    """
+    Resilience settings for one upstream.
+
+    timeout_s: Per-attempt timeout (further capped by the remaining request budget).
+    max_attempts: Attempts per call, including the first; only retryable errors are retried.
+    backoff_base_s / backoff_max_s: Full-jitter exponential backoff between attempts.
+    hedge_percentile: Send one duplicate request when an attempt runs longer than this latency percentile
+        of recent successful calls (e.g. 95). 0 disables hedging.
+    hedge_min_delay_s: Never hedge earlier than this.
+    breaker_failures / breaker_cooldown_s: Circuit breaker settings; breaker_failures=0 disables the breaker.
+    rate_per_s / burst: Token bucket for calls started per second (hedges and retries included). 0 disables it.
+    max_concurrency: Calls in flight at once, abandoned attempts included until they finish. 0 disables it.
+    max_queue / max_queue_wait_s: Calls that may wait for admission, and for how long (further capped by the
+        remaining request budget), before they are shed.
+    """
+    timeout_s: float = 30.0
+    max_attempts: int = 3
+    backoff_base_s: float = 0.2
+    backoff_max_s: float = 2.0
+    hedge_percentile: float = 0.0
+    hedge_min_delay_s: float = 0.05
+    breaker_failures: int = 5
+    breaker_cooldown_s: float = 30.0
+    rate_per_s: float = 0.0
+    burst: float = 0.0
+    max_concurrency: int = 0
+    max_queue: int = 64
+    max_queue_wait_s: float = 2.0
+
+    @classmethod
+    def from_env(cls, upstream: str, timeout_s: float = 30.0, rate_per_s: float = 0.0, max_concurrency: int = 0) -> "UpstreamPolicy":
+        rate_per_s = _env_float(upstream, "RATE_PER_S", rate_per_s)
+        return cls(
+            timeout_s=_env_float(upstream, "TIMEOUT_S", timeout_s),
+            max_attempts=max(1, int(_env_float(upstream, "MAX_ATTEMPTS", 3))),
+            backoff_base_s=_env_float(upstream, "BACKOFF_BASE_S", 0.2),
+            backoff_max_s=_env_float(upstream, "BACKOFF_MAX_S", 2.0),
+            hedge_percentile=_env_float(upstream, "HEDGE_PERCENTILE", 0.0),
+            hedge_min_delay_s=_env_float(upstream, "HEDGE_MIN_DELAY_S", 0.05),
+            breaker_failures=int(_env_float(upstream, "BREAKER_FAILURES", 5)),
+            breaker_cooldown_s=_env_float(upstream, "BREAKER_COOLDOWN_S", 30.0),
+            rate_per_s=rate_per_s,
+            burst=_env_float(upstream, "BURST", 2 * rate_per_s), # Absorbs short bursts, e.g. one turn fanning out to every agent
+            max_concurrency=int(_env_float(upstream, "MAX_CONCURRENCY", max_concurrency)),
+            max_queue=int(_env_float(upstream, "MAX_QUEUE", 64)),
+            max_queue_wait_s=_env_float(upstream, "MAX_QUEUE_WAIT_S", 2.0),
+        )
+
+
+class _LatencyWindow:
+    """Recent successful attempt latencies for one call site, used to pick the hedge delay."""
+    MIN_SAMPLES = 20
+
+    def __init__(self, size: int = 256):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._sorted: List[float] = []
+        self._stale = 0
+        self._lock = threading.Lock()
+
+    def observe(self, latency_s: float):
+        with self._lock:
+            self._samples.append(latency_s)
+            self._stale += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.MIN_SAMPLES:
+                return None
+            if self._stale >= 16 or not self._sorted: # Re-sort occasionally, not on every call
+                self._sorted, self._stale = sorted(self._samples), 0
+            return self._sorted[min(len(self._sorted) - 1, int(len(self._sorted) * p / 100))]
+
+
+class Upstream:
+    """
+    Shared resilience layer for one upstream (llm, stt, tts): per-attempt deadlines tied to the request
+    budget, jittered retries of retryable errors, an optional hedged duplicate once an attempt is slower
+    than the recent latency percentile, a circuit breaker, and a rate and concurrency limiter that queues
+    attempts for a bounded time and sheds the rest. Attempts run on the upstream's own thread pool so the
+    caller can stop waiting for one; an abandoned attempt still finishes in the background (and keeps its
+    concurrency slot until then).
+
+    Args:
+        name: Upstream name, used in metrics.
+        policy: Timeouts, retries, hedging and breaker settings.
+        max_workers: Size of the upstream's attempt thread pool ('<name>_attempts'). Callers reach call() from
+            the upstream's own worker pool ('<name>'), never from the one they are waiting on.
+    """
+
+    def __init__(self, name: str, policy: Optional[UpstreamPolicy] = None, max_workers: int = 32):
+        self.name = name
+        self.policy = policy or UpstreamPolicy()
+        self.breaker = CircuitBreaker(name, self.policy.breaker_failures, self.policy.breaker_cooldown_s)
+        self.limiter = RateLimiter(name, self.policy.rate_per_s, self.policy.burst, self.policy.max_concurrency, self.policy.max_queue)
+        self._attempts = get_pool(f"{name}_attempts", max_workers)
+        self._latencies: Dict[str, _LatencyWindow] = {}
+
+    def call(self, attempt: Callable[[Optional[float]], T], call_site: str = "default", hedge: bool = True) -> T:
+        """
+        Runs attempt(timeout_s) under the upstream's policy and returns its result. attempt receives the
+        time left for this attempt (to pass on to SDKs that take a timeout). Attempts must be independent
+        of each other when hedge=True, since two may run at once.
+        """
+        failures = 0
+        while True:
+            remaining = remaining_budget()
+            if remaining is not None and remaining <= 0:
+                UPSTREAM_DEADLINE_EXCEEDED.labels(self.name).inc()
+                raise UpstreamTimeoutError(f"Request budget exhausted before calling '{self.name}'.", budget_limited=True)
+            self.breaker.allow()
+            try:
+                self._admit(remaining)
+            except UpstreamOverloadedError:
+                self.breaker.release()
+                raise
+            remaining = remaining_budget() # Less after queueing for admission
+            timeout_s = min(self.policy.timeout_s, remaining) if remaining is not None else self.policy.timeout_s
+            try:
+                result = self._attempt(attempt, timeout_s, call_site, hedge)
+            except Exception as e:
+                if isinstance(e, UpstreamTimeoutError) and e.budget_limited:
+                    self.breaker.release() # A short client budget is no sign of an unhealthy upstream
+                    raise
+                if not is_retryable(e):
+                    self.breaker.record_success() # The upstream answered; the request itself was bad
+                    raise
+                self.breaker.record_failure()
+                failures += 1
+                backoff_s = random.uniform(0, min(self.policy.backoff_max_s, self.policy.backoff_base_s * 2 ** (failures - 1)))
+                remaining = remaining_budget()
+                if failures >= self.policy.max_attempts or (remaining is not None and remaining <= backoff_s):
+                    raise
+                UPSTREAM_RETRIES.labels(self.name).inc()
+                logger.info("Retrying upstream call", extra={"upstream": self.name, "call_site": call_site, "attempt": failures + 1, "backoff_ms": round(backoff_s * 1000, 1), "error": str(e)})
+                time.sleep(backoff_s)
+                continue
+            self.breaker.record_success()
+            return result
+
+    @contextmanager
+    def admitted(self) -> Iterator[None]:
+        """Holds one of the upstream's admission slots around a call made outside call(), e.g. a streamed reply."""
+        self._admit(remaining_budget())
+        try:
+            yield
+        finally:
+            self.limiter.release()
+
+    def reserve(self, slots: int) -> Reservation:
+        """
+        Admits the calls of a request's fan-out (e.g. one per agent) all at once, queueing like a single call,
+        and raises UpstreamOverloadedError before any of them started if that is not possible. Blocks; call it
+        from a worker pool. The caller must release() the reservation once the fan-out is over.
+        """
+        slots = self.limiter.max_slots(slots)
+        if slots > 0:
+            self._admit(remaining_budget(), slots)
+        return Reservation(self, slots)
+
+    def _admit(self, remaining: Optional[float], slots: int = 1):
+        # Raises UpstreamOverloadedError when no slot frees up within the queue wait (or what is left of the budget)
+        if slots == 1 and any(reservation.upstream is self and reservation.take() for reservation in _reservations.get()):
+            return # Admitted with the rest of the request's fan-out
+        if self.limiter.try_acquire(slots):
+            return
+        wait_s = min(self.policy.max_queue_wait_s, remaining) if remaining is not None else self.policy.max_queue_wait_s
+        with span("upstream.queue", upstream=self.name, queued=self.limiter.waiting, slots=slots):
+            self.limiter.acquire(wait_s, slots)
+
+    def _submit(self, attempt: Callable[[Optional[float]], T], timeout_s: float) -> Future:
+        # Takes over an admission slot, released when the attempt finishes (even if nobody waits for it any more).
+        # Each attempt runs in its own copy of the caller's context, so its spans join the caller's trace.
+        try:
+            future = self._attempts.submit(attempt, timeout_s)
+        except BaseException:
+            self.limiter.release()
+            raise
+        future.add_done_callback(lambda _: self.limiter.release())
+        return future
+
+    def _attempt(self, attempt: Callable[[Optional[float]], T], timeout_s: float, call_site: str, hedge: bool) -> T:
+        started = time.monotonic()
+        deadline = started + timeout_s
+        latencies = self._latencies.setdefault(call_site, _LatencyWindow())
+        primary = self._submit(attempt, timeout_s)
+        in_flight = [primary]
+
+        hedge_delay_s = None
+        if hedge and self.policy.hedge_percentile > 0:
+            threshold = latencies.percentile(self.policy.hedge_percentile)
+            if threshold is not None:
+                hedge_delay_s = max(self.policy.hedge_min_delay_s, threshold)
+        if hedge_delay_s is not None and hedge_delay_s < timeout_s:
+            done, _ = wait(in_flight, timeout=hedge_delay_s)
+            if not done and not self.limiter.try_acquire():
+                UPSTREAM_HEDGES.labels(self.name, "throttled").inc() # Never queue for a hedge; it is only extra insurance
+            elif not done:
+                UPSTREAM_HEDGES.labels(self.name, "sent").inc()
+                with span("upstream.hedge", upstream=self.name, delay_ms=round(hedge_delay_s * 1000, 1)):
+                    in_flight.append(self._submit(attempt, deadline - time.monotonic()))
+
+        first_error: Optional[BaseException] = None
+        while in_flight:
+            done, _ = wait(in_flight, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                UPSTREAM_ATTEMPTS.labels(self.name, "timeout").inc()
+                UPSTREAM_DEADLINE_EXCEEDED.labels(self.name).inc()
+                budget_limited = timeout_s < self.policy.timeout_s
+                raise UpstreamTimeoutError(
+                    f"'{self.name}' call did not finish within {timeout_s:.2f}s" + (" (request budget exhausted)." if budget_limited else "."),
+                    budget_limited=budget_limited
+                )
+            for future in done:
+                in_flight.remove(future)
+                error = future.exception()
+                if error is None:
+                    UPSTREAM_ATTEMPTS.labels(self.name, "ok").inc()
+                    latencies.observe(time.monotonic() - started)
+                    if future is not primary:
+                        UPSTREAM_HEDGES.labels(self.name, "won").inc()
+                    return future.result()
+                UPSTREAM_ATTEMPTS.labels(self.name, "error").inc()
+                first_error = first_error or error
+        raise first_error
+
+    def stats(self) -> Dict[str, object]:
+        return {"breaker_state": self.breaker.state, "limiter": self.limiter.stats(), "policy": vars(self.policy)}
+
+
+# Default per-attempt timeouts; speech calls are short, generations can be long
+DEFAULT_UPSTREAM_TIMEOUTS_S = {"llm": 30.0, "stt": 15.0, "tts": 15.0}
+# Default (calls per second, calls in flight) per upstream, below the stock Vertex AI and Cloud Speech/TTS quotas;
+# raise them with UPSTREAM_<NAME>_RATE_PER_S / _MAX_CONCURRENCY when the project has more quota
+DEFAULT_UPSTREAM_LIMITS = {"llm": (10.0, 16), "stt": (10.0, 8), "tts": (15.0, 16)}
+
+_upstreams: Dict[str, Upstream] = {}
+_upstreams_lock = threading.Lock()
+
+def get_upstream(name: str) -> Upstream:
+    """Returns the process-wide Upstream for 'llm', 'stt' or 'tts', configured from UPSTREAM_* variables."""
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        with _upstreams_lock:
+            upstream = _upstreams.get(name)
+            if upstream is None:
+                rate_per_s, max_concurrency = DEFAULT_UPSTREAM_LIMITS.get(name, (0.0, 0))
+                policy = UpstreamPolicy.from_env(name, DEFAULT_UPSTREAM_TIMEOUTS_S.get(name, 30.0), rate_per_s, max_concurrency)
+                # Every attempt in flight holds a concurrency slot, so the attempt pool never needs more threads than that
+                upstream = Upstream(name, policy, max_workers=int(_env_float(name, "MAX_WORKERS", policy.max_concurrency or 32)))
+                _upstreams[name] = upstream
+    return upstream
+
+REGISTRY.callback(
+    "diplomacy_circuit_breaker_state", "Circuit breaker state per upstream: 0 closed, 1 half-open, 2 open.",
+    lambda: {(name, ): {"closed": 0, "half_open": 1, "open": 2}[upstream.breaker.state] for name, upstream in list(_upstreams.items())},
+    ("upstream",)
+)
+REGISTRY.callback(
+    "diplomacy_upstream_queue_depth", "Calls waiting for admission to an upstream.",
+    lambda: {(name, ): upstream.limiter.waiting for name, upstream in list(_upstreams.items())},
+    ("upstream",)
+)
+REGISTRY.callback(
+    "diplomacy_upstream_in_flight", "Calls in flight to an upstream, abandoned attempts included.",
+    lambda: {(name, ): upstream.limiter.in_flight for name, upstream in list(_upstreams.items())},
+    ("upstream",)
+)
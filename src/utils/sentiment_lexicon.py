@@ -0,0 +1,172 @@
+# src/utils/sentiment_lexicon.py
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional
+
+# Valence per word, roughly on a -3..3 scale. Tuned for negotiation/diplomacy dialogue rather than
+# general-purpose text; words that are neutral in this setting ("demand", "position") are left out.
+POSITIVE_WORDS: Dict[str, float] = {
+    "agree": 2.0, "agreed": 2.0, "agreement": 1.5, "appreciate": 2.0, "appreciated": 2.0, "fair": 1.5,
+    "thanks": 2.0, "thank": 2.0, "grateful": 2.0, "good": 1.5, "great": 2.5, "excellent": 2.5,
+    "glad": 2.0, "happy": 2.0, "pleased": 2.0, "welcome": 1.5, "sounds": 0.5, "reasonable": 1.5,
+    "constructive": 2.0, "cooperate": 2.0, "cooperation": 2.0, "collaborate": 2.0, "together": 1.0,
+    "compromise": 1.5, "understand": 1.0, "understood": 1.0, "respect": 1.5, "peace": 2.0, "peaceful": 2.0,
+    "trust": 1.5, "support": 1.5, "helpful": 2.0, "progress": 1.5, "benefit": 1.5, "beneficial": 1.5,
+    "mutual": 1.0, "mutually": 1.0, "common": 0.5, "open": 1.0, "willing": 1.5, "hope": 1.5,
+    "hopeful": 1.5, "optimistic": 2.0, "yes": 1.0, "ok": 0.5, "okay": 0.5, "sure": 1.0, "perfect": 2.5,
+    "wonderful": 2.5, "nice": 1.5, "kind": 1.5, "partner": 1.0, "partnership": 1.5, "solution": 1.0,
+    "resolve": 1.0, "resolution": 1.0, "share": 1.0, "sharing": 1.0, "accept": 1.5, "acceptable": 1.5,
+    "consensus": 1.5, "dialogue": 0.5, "safe": 1.0, "safety": 0.5, "protect": 0.5, "sorry": 0.5,
+    "apologize": 1.0, "please": 0.5, "calm": 1.0, "friendly": 2.0, "honest": 1.0, "win": 1.0,
+}
+NEGATIVE_WORDS: Dict[str, float] = {
+    "disagree": -1.5, "unfair": -2.0, "unacceptable": -2.5, "reject": -2.0, "rejected": -2.0,
+    "refuse": -2.0, "refused": -2.0, "angry": -2.5, "furious": -3.0, "outraged": -3.0, "upset": -2.0,
+    "disappointed": -2.0, "disappointing": -2.0, "frustrated": -2.0, "frustrating": -2.0, "bad": -1.5,
+    "terrible": -2.5, "awful": -2.5, "worst": -2.5, "wrong": -1.5, "lie": -2.5, "lies": -2.5,
+    "lying": -2.5, "liar": -3.0, "cheat": -2.5, "cheating": -2.5, "betray": -3.0, "betrayal": -3.0,
+    "hate": -3.0, "ridiculous": -2.0, "absurd": -2.0, "stupid": -2.5, "idiot": -3.0, "idiots": -3.0,
+    "fool": -2.5, "fools": -2.5, "pathetic": -2.5, "disgrace": -2.5, "disgraceful": -2.5,
+    "shameful": -2.5, "insult": -2.5, "insulting": -2.5, "arrogant": -2.0, "hostile": -2.5,
+    "aggression": -2.5, "aggressive": -2.0, "threat": -2.5, "threaten": -2.5, "problem": -1.0,
+    "fail": -1.5, "failed": -1.5, "failure": -2.0, "blame": -2.0, "fault": -1.5, "suffer": -2.0,
+    "suffering": -2.0, "injustice": -2.5, "unjust": -2.5, "nonsense": -2.0, "worried": -1.5,
+    "concerned": -1.0, "concern": -0.5, "distrust": -2.0, "illegal": -2.0, "illegitimate": -2.5,
+    "steal": -2.5, "stolen": -2.5, "occupy": -2.0, "occupation": -2.0, "violation": -2.5, "violate": -2.5,
+}
+# Words and phrases that signal escalation. Any hit sends the message to the LLM tier, whatever its score.
+ESCALATION_WORDS: FrozenSet[str] = frozenset({
+    "war", "attack", "attacks", "strike", "destroy", "destruction", "kill", "killing", "bomb",
+    "invade", "invasion", "retaliate", "retaliation", "revenge", "punish", "crush", "annihilate",
+    "ultimatum", "sanctions", "blockade", "force", "military", "troops", "weapons", "violence",
+    "violent", "threaten", "threat", "threats", "enemy", "enemies", "die", "death", "blood",
+    "consequences", "regret", "shut", "hostilities", "mobilize", "occupation", "seize",
+})
+ESCALATION_PHRASES = ("or else", "last chance", "final warning", "you will pay", "we will make you", "shut up", "walk away")
+# Stock sarcastic phrases: positive words used to say something negative. Scored as mixed cues.
+SARCASM_PHRASES = ("for nothing", "thanks a lot", "yeah right", "oh great", "oh sure", "how kind", "so kind of you", "big surprise", "good luck with that", "as if")
+# Words that make a message conditional ("we agree - after you surrender"): whatever its tone, the condition decides.
+CONDITIONAL_WORDS: FrozenSet[str] = frozenset({"if", "unless", "after", "until", "once", "provided", "otherwise", "or", "before"})
+# Verbs that start a command when they open a clause ("Leave or be removed"). Demands are never answered locally.
+IMPERATIVE_VERBS: FrozenSet[str] = frozenset({
+    "leave", "go", "get", "give", "surrender", "stop", "withdraw", "remove", "hand", "pull", "submit", "comply",
+    "obey", "pay", "move", "step", "retreat", "return", "release", "evacuate", "disarm", "kneel", "yield",
+    "abandon", "vacate", "cease", "drop", "back", "stand", "accept", "sign", "agree", "do", "don't", "dont",
+})
+# Content-free words that carry no sentiment of their own in this setting. Together with the lists above they are
+# the whole vocabulary the fast path reads: a message with any other word ("good riddance", "starve in peace")
+# says something the lexicon cannot weigh, so it goes to the LLM.
+NEUTRAL_WORDS: FrozenSet[str] = frozenset({
+    "a", "an", "the", "this", "that", "these", "those", "it", "its", "it's", "that's", "i", "i'm", "me", "my",
+    "we", "we're", "we've", "we'll", "us", "our", "ours", "you", "you're", "you've", "your", "yours", "they", "them",
+    "their", "he", "she", "his", "her", "is", "are", "am", "was", "were", "be", "been", "being", "have", "has", "had",
+    "will", "would", "can", "could", "shall", "should", "may", "might", "must", "let", "let's", "lets", "to", "of",
+    "for", "in", "on", "at", "by", "with", "from", "about", "as", "and", "also", "too", "all", "both", "much",
+    "here", "there", "now", "today", "again", "indeed", "well", "oh", "ah", "dear", "friend", "friends", "sir", "madam",
+    "colleague", "colleagues", "side", "sides", "proposal", "proposals", "offer", "offers", "idea", "ideas", "plan",
+    "point", "points", "terms", "deal", "step", "talks", "talk", "discussion", "effort", "efforts", "time",
+    "work", "working", "listen", "listening", "hear", "heard", "see", "think", "believe", "feel", "noted",
+})
+# Openers skipped when looking for the verb that starts a clause ("please leave", "now go")
+_CLAUSE_OPENERS = frozenset({"please", "just", "now", "so", "then", "and", "but", "simply"})
+
+NEGATORS: FrozenSet[str] = frozenset({"not", "no", "never", "dont", "don't", "doesnt", "doesn't", "isnt", "isn't", "cannot", "can't", "wont", "won't", "without", "nor"})
+INTENSIFIERS: Dict[str, float] = {"very": 1.3, "really": 1.3, "extremely": 1.5, "so": 1.2, "totally": 1.4, "completely": 1.4, "absolutely": 1.5, "deeply": 1.3}
+
+_TOKEN = re.compile(r"[a-z']+|[,.;:!?\u2013\u2014-]")
+_CLAUSE_BREAKS = frozenset(",.;:!?-\u2013\u2014")
+_SENTENCE_BREAKS = frozenset(".;:!?-\u2013\u2014") # Everything but the comma: a second statement, not a list
+_NEGATION_WINDOW = 2 # A negator flips words up to this many tokens after it, within the same clause
+_NEGATION_FACTOR = -0.74 # "not good" is mildly negative, not as negative as "bad" (VADER's constant)
+_NORMALIZATION_ALPHA = 15.0 # Maps the summed valence into (-1, 1): s / sqrt(s^2 + alpha)
+
+@dataclass
+class LexiconScore:
+    """
+    Result of scoring one message. sentiment_score is in [-1.0, 1.0]. The structural counts (words, sentences,
+    conditional and imperative cues) tell how far a bag-of-words score can be trusted for the message at all.
+    """
+    sentiment_score: float
+    positive_hits: int
+    negative_hits: int
+    escalation_hits: int
+    sarcasm_hits: int = 0
+    conditional_hits: int = 0
+    imperative_hits: int = 0
+    words: int = 0
+    sentences: int = 0
+    unknown_words: int = 0
+
+    @property
+    def is_mixed(self) -> bool:
+        """Both positive and negative cues, or a stock sarcastic phrase: 'great, you liars' and 'thanks for nothing' land here."""
+        return (self.positive_hits > 0 and self.negative_hits > 0) or self.sarcasm_hits > 0
+
+
+class LexiconSentimentScorer:
+    """
+    Lexicon-based sentiment and escalation scorer that runs in-process in microseconds.
+    Used as an opt-in fast path in front of the facilitator LLM for short, single-statement messages that are
+    clearly benign; a word list cannot read politely phrased threats, so anything more complex goes to the LLM.
+    """
+
+    def __init__(self, positive: Optional[Dict[str, float]] = None, negative: Optional[Dict[str, float]] = None, escalation: Optional[FrozenSet[str]] = None):
+        self.valence: Dict[str, float] = {**(positive or POSITIVE_WORDS), **(negative or NEGATIVE_WORDS)}
+        self.escalation = escalation if escalation is not None else ESCALATION_WORDS
+        self.known = (
+            NEUTRAL_WORDS | NEGATORS | frozenset(INTENSIFIERS) | CONDITIONAL_WORDS | IMPERATIVE_VERBS | _CLAUSE_OPENERS | self.escalation
+        )
+
+    def score(self, text: str) -> LexiconScore:
+        lowered = text.lower()
+        tokens = _TOKEN.findall(lowered)
+        total = 0.0
+        positive_hits = negative_hits = 0
+        escalation_hits = sum(1 for phrase in ESCALATION_PHRASES if phrase in lowered)
+        sarcasm_hits = sum(1 for phrase in SARCASM_PHRASES if re.search(rf"\b{phrase}\b", lowered))
+        conditional_hits = imperative_hits = words = sentences = unknown_words = 0
+        last_negator = -_NEGATION_WINDOW - 1
+        clause_start = sentence_start = True
+        for i, token in enumerate(tokens):
+            if token in _CLAUSE_BREAKS:
+                last_negator = -_NEGATION_WINDOW - 1
+                clause_start = True
+                sentence_start = sentence_start or token in _SENTENCE_BREAKS
+                continue
+            words += 1
+            if sentence_start:
+                sentences += 1
+                sentence_start = False
+            if clause_start and token not in _CLAUSE_OPENERS:
+                clause_start = False
+                if token in IMPERATIVE_VERBS:
+                    imperative_hits += 1
+            if token in CONDITIONAL_WORDS:
+                conditional_hits += 1
+            if token in self.escalation:
+                escalation_hits += 1
+            if token in NEGATORS:
+                last_negator = i # Negators only shift the words after them ("no problem" is not negative)
+                continue
+            valence = self.valence.get(token)
+            if valence is None:
+                if token not in self.known:
+                    unknown_words += 1
+                continue
+            if i > 0 and tokens[i - 1] in INTENSIFIERS:
+                valence *= INTENSIFIERS[tokens[i - 1]]
+            if 0 < i - last_negator <= _NEGATION_WINDOW:
+                valence *= _NEGATION_FACTOR
+            total += valence
+            if valence > 0:
+                positive_hits += 1
+            elif valence < 0:
+                negative_hits += 1
+        sentiment_score = total / math.sqrt(total * total + _NORMALIZATION_ALPHA) if total else 0.0
+        return LexiconScore(
+            round(sentiment_score, 4), positive_hits, negative_hits, escalation_hits,
+            sarcasm_hits=sarcasm_hits, conditional_hits=conditional_hits, imperative_hits=imperative_hits,
+            words=words, sentences=sentences, unknown_words=unknown_words
+        )
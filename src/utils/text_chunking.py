@@ -0,0 +1,70 @@
+# src/utils/text_chunking.py
+
+import re
+from typing import List, Optional
+
+# Sentence end: terminal punctuation, optional closing quotes/brackets, then whitespace.
+# Requiring the whitespace means we never cut "3.5" or "e.g." while the next delta is still pending.
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*\s+")
+# Abbreviations whose period is followed by more of the same sentence ("Dr. Ama", "e.g. the dam")
+_ABBREVIATIONS = frozenset({"mr", "mrs", "ms", "dr", "prof", "st", "gen", "col", "lt", "sgt", "gov", "sen", "rep", "amb", "vs", "e.g", "i.e", "approx"})
+_LAST_WORD = re.compile(r"(\w+(?:\.\w+)*)$")
+
+
+def _ends_with_abbreviation(text: str) -> bool:
+    word = _LAST_WORD.search(text)
+    return word is not None and word.group(1).lower() in _ABBREVIATIONS
+
+
+class SentenceChunker:
+    """
+    Incrementally splits streamed text into sentence-sized chunks for speech synthesis.
+
+    Args:
+        min_chars: Sentences shorter than this are merged with the next one, so TTS is not
+                   called for fragments like "Yes." on their own.
+        max_chars: A chunk that grows past this without a sentence boundary is cut at the last
+                   comma/semicolon (or space), keeping time-to-first-audio bounded for run-on text.
+    """
+
+    def __init__(self, min_chars: int = 20, max_chars: int = 300):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        """Adds a text delta and returns any chunks that are now complete."""
+        self._buffer += delta
+        chunks = []
+        search_from = 0
+        while True:
+            match = _SENTENCE_END.search(self._buffer, search_from)
+            if not match:
+                break
+            if match.group().rstrip() == "." and _ends_with_abbreviation(self._buffer[:match.start()]):
+                search_from = match.end() # Not a sentence end
+                continue
+            candidate = self._buffer[:match.end()].strip()
+            if len(candidate) < self.min_chars:
+                search_from = match.end() # Too short; keep accumulating into the next sentence
+                continue
+            chunks.append(candidate)
+            self._buffer = self._buffer[match.end():]
+            search_from = 0
+
+        while len(self._buffer) > self.max_chars:
+            window = self._buffer[:self.max_chars]
+            cut = max(window.rfind(", "), window.rfind("; "))
+            if cut <= 0:
+                cut = window.rfind(" ")
+            if cut <= 0:
+                cut = self.max_chars - 1
+            chunks.append(self._buffer[:cut + 1].strip())
+            self._buffer = self._buffer[cut + 1:]
+        return chunks
+
+    def flush(self) -> Optional[str]:
+        """Returns whatever text is left once the stream has ended."""
+        remainder = self._buffer.strip()
+        self._buffer = ""
+        return remainder or None
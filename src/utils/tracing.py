@@ -0,0 +1,204 @@
+# src/utils/tracing.py
+
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger("diplomacy.trace")
+
+# Spans kept per trace; a large batch request records a summary of what was dropped instead of growing without bound
+MAX_SPANS_PER_TRACE = int(os.getenv("TRACE_MAX_SPANS", "256"))
+
+_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+def trace_id_from_headers(headers) -> Optional[str]:
+    """Incoming trace ID from an X-Trace-Id header or a W3C traceparent header, or None if neither is usable."""
+    trace_id = (headers.get("x-trace-id") or "").strip()
+    if _TRACE_ID.match(trace_id):
+        return trace_id
+    match = _TRACEPARENT.match((headers.get("traceparent") or "").strip().lower())
+    return match.group(1) if match else None
+
+
+class Span:
+    """One timed stage of a trace. Attributes can be added while the span is open with set()."""
+    __slots__ = ("name", "span_id", "parent_id", "attributes", "start", "end", "status", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return round((self.end - self.start) * 1000, 1) if self.end is not None else None
+
+
+class Trace:
+    """
+    Spans recorded while serving one request (or one background job). Spans may finish on worker
+    threads as well as on the event loop, so recording is locked.
+    """
+
+    def __init__(self, trace_id: Optional[str] = None, name: str = "request", attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id or new_trace_id()
+        self.name = name
+        self.attributes = attributes or {} # Logged with the trace, e.g. method, path and status code
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+
+    def record(self, span: Span):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+
+    def timings(self) -> Dict[str, Any]:
+        """The finished spans with offsets relative to the start of the trace, in start order."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+            dropped = self.dropped_spans
+        result = {
+            "trace_id": self.trace_id,
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 1),
+            "spans": [
+                {
+                    "name": s.name,
+                    "span_id": s.span_id,
+                    "parent_id": s.parent_id,
+                    "start_ms": round((s.start - self.start) * 1000, 1),
+                    "duration_ms": s.duration_ms,
+                    "status": s.status,
+                    **({"error": s.error} if s.error else {}),
+                    "attributes": s.attributes
+                }
+                for s in spans
+            ]
+        }
+        if dropped:
+            result["dropped_spans"] = dropped
+        return result
+
+
+# Both variables are copied into tasks (asyncio.create_task/gather) and worker threads (asyncio.to_thread),
+# so spans opened there nest under the span that was current when the work was handed off.
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("diplomacy_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("diplomacy_span", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+def current_span_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.span_id if span is not None else None
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Times a stage of the current trace. Nests under the enclosing span; outside of a trace the span is
+    still timed (callers may read duration_ms) but not recorded anywhere.
+    """
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent is not None else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.error = str(e) or type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Closed from a different context than it was opened in (e.g. a generator finalized elsewhere)
+            _current_span.set(parent)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(current)
+
+@contextmanager
+def start_trace(name: str = "request", trace_id: Optional[str] = None, **attributes: Any) -> Iterator[Trace]:
+    """
+    Starts a new trace (replacing any current one) and logs its spans as one structured record when it ends.
+    Background jobs use this so their spans are not attributed to the request that scheduled them.
+    """
+    trace = Trace(trace_id, name, attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    status = "ok"
+    try:
+        yield trace
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        if logger.isEnabledFor(logging.INFO):
+            timings = trace.timings()
+            logger.info(f"{name} finished", extra={
+                "trace_id": trace.trace_id,
+                "trace_status": status,
+                "duration_ms": timings["total_ms"],
+                **trace.attributes,
+                "spans": timings["spans"],
+                **({"dropped_spans": timings["dropped_spans"]} if "dropped_spans" in timings else {})
+            })
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware that runs every HTTP request inside its own trace. The trace ID is taken from the
+    X-Trace-Id or traceparent request header when present (so a caller's ID carries through) and echoed
+    in the X-Trace-Id response header. The trace is logged once the response has been fully sent, so
+    streamed responses include every stage.
+
+    Args:
+        app: The wrapped ASGI application.
+        exclude_paths: Paths served without a trace or a log record (health checks, metric scrapes).
+    """
+
+    def __init__(self, app, exclude_paths: Iterable[str] = ()):
+        self.app = app
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        with start_trace("request", trace_id_from_headers(headers), method=scope["method"], path=scope["path"]) as trace:
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    trace.attributes["status_code"] = message["status"]
+                    message = {**message, "headers": [*message.get("headers", []), (b"x-trace-id", trace.trace_id.encode("latin-1"))]}
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
@@ -0,0 +1,123 @@
+# src/utils/worker_pools.py
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from src.utils.metrics import REGISTRY
+
+T = TypeVar("T")
+
+POOL_QUEUE_WAIT = REGISTRY.histogram("diplomacy_worker_pool_queue_wait_seconds", "Time work waited for a free thread, by pool.", ("pool",))
+POOL_BUSY = REGISTRY.counter("diplomacy_worker_pool_busy_seconds_total", "Thread time spent running work, by pool (rate / workers = utilization).", ("pool",))
+POOL_COMPLETED = REGISTRY.counter("diplomacy_worker_pool_completed_total", "Work items finished, by pool.", ("pool",))
+
+class WorkerPool:
+    """
+    A named, fixed-size thread pool for the blocking SDK calls of one dependency. Each upstream gets its own,
+    so a slow dependency can only exhaust its own threads. Tracks queued and running work, queue wait and
+    busy time for the utilization metrics.
+
+    Args:
+        name: Pool name, used in metrics and thread names.
+        max_workers: Number of threads.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.queued = 0
+        self.active = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"pool-{name}")
+        self._lock = threading.Lock()
+        self._queue_wait = POOL_QUEUE_WAIT.labels(name)
+        self._busy = POOL_BUSY.labels(name)
+        self._completed = POOL_COMPLETED.labels(name)
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Future:
+        """Runs fn on the pool in a copy of the caller's context, so trace spans and the request budget carry over."""
+        context = contextvars.copy_context()
+        submitted = time.perf_counter()
+
+        def run() -> T:
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+            self._queue_wait.observe(started - submitted)
+            try:
+                return context.run(fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                self._busy.inc(time.perf_counter() - started)
+                self._completed.inc()
+
+        with self._lock:
+            self.queued += 1
+        try:
+            future = self._executor.submit(run)
+        except BaseException:
+            with self._lock:
+                self.queued -= 1
+            raise
+
+        def forget_if_cancelled(done: Future):
+            # Work cancelled while still queued (e.g. its request went away) never reaches run()
+            if done.cancelled():
+                with self._lock:
+                    self.queued -= 1
+
+        future.add_done_callback(forget_if_cancelled)
+        return future
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Awaitable submit() for the event loop; use it instead of asyncio.to_thread and the shared default executor."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active, queued = self.active, self.queued
+        return {
+            "workers": self.max_workers,
+            "active": active,
+            "queued": queued,
+            "utilization": round(active / self.max_workers, 3)
+        }
+
+
+# Default pool sizes: LLM generations are slow and numerous, speech calls short; 'sessions' serves the SQLite/Redis
+# session stores. Override with WORKER_POOL_<NAME>_SIZE.
+DEFAULT_POOL_SIZES = {"llm": 32, "stt": 8, "tts": 16, "sessions": 8}
+
+_pools: Dict[str, WorkerPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(name: str, default_size: Optional[int] = None) -> WorkerPool:
+    """Returns the process-wide pool with this name ('llm', 'stt', 'tts', ...), creating it on first use."""
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                env_name = name.upper().replace(".", "_").replace("-", "_")
+                size = int(os.getenv(f"WORKER_POOL_{env_name}_SIZE") or default_size or DEFAULT_POOL_SIZES.get(name, 8))
+                pool = WorkerPool(name, max(1, size))
+                _pools[name] = pool
+    return pool
+
+async def run_in_pool(pool_name: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Runs a blocking call on the named dependency's pool, e.g. run_in_pool('tts', synthesize, text)."""
+    return await get_pool(pool_name).run(fn, *args, **kwargs)
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.stats() for name, pool in list(_pools.items())}
+
+REGISTRY.callback("diplomacy_worker_pool_workers", "Threads per worker pool.", lambda: {(name, ): pool.max_workers for name, pool in list(_pools.items())}, ("pool",))
+REGISTRY.callback("diplomacy_worker_pool_active", "Threads currently running work, by pool.", lambda: {(name, ): pool.active for name, pool in list(_pools.items())}, ("pool",))
+REGISTRY.callback("diplomacy_worker_pool_queued", "Work waiting for a free thread, by pool.", lambda: {(name, ): pool.queued for name, pool in list(_pools.items())}, ("pool",))
+REGISTRY.callback("diplomacy_worker_pool_utilization", "Share of a pool's threads currently busy (0-1).", lambda: {(name, ): pool.active / pool.max_workers for name, pool in list(_pools.items())}, ("pool",))
@@ -0,0 +1,42 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+# Offline backends before anything imports the services
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("AUDIO_BACKEND", "stub")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.llm_agent import LLMAgent
+from src.models.llm_backends import StubBackend, set_default_backend
+from src.services.audio_service import AudioService
+from src.services.audio_stubs import StubSpeechClient, StubTextToSpeechClient
+from src.services.negotiation_service import NegotiationService
+from src.services.session_store import InMemorySessionStore
+
+
+@pytest.fixture
+def stub_llm():
+    """Installs an instant StubBackend as the process-wide LLM backend; call it with StubBackend arguments."""
+    def install(**kwargs) -> StubBackend:
+        backend = StubBackend(**{"ttft_s": 0.0, "tokens_per_s": 0.0, **kwargs})
+        set_default_backend(backend)
+        return backend
+
+    install()
+    yield install
+    set_default_backend(None)
+
+
+@pytest.fixture
+def make_service(stub_llm):
+    """Builds a NegotiationService on the stub LLM, instant stub audio and an in-memory session store."""
+    def build(**kwargs) -> NegotiationService:
+        audio_service = AudioService(stt_client=StubSpeechClient(latency_s=0.0), tts_client=StubTextToSpeechClient(latency_s=0.0))
+        kwargs.setdefault("session_store", InMemorySessionStore())
+        return NegotiationService(LLMAgent(), audio_service, **kwargs)
+
+    return build
@@ -0,0 +1,32 @@
+# tests/test_audio_store.py
+
+import time
+
+from src.services.audio_store import AudioStore
+
+
+def test_round_trip_and_byte_budget():
+    store = AudioStore(max_bytes=10)
+    first = store.put(b"123456")
+    assert store.get(first) == (b"123456", "audio/mpeg")
+    second = store.put(b"abcdef", "audio/ogg")
+    assert store.get(first) is None # Over the byte budget: the least recently fetched clip goes
+    assert store.get(second) == (b"abcdef", "audio/ogg")
+
+
+def test_expired_clips_are_evicted_without_being_fetched(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    store = AudioStore(ttl_s=60)
+    stale = [store.put(b"x" * 100) for _ in range(3)]
+    now[0] += 61
+    fresh = store.put(b"y" * 10)
+    stats = store.stats()
+    assert stats["entries"] == 1 and stats["bytes"] == 10 and stats["expirations"] == 3
+    assert all(store.get(audio_id) is None for audio_id in stale)
+    assert store.get(fresh) == (b"y" * 10, "audio/mpeg")
+
+
+def test_injected_store_is_kept(make_service):
+    store = AudioStore(max_bytes=1024)
+    assert make_service(audio_store=store).audio_store is store
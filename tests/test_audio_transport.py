@@ -0,0 +1,63 @@
+# tests/test_audio_transport.py
+
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from main import _parse_byte_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-3", (0, 3)),
+    ("bytes=-4", (6, 9)), # Suffix range: the last 4 bytes
+    ("bytes=-20", (0, 9)), # A suffix longer than the clip is the whole clip
+    ("bytes=3-", (3, 9)), # Open-ended
+    ("bytes=2-100", (2, 9)), # The end is clamped to the clip
+    ("bytes=0-1,4-5", None), # Multiple ranges: the full body is sent instead
+    ("items=0-1", None),
+])
+def test_byte_range_parsing(header, expected):
+    assert _parse_byte_range(header, 10) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=10-", "bytes=5-2", "bytes=-0", "bytes=a-b"])
+def test_unsatisfiable_or_malformed_byte_ranges_are_rejected(header):
+    with pytest.raises(ValueError):
+        _parse_byte_range(header, 10)
+
+
+def _request(method, url, **kwargs):
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.request(method, url, **kwargs)
+    return asyncio.run(send())
+
+
+def test_audio_endpoint_serves_ranges():
+    audio_id = main.negotiation_service.audio_store.put(b"0123456789")
+    suffix = _request("GET", f"/audio/{audio_id}", headers={"Range": "bytes=-4"})
+    assert suffix.status_code == 206 and suffix.content == b"6789"
+    assert suffix.headers["content-range"] == "bytes 6-9/10"
+    assert _request("GET", f"/audio/{audio_id}", headers={"Range": "bytes=3-"}).content == b"3456789"
+    unsatisfiable = _request("GET", f"/audio/{audio_id}", headers={"Range": "bytes=20-"})
+    assert unsatisfiable.status_code == 416 and unsatisfiable.headers["content-range"] == "bytes */10"
+    multiple = _request("GET", f"/audio/{audio_id}", headers={"Range": "bytes=0-1,4-5"})
+    assert multiple.status_code == 200 and multiple.content == b"0123456789"
+    assert _request("GET", "/audio/unknown").status_code == 404
+
+
+@pytest.mark.parametrize("url", ["/negotiate/turn/audio", "/dialogue/facilitate/audio"])
+def test_uploads_without_an_audio_part_are_rejected(url):
+    response = _request("POST", url, data={"session_id": "s", "speaker_id": "user"}, files={"recording": ("r.webm", b"abc", "audio/webm")})
+    assert response.status_code == 400
+    assert "'audio'" in response.json()["detail"]
+    empty = _request("POST", url, params={"session_id": "s", "speaker_id": "user"}, content=b"", headers={"Content-Type": "audio/webm"})
+    assert empty.status_code == 400
+
+
+def test_facilitation_accepts_a_raw_audio_body(stub_llm):
+    response = _request("POST", "/dialogue/facilitate/audio", params={"speaker_id": "user"}, content=b"\x1a\x45\xdf\xa3", headers={"Content-Type": "audio/webm"})
+    assert response.status_code == 200
+    assert set(response.json()) >= {"sentiment_score", "escalation_flag", "intervention"}
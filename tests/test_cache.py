@@ -0,0 +1,52 @@
+# tests/test_cache.py
+
+import time
+
+from src.utils.cache import LRUCache
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1 # 'b' is now the least recently used
+    cache.put("c", 3)
+    assert "b" not in cache and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_byte_budget_bounds_the_total_size():
+    cache = LRUCache(100, max_bytes=10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    cache.put("c", b"1")
+    assert "a" not in cache and cache.stats()["bytes"] == 6
+    cache.put("huge", b"x" * 11) # Larger than the whole budget: not cached, nothing evicted
+    assert "huge" not in cache and len(cache) == 2
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = LRUCache(10, ttl_s=5)
+    cache.put("a", 1)
+    now[0] += 3
+    cache.put("b", 2)
+    cache.put("a", 1) # Re-putting restarts the entry's TTL
+    now[0] += 3
+    assert cache.get("b") == 2 and cache.get("a") == 1
+    now[0] += 3
+    assert cache.get("b") is None
+    assert cache.purge_expired() == 1 # 'a'
+    assert len(cache) == 0 and cache.expirations == 2
+
+
+def test_hit_rate_and_disabled_cache():
+    cache = LRUCache(4)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("missing")
+    assert cache.stats()["hit_rate"] == 0.5
+    disabled = LRUCache(0)
+    disabled.put("a", 1)
+    assert disabled.get("a") is None
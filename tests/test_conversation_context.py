@@ -0,0 +1,69 @@
+# tests/test_conversation_context.py
+
+import asyncio
+
+NEGOTIATORS = [{"id": "ai_north", "persona_type": "hardliner", "initial_stance": "Keep the dam."}, {"id": "ai_south", "persona_type": "pragmatist", "initial_stance": "Share the water."}]
+
+
+def _prompts(service, session):
+    return {ai_info["id"]: prompt for ai_info, prompt in service._build_turn_prompts(session)}
+
+
+def test_turn_prompts_carry_only_what_each_agent_has_not_seen(make_service, stub_llm):
+    stub_llm(replies=["Greeting one.", "Greeting two.", "Reply one.", "Reply two."])
+
+    async def scenario():
+        service = make_service(conversation_token_budget=0)
+        session_id = (await service.start_negotiation("water", "mediator", NEGOTIATORS))["session_id"]
+        session = service.session_store.get(session_id)
+        assert session["agent_cursors"] == {"ai_north": 0, "ai_south": 0}
+
+        await service.take_turn(session_id, "user", message="First proposal.")
+        session = service.session_store.get(session_id)
+        # Both replied having seen the greetings and the first proposal
+        assert session["agent_cursors"] == {"ai_north": 3, "ai_south": 3}
+
+        session["conversation_history"].append({"speaker_id": "user", "message": "Second proposal."})
+        prompts = _prompts(service, session)
+        north_reply, south_reply = session["conversation_history"][3]["message"], session["conversation_history"][4]["message"]
+        assert "First proposal." not in prompts["ai_north"] and "Second proposal." in prompts["ai_north"]
+        assert "Greeting" not in prompts["ai_north"]
+        # Each agent gets the other's reply, never its own
+        assert south_reply in prompts["ai_north"] and north_reply not in prompts["ai_north"]
+        assert north_reply in prompts["ai_south"] and south_reply not in prompts["ai_south"]
+
+    asyncio.run(scenario())
+
+
+def test_summarization_folds_old_turns_and_prunes_transcripts(make_service):
+    async def scenario():
+        service = make_service(conversation_token_budget=20, summary_keep_recent_turns=2)
+        session_id = (await service.start_negotiation("water", "mediator", NEGOTIATORS))["session_id"]
+        await service.take_turn(session_id, "user", message="We propose sharing the reservoir equally during the dry season.")
+        await asyncio.gather(*list(service._summary_tasks.values()))
+
+        session = service.session_store.get(session_id)
+        history = session["conversation_history"]
+        assert session["summary"]
+        assert session["summarized_turns"] == len(history) - 2
+        # Only exchanges about turns that are still verbatim stay in the transcripts
+        for transcript in session["agent_transcripts"].values():
+            assert all(entry["turn_index"] >= session["summarized_turns"] for entry in transcript)
+        # Folded turns reach the agents through the summary, not the delta prompt
+        session["conversation_history"].append({"speaker_id": "user", "message": "Any counter-offer?"})
+        assert "We propose sharing" not in _prompts(service, session)["ai_north"]
+        rebuilt = service._agent_factory(session, "ai_north")()
+        assert session["summary"] in rebuilt._initial_messages[0]["content"]
+
+    asyncio.run(scenario())
+
+
+def test_no_summary_below_the_token_budget(make_service):
+    async def scenario():
+        service = make_service(conversation_token_budget=100_000, summary_keep_recent_turns=2)
+        session_id = (await service.start_negotiation("water", "mediator", NEGOTIATORS))["session_id"]
+        await service.take_turn(session_id, "user", message="Hello.")
+        assert not service._summary_tasks
+        assert service.session_store.get(session_id)["summarized_turns"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,185 @@
+# tests/test_facilitator.py
+
+import asyncio
+import json
+
+import pytest
+
+from src.services.negotiation_service import NegotiationService
+from src.utils.cache import LRUCache
+from src.utils.sentiment_lexicon import LexiconSentimentScorer
+
+
+def test_complete_json_reply_is_clamped_and_marked_complete():
+    analysis, complete = NegotiationService._parse_facilitator_analysis(
+        '```json\n{"sentiment_score": 3, "escalation_flag": "true", "intervention": null}\n```'
+    )
+    assert complete
+    assert analysis == {"sentiment_score": 1.0, "escalation_flag": True, "intervention": None, "tier": "llm"}
+
+
+@pytest.mark.parametrize("raw_response", [
+    '{"sentiment": -0.5}',
+    '{"sentiment_score": -0.5, "intervention": null}',
+    '{"sentiment_score": -0.5, "escalation_flag": false}',
+    '{"sentiment_score": "very bad", "escalation_flag": false, "intervention": null}',
+    '{"sentiment_score": NaN, "escalation_flag": false, "intervention": null}',
+    '[1, 2]',
+])
+def test_incomplete_json_reply_is_rejected(raw_response):
+    with pytest.raises(ValueError):
+        NegotiationService._parse_facilitator_analysis(raw_response)
+
+
+def test_non_json_reply_falls_back_but_is_not_complete():
+    analysis, complete = NegotiationService._parse_facilitator_analysis("The sentiment is negative.")
+    assert not complete
+    assert analysis["sentiment_score"] == -0.8
+
+
+def test_batch_reply_skips_malformed_entries():
+    analyses = NegotiationService._parse_facilitator_batch(
+        '{"segment_results": [{"index": 1, "sentiment_score": -2, "escalation_flag": true, "intervention": "Pause"},'
+        ' {"index": 0, "sentiment_score": 0.3}]}', 2
+    )
+    assert analyses[0] is None
+    assert analyses[1] == {"sentiment_score": -1.0, "escalation_flag": True, "intervention": "Pause", "tier": "llm"}
+
+
+def _entry(index, score):
+    return {"index": index, "sentiment_score": score, "escalation_flag": False, "intervention": None}
+
+
+def test_batch_reply_drops_out_of_range_indices_and_non_dict_entries():
+    raw_response = json.dumps({"segment_results": [_entry(5, 0.1), _entry(-1, 0.2), "oops", None, 7, _entry(2, 0.3)]})
+    analyses = NegotiationService._parse_facilitator_batch(raw_response, 3)
+    assert analyses == [None, None, {"sentiment_score": 0.3, "escalation_flag": False, "intervention": None, "tier": "llm"}]
+
+
+def test_batch_entries_without_an_index_map_by_position():
+    entries = [_entry(0, 0.1), _entry(1, 0.2)]
+    for entry in entries:
+        del entry["index"]
+    analyses = NegotiationService._parse_facilitator_batch(json.dumps({"segment_results": entries}), 3)
+    assert [analysis and analysis["sentiment_score"] for analysis in analyses] == [0.1, 0.2, None]
+
+
+@pytest.mark.parametrize("raw_response", ["not json", '{"results": []}', '["a"]', '{"segment_results": "none"}'])
+def test_unusable_batch_reply_leaves_every_segment_unanswered(raw_response):
+    assert NegotiationService._parse_facilitator_batch(raw_response, 2) == [None, None]
+
+
+SEGMENTS = [{"speaker_id": "a", "message": f"Statement number {i}."} for i in range(3)]
+
+
+def _scripted_completions(service, packed_reply):
+    """Replaces the LLM round-trip: packed prompts get packed_reply (raised if it is an exception), single ones a fixed analysis."""
+    prompts = []
+
+    def complete(prompt, call_site):
+        prompts.append("packed" if prompt.startswith("Analyze each of the numbered") else "single")
+        if prompts[-1] == "single":
+            return json.dumps(_entry(0, -0.5))
+        if isinstance(packed_reply, Exception):
+            raise packed_reply
+        return packed_reply
+    service._one_shot_completion = complete
+    return prompts
+
+
+def test_failed_packed_call_falls_back_to_single_requests(make_service):
+    service = make_service(fast_path=False, facilitator_batch_size=3)
+    prompts = _scripted_completions(service, RuntimeError("model unavailable"))
+    analyses = asyncio.run(service.facilitate_dialogue_batch("s", SEGMENTS))
+    assert prompts == ["packed", "single", "single", "single"]
+    assert [analysis["sentiment_score"] for analysis in analyses] == [-0.5, -0.5, -0.5]
+
+
+def test_segments_the_packed_reply_misses_get_their_own_request(make_service):
+    service = make_service(fast_path=False, facilitator_batch_size=3)
+    prompts = _scripted_completions(service, json.dumps({"segment_results": [_entry(2, 0.4), _entry(9, 0.9)]}))
+    analyses = asyncio.run(service.facilitate_dialogue_batch("s", SEGMENTS))
+    assert prompts == ["packed", "single", "single"]
+    assert [analysis["sentiment_score"] for analysis in analyses] == [-0.5, -0.5, 0.4]
+    # Only the analysis the packed reply covered was cached from it; the rest were cached by their own requests
+    assert service._cached_analysis(SEGMENTS[2]["message"])["sentiment_score"] == 0.4
+
+
+def test_malformed_analysis_is_an_error_and_never_cached(make_service, stub_llm):
+    stub_llm(replies=['{"sentiment": "negative"}'])
+    service = make_service(fast_path=False)
+    message = "You never listen to us."
+
+    for _ in range(2):
+        analysis = asyncio.run(service.facilitate_dialogue("s", "user", message))
+        assert analysis["escalation_flag"] is True
+        assert analysis["intervention"].startswith("Error processing dialogue")
+        assert analysis["tier"] == "llm"
+    assert service._cached_analysis(message) is None
+
+
+def test_fallback_analysis_is_not_cached(make_service, stub_llm):
+    stub_llm(replies=["Sentiment: negative. Intervention: take a break"])
+    service = make_service(fast_path=False)
+    message = "You never listen to us."
+
+    analysis = asyncio.run(service.facilitate_dialogue("s", "user", message))
+    assert analysis["sentiment_score"] == -0.8
+    assert service._cached_analysis(message) is None
+
+
+def test_complete_analysis_is_cached(make_service, stub_llm):
+    stub_llm(replies=['{"sentiment_score": -0.4, "escalation_flag": false, "intervention": "Acknowledge the concern."}'])
+    service = make_service(fast_path=False)
+    message = "You never listen to us."
+
+    assert asyncio.run(service.facilitate_dialogue("s", "user", message))["tier"] == "llm"
+    assert asyncio.run(service.facilitate_dialogue("s", "user", message.upper()))["tier"] == "cache"
+
+
+def test_injected_empty_cache_is_kept(make_service):
+    # A fresh cache is falsy (it defines __len__) but must not be swapped for the default one
+    cache = LRUCache(8)
+    assert make_service(facilitator_cache=cache).facilitator_cache is cache
+
+
+LLM_ANALYSIS = '{"sentiment_score": -0.7, "escalation_flag": true, "intervention": "Name the threat and slow down."}'
+
+
+def test_fast_path_is_off_by_default(make_service):
+    assert make_service().sentiment_scorer is None
+    assert make_service(fast_path=False, sentiment_scorer=LexiconSentimentScorer()).sentiment_scorer is None
+
+
+@pytest.mark.parametrize("message", [
+    "Thank you, we accept. Your people will be gone by spring.",
+    "Sure, we agree - after you surrender the province.",
+    "We respect you. Leave or be removed.",
+    "Thanks for nothing.",
+    "We appreciate your offer, if you withdraw first.",
+    "Please leave, we appreciate it.",
+    "Oh great, another fair proposal.",
+    "We are glad to cooperate and share the river with you as partners for many years to come.",
+    "Thanks, good riddance",
+    "Good, now your people can finally starve in peace",
+    "Thanks and good luck to your widows",
+])
+def test_fast_path_leaves_threats_and_sarcasm_to_the_llm(make_service, stub_llm, message):
+    stub_llm(replies=[LLM_ANALYSIS])
+    service = make_service(fast_path=True)
+    analysis = asyncio.run(service.facilitate_dialogue("s", "user", message))
+    assert analysis["tier"] == "llm"
+    assert analysis["escalation_flag"] is True
+
+
+@pytest.mark.parametrize("message", ["Thank you, that sounds fair.", "We appreciate the constructive proposal!", "Agreed, thank you."])
+def test_fast_path_answers_short_benign_acknowledgements(make_service, message):
+    analysis = asyncio.run(make_service(fast_path=True).facilitate_dialogue("s", "user", message))
+    assert analysis["tier"] == "lexicon"
+    assert analysis["escalation_flag"] is False
+
+
+def test_lexicon_counts_words_outside_its_vocabulary():
+    scorer = LexiconSentimentScorer()
+    assert scorer.score("Thank you, that sounds fair.").unknown_words == 0
+    assert scorer.score("Thanks and good luck to your widows").unknown_words == 2 # 'luck', 'widows'
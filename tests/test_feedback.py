@@ -0,0 +1,159 @@
+# tests/test_feedback.py
+
+import asyncio
+import json
+
+import pytest
+
+from src.services import negotiation_service as negotiation_module
+
+NEGOTIATORS = [{"id": "ai_north", "persona_type": "hardliner", "initial_stance": "Keep the river."}]
+
+
+def _count_feedback_jobs(service):
+    started = []
+    generate = service._generate_feedback
+
+    async def counting(session_id, version, scheduled_by=None):
+        started.append(version)
+        return await generate(session_id, version, scheduled_by)
+    service._generate_feedback = counting
+    return started
+
+
+def test_feedback_is_scheduled_once_when_a_deal_is_proposed(make_service):
+    async def scenario():
+        service = make_service()
+        started = _count_feedback_jobs(service)
+        session_id = (await service.start_negotiation("water", "mediator", NEGOTIATORS))["session_id"]
+        await service.take_turn(session_id, "user", message="Let us talk.")
+        await service.take_turn(session_id, "user", message="I think we have a deal.")
+        await asyncio.sleep(0)
+        assert len(started) == 1
+        # Still agreement_proposed: later turns must not start a full feedback job each
+        await service.take_turn(session_id, "user", message="About that deal, one more detail.")
+        await service.take_turn(session_id, "user", message="And the deal covers fishing rights.")
+        await asyncio.sleep(0)
+        assert len(started) == 1
+        await service.take_turn(session_id, "user", message="Then we end negotiation here.")
+        await asyncio.sleep(0)
+        assert len(started) == 2
+        feedback = await service.get_feedback(session_id, wait_s=1.0)
+        assert feedback["status"] == "ready"
+
+    asyncio.run(scenario())
+
+
+def test_failed_feedback_is_forgotten_after_retention(make_service, monkeypatch):
+    monkeypatch.setattr(negotiation_module, "FEEDBACK_FAILURE_RETENTION_S", 0.01)
+
+    async def scenario():
+        service = make_service()
+        session_id = (await service.start_negotiation("water", "mediator", NEGOTIATORS))["session_id"]
+
+        async def failing(session):
+            raise RuntimeError("model unavailable")
+        service._feedback_completion = failing
+        await service.take_turn(session_id, "user", message="end negotiation")
+        await asyncio.sleep(0.005)
+        assert session_id in service._feedback_tasks # Kept for get_feedback to report
+        await asyncio.sleep(0.05)
+        assert session_id not in service._feedback_tasks # Nobody asked; the next request starts afresh
+
+    asyncio.run(scenario())
+
+
+def test_feedback_is_stored_per_history_version(make_service):
+    async def scenario():
+        service = make_service()
+        started = _count_feedback_jobs(service)
+        session_id = (await service.start_negotiation("water", "mediator", NEGOTIATORS))["session_id"]
+        first = await service.get_feedback(session_id, wait_s=1.0)
+        assert first["status"] == "ready" and first["history_version"] == 0
+        assert (await service.get_feedback(session_id))["status"] == "ready" # Stored on the session: no new job
+        assert started == [0]
+
+        await service.take_turn(session_id, "user", message="Let us talk.")
+        second = await service.get_feedback(session_id, wait_s=1.0)
+        assert second["status"] == "ready" and second["history_version"] == 1
+        assert started == [0, 1]
+        assert service.session_store.get(session_id)["feedback"]["history_version"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_feedback_for_an_outdated_history_is_not_stored(make_service):
+    async def scenario():
+        service = make_service()
+        session_id = (await service.start_negotiation("water", "mediator", NEGOTIATORS))["session_id"]
+        analyzed, release = [], asyncio.Event()
+        complete = service._feedback_completion
+
+        async def gated(session):
+            await release.wait()
+            analyzed.append([turn["message"] for turn in session["conversation_history"]])
+            return await complete(session)
+        service._feedback_completion = gated
+        assert (await service.get_feedback(session_id))["status"] == "pending"
+        job = service._feedback_tasks[session_id][1]
+        await asyncio.sleep(0)
+        await service.take_turn(session_id, "user", message="Let us talk.") # Lands while version 0 is analyzed
+        release.set()
+        await job
+        assert "Let us talk." not in analyzed[0] # The job analyzed version 0, not the turn in flight
+        assert "feedback" not in service.session_store.get(session_id)
+        assert (await service.get_feedback(session_id))["status"] == "pending" # Version 1 needs its own job
+
+    asyncio.run(scenario())
+
+
+def _history(count, chars=36):
+    return [{"speaker_id": "user", "message": "x" * chars} for _ in range(count)]
+
+
+def test_feedback_windows_split_at_the_token_budget(make_service):
+    service = make_service(feedback_window_tokens=25) # Each '[n] User: ' line of 36 characters is 12 tokens
+    windows = service._feedback_windows(_history(5))
+    assert [window.count("\n") + 1 for window in windows] == [2, 2, 1]
+    assert windows[1].startswith("[3] User: ") and windows[2].startswith("[5] User: ")
+    # A turn longer than the whole budget still gets a window of its own
+    assert len(service._feedback_windows(_history(1, chars=400) + _history(1))) == 2
+    assert service._feedback_windows([]) == []
+
+
+def _scripted_feedback(service, failing_parts):
+    """Replaces the LLM round-trip: window prompts for failing_parts raise, the others and the reduce prompt answer."""
+    reduce_prompts = []
+
+    def complete(prompt, call_site):
+        if prompt.startswith("Below is part"):
+            part = int(prompt.split()[3])
+            if part in failing_parts:
+                raise RuntimeError(f"part {part} failed")
+            return json.dumps({"key_moments": [f"moment {part}"]})
+        reduce_prompts.append(prompt)
+        return json.dumps({"final_outcome": "Stalemate", "feedback_summary": "Merged.", "specific_suggestions": []})
+    service._one_shot_completion = complete
+    return reduce_prompts
+
+
+def _long_session():
+    return {"conversation_history": _history(5), "user_persona": "mediator", "current_status": "ongoing"}
+
+
+def test_feedback_reduce_merges_the_windows_that_succeeded(make_service):
+    service = make_service(feedback_window_tokens=25)
+    reduce_prompts = _scripted_feedback(service, failing_parts={2})
+    feedback = json.loads(asyncio.run(service._feedback_completion(_long_session())))
+    assert feedback["feedback_summary"] == "Merged."
+    assert len(reduce_prompts) == 1
+    assert "Parts analyzed: 2 of 3" in reduce_prompts[0]
+    assert "moment 1" in reduce_prompts[0] and "moment 3" in reduce_prompts[0] and "moment 2" not in reduce_prompts[0]
+
+
+def test_feedback_fails_when_every_window_fails(make_service):
+    service = make_service(feedback_window_tokens=25)
+    reduce_prompts = _scripted_feedback(service, failing_parts={1, 2, 3})
+    with pytest.raises(RuntimeError, match="part 1 failed"):
+        asyncio.run(service._feedback_completion(_long_session()))
+    assert reduce_prompts == []
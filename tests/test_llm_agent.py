@@ -0,0 +1,48 @@
+# tests/test_llm_agent.py
+
+from src.models.llm_agent import LLMAgent
+from src.models.llm_backends import StubBackend, _TimeoutPredictionClient
+from src.models.model_registry import ModelRegistry
+from src.utils import resilience
+from src.utils.resilience import Upstream, UpstreamPolicy
+
+
+class TimeoutRecordingBackend(StubBackend):
+    def __init__(self):
+        super().__init__(ttft_s=0.0, tokens_per_s=0.0)
+        self.timeouts = []
+
+    def send_message(self, chat, message, timeout_s=None):
+        self.timeouts.append(timeout_s)
+        return super().send_message(chat, message, timeout_s=timeout_s)
+
+
+def test_attempt_timeout_reaches_the_backend(monkeypatch):
+    monkeypatch.setitem(resilience._upstreams, "llm", Upstream("llm", UpstreamPolicy(timeout_s=7.5), max_workers=2))
+    backend = TimeoutRecordingBackend()
+    agent = LLMAgent(backend=backend, registry=ModelRegistry())
+    agent.start_new_session()
+    with resilience.request_budget(3.0):
+        agent.generate_response("Hello")
+    agent.generate_response("Hello again")
+    assert 2.5 < backend.timeouts[0] <= 3.0 # Capped by the request budget
+    assert backend.timeouts[1] == 7.5 # The upstream's own per-attempt timeout
+
+
+def test_vertex_client_wrapper_adds_the_timeout_to_generation_calls():
+    calls = []
+
+    class FakePredictionClient:
+        transport = "grpc"
+
+        def generate_content(self, request=None, timeout=None):
+            calls.append(("generate_content", timeout))
+
+        def stream_generate_content(self, request=None, timeout=None):
+            calls.append(("stream_generate_content", timeout))
+
+    client = _TimeoutPredictionClient(FakePredictionClient(), 4.0)
+    client.generate_content(request={})
+    client.stream_generate_content(request={})
+    assert calls == [("generate_content", 4.0), ("stream_generate_content", 4.0)]
+    assert client.transport == "grpc" # Everything else passes straight through
@@ -0,0 +1,61 @@
+# tests/test_model_registry.py
+
+import threading
+import time
+
+import pytest
+
+from src.models.llm_agent import LLMAgent
+from src.models.llm_backends import StubBackend
+from src.models.model_registry import ModelRegistry
+
+
+class CountingBackend(StubBackend):
+    def __init__(self, build_s: float = 0.0):
+        super().__init__(ttft_s=0.0, tokens_per_s=0.0, reply_template="{system_instruction}")
+        self.build_s = build_s
+        self.built = []
+
+    def create_model(self, model_name):
+        self.built.append(model_name)
+        time.sleep(self.build_s)
+        return super().create_model(model_name)
+
+
+def test_agents_share_one_model_whatever_their_system_instruction():
+    backend, registry = CountingBackend(), ModelRegistry()
+    north = LLMAgent(system_instruction="You speak for the north.", backend=backend, registry=registry)
+    south = LLMAgent(system_instruction="You speak for the south.", backend=backend, registry=registry)
+    for agent in (north, south):
+        agent.start_new_session()
+    assert north.model is south.model
+    assert backend.built == ["gemini-1.5-pro-preview-0514"]
+    # The instruction still reaches each agent's own chat
+    assert north.generate_response("Hello") == "You speak for the north."
+    assert south.generate_response("Hello") == "You speak for the south."
+
+
+def test_each_model_is_built_once_and_different_models_in_parallel():
+    backend, registry = CountingBackend(build_s=0.2), ModelRegistry()
+    results = []
+    threads = [threading.Thread(target=lambda name=name: results.append(registry.get_model(backend, name))) for name in ["a", "a", "a", "b"]]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(backend.built) == ["a", "b"]
+    assert len({id(model) for model in results}) == 2
+    assert time.perf_counter() - started < 0.35 # 'b' did not queue behind 'a'
+
+
+def test_a_failed_build_is_retried_by_the_next_caller(monkeypatch):
+    backend, registry = CountingBackend(), ModelRegistry()
+
+    def unavailable(model_name):
+        raise RuntimeError("quota exceeded")
+    monkeypatch.setattr(backend, "create_model", unavailable)
+    with pytest.raises(RuntimeError):
+        registry.get_model(backend, "a")
+    monkeypatch.undo()
+    assert registry.get_model(backend, "a").model_name == "a"
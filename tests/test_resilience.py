@@ -0,0 +1,240 @@
+# tests/test_resilience.py
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.models.llm_backends import StubBackend, set_default_backend
+from src.utils import resilience
+from src.utils.resilience import (
+    CircuitBreaker, CircuitOpenError, RateLimiter, RetryableUpstreamError, Upstream, UpstreamOverloadedError,
+    UpstreamPolicy, UpstreamTimeoutError, request_budget
+)
+
+NEGOTIATORS = [{"id": f"ai_{i}", "persona_type": "hardliner", "initial_stance": "Hold the line."} for i in range(3)]
+
+
+# --- Circuit breaker ---
+
+def test_breaker_opens_after_consecutive_failures_and_fails_fast():
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown_s=60)
+    breaker.record_failure()
+    breaker.allow()
+    breaker.record_success() # A success resets the streak
+    breaker.record_failure()
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_breaker_lets_one_trial_through_after_the_cooldown():
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown_s=0.02)
+    breaker.record_failure()
+    time.sleep(0.03)
+    breaker.allow() # The trial call
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow() # Only one at a time
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN # A failed trial re-opens it
+    time.sleep(0.03)
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_with_zero_threshold_never_opens():
+    breaker = CircuitBreaker("test", failure_threshold=0)
+    for _ in range(10):
+        breaker.record_failure()
+        breaker.allow()
+
+
+# --- Rate limiter ---
+
+def test_limiter_caps_calls_in_flight():
+    limiter = RateLimiter("test", max_concurrency=2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release()
+    assert limiter.try_acquire()
+
+
+def test_limiter_sheds_when_no_slot_frees_up_in_time():
+    limiter = RateLimiter("test", max_concurrency=1)
+    limiter.acquire(0.0)
+    started = time.monotonic()
+    with pytest.raises(UpstreamOverloadedError) as shed:
+        limiter.acquire(0.05)
+    assert time.monotonic() - started >= 0.05
+    assert shed.value.retry_after_s >= 1.0
+    assert limiter.waiting == 0
+
+
+def test_limiter_admits_a_queued_call_when_a_slot_frees_up():
+    limiter = RateLimiter("test", max_concurrency=1)
+    limiter.acquire(0.0)
+    threading.Timer(0.02, limiter.release).start()
+    assert limiter.acquire(1.0) > 0
+
+
+def test_limiter_sheds_immediately_when_the_queue_is_full():
+    limiter = RateLimiter("test", max_concurrency=1, max_queue=1)
+    limiter.acquire(0.0)
+    waiter = threading.Thread(target=lambda: pytest.raises(UpstreamOverloadedError, limiter.acquire, 0.2))
+    waiter.start()
+    while limiter.waiting == 0:
+        time.sleep(0.001)
+    started = time.monotonic()
+    with pytest.raises(UpstreamOverloadedError):
+        limiter.acquire(1.0)
+    assert time.monotonic() - started < 0.1
+    waiter.join()
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    limiter = RateLimiter("test", rate_per_s=20, burst=2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    time.sleep(0.06)
+    assert limiter.try_acquire()
+
+
+# --- Retries, hedging and the request budget ---
+
+def _fast_retry_upstream(**policy):
+    return Upstream("test", UpstreamPolicy(**{"backoff_base_s": 0.001, "backoff_max_s": 0.002, **policy}), max_workers=4)
+
+
+def test_retryable_errors_are_retried_up_to_max_attempts():
+    upstream = _fast_retry_upstream(max_attempts=3)
+    calls = []
+
+    def flaky(timeout_s):
+        calls.append(timeout_s)
+        if len(calls) < 3:
+            raise RetryableUpstreamError("503")
+        return "ok"
+    assert upstream.call(flaky) == "ok"
+    assert len(calls) == 3
+
+    def down(timeout_s):
+        calls.append(timeout_s)
+        raise RetryableUpstreamError("503")
+    calls.clear()
+    with pytest.raises(RetryableUpstreamError):
+        upstream.call(down)
+    assert len(calls) == 3
+
+
+def test_other_errors_are_not_retried_and_do_not_trip_the_breaker():
+    upstream = _fast_retry_upstream(max_attempts=3, breaker_failures=1)
+    calls = []
+
+    def bad_request(timeout_s):
+        calls.append(timeout_s)
+        raise ValueError("invalid prompt")
+    with pytest.raises(ValueError):
+        upstream.call(bad_request)
+    assert len(calls) == 1
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_attempts_time_out_and_are_retried():
+    upstream = _fast_retry_upstream(timeout_s=0.05, max_attempts=2)
+    calls = []
+
+    def slow(timeout_s):
+        calls.append(timeout_s)
+        time.sleep(0.2)
+    with pytest.raises(UpstreamTimeoutError) as timed_out:
+        upstream.call(slow)
+    assert len(calls) == 2
+    assert not timed_out.value.budget_limited
+
+
+def test_an_exhausted_request_budget_stops_calls_without_blaming_the_upstream():
+    upstream = _fast_retry_upstream(timeout_s=5.0, breaker_failures=1)
+    with request_budget(0.05):
+        with pytest.raises(UpstreamTimeoutError) as timed_out:
+            upstream.call(lambda timeout_s: time.sleep(0.2))
+        assert timed_out.value.budget_limited
+        time.sleep(0.06)
+        with pytest.raises(UpstreamTimeoutError):
+            upstream.call(lambda timeout_s: "never called")
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_a_slow_attempt_is_hedged_and_the_faster_duplicate_wins():
+    upstream = _fast_retry_upstream(hedge_percentile=50, hedge_min_delay_s=0.01, timeout_s=2.0)
+    for _ in range(resilience._LatencyWindow.MIN_SAMPLES):
+        upstream.call(lambda timeout_s: "warm", call_site="hedge")
+    calls = []
+
+    def first_slow(timeout_s):
+        calls.append(timeout_s)
+        time.sleep(0.5 if len(calls) == 1 else 0.0)
+        return len(calls)
+    started = time.monotonic()
+    assert upstream.call(first_slow, call_site="hedge") == 2
+    assert time.monotonic() - started < 0.3
+    assert upstream.call(first_slow, call_site="hedge", hedge=False) == 3 # No duplicate when hedging is off
+
+
+def _limited_upstream(name="test", max_concurrency=3, max_queue_wait_s=0.0, **policy):
+    return Upstream(name, UpstreamPolicy(max_concurrency=max_concurrency, max_queue_wait_s=max_queue_wait_s, **policy), max_workers=4)
+
+
+def test_reservation_admits_the_fan_out_at_once_or_not_at_all():
+    upstream = _limited_upstream()
+    reservation = upstream.reserve(3)
+    assert upstream.limiter.in_flight == 3
+    with pytest.raises(UpstreamOverloadedError):
+        upstream.reserve(2)
+    assert upstream.limiter.in_flight == 3 # A shed reservation holds nothing
+    reservation.release()
+    assert upstream.limiter.in_flight == 0
+
+
+def test_calls_draw_from_the_reservation_and_unused_slots_return():
+    upstream = _limited_upstream()
+    reservation = upstream.reserve(3)
+    with reservation.use():
+        assert upstream.call(lambda timeout_s: "reply") == "reply"
+    reservation.release()
+    reservation.release() # Idempotent
+    assert upstream.limiter.in_flight == 0
+    # Calls outside any reservation queue on their own again
+    assert upstream.call(lambda timeout_s: "reply") == "reply"
+
+
+def test_reservation_is_capped_at_what_the_limiter_can_ever_admit():
+    assert _limited_upstream(max_concurrency=2).reserve(5).slots == 2
+    assert _limited_upstream(max_concurrency=0).reserve(5).slots == 0 # Unlimited: nothing to reserve
+
+
+def test_overloaded_turns_are_shed_whole_before_any_agent_runs(make_service, monkeypatch):
+    upstream = _limited_upstream("llm", max_concurrency=6, max_queue_wait_s=0.05)
+    monkeypatch.setitem(resilience._upstreams, "llm", upstream)
+
+    async def scenario():
+        service = make_service()
+        session_ids = [(await service.start_negotiation("water", "mediator", NEGOTIATORS))["session_id"] for _ in range(5)]
+        set_default_backend(StubBackend(ttft_s=0.2, tokens_per_s=0.0))
+        outcomes = await asyncio.gather(*[service.take_turn(session_id, "user", message="Hello.") for session_id in session_ids], return_exceptions=True)
+        shed = [outcome for outcome in outcomes if isinstance(outcome, UpstreamOverloadedError)]
+        served = [outcome for outcome in outcomes if isinstance(outcome, dict)]
+        # Capacity for two whole turns; the others never started an agent call
+        assert len(served) == 2 and len(shed) == 3
+        assert all(len(outcome["ai_responses"]) == 3 for outcome in served)
+        for session_id, outcome in zip(session_ids, outcomes):
+            session = service.session_store.get(session_id)
+            assert len(session["conversation_history"]) == (3 + 1 + 3 if isinstance(outcome, dict) else 3) # Greetings, user turn, replies
+        await asyncio.sleep(0.3)
+        assert upstream.limiter.in_flight == 0
+
+    asyncio.run(scenario())
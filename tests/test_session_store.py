@@ -0,0 +1,166 @@
+# tests/test_session_store.py
+
+import asyncio
+import sqlite3
+import time
+
+import fakeredis
+import pytest
+
+from src.services.session_store import InMemorySessionStore, RedisSessionStore, SessionConflictError, SQLiteSessionStore
+
+
+def _session(version=0, **extra):
+    return {"history_version": version, "conversation_history": [{"speaker_id": "user", "message": "Hello"}], **extra}
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), max_sessions=3, idle_ttl_s=60, sweep_interval_s=3600)
+
+
+@pytest.fixture
+def redis_store():
+    return RedisSessionStore(client=fakeredis.FakeRedis(), idle_ttl_s=60)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore()
+    if request.param == "sqlite":
+        return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    return RedisSessionStore(client=fakeredis.FakeRedis())
+
+
+def test_round_trip(store):
+    assert store.get("missing") is None
+    store.put("s1", _session(scenario="water_dispute"))
+    assert store.get("s1") == _session(scenario="water_dispute")
+    assert len(store) == 1
+    store.delete("s1")
+    assert store.get("s1") is None
+    assert len(store) == 0
+
+
+def test_compare_and_set_rejects_a_stale_write(store):
+    store.put("s1", _session(0))
+    first, second = store.get("s1"), store.get("s1")
+    first["history_version"] = 1
+    assert store.put("s1", first, expected_version=0)
+    second["history_version"] = 1
+    assert not store.put("s1", second, expected_version=0)
+    assert store.get("s1")["history_version"] == 1
+    assert not store.put("unknown", _session(1), expected_version=0)
+
+
+def test_sqlite_idle_sessions_expire_and_are_swept(sqlite_store, monkeypatch):
+    sqlite_store.put("old", _session())
+    later = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert sqlite_store.get("old") is None
+    assert not sqlite_store.put("old", _session(1), expected_version=0) # An expired session cannot be written back
+    assert sqlite_store.sweep() == 1
+    assert sqlite_store.evictions["idle"] == 1
+
+
+def test_sqlite_sweep_keeps_the_most_recently_used(sqlite_store, monkeypatch):
+    now = time.time()
+    for i in range(5):
+        monkeypatch.setattr(time, "time", lambda i=i: now + i)
+        sqlite_store.put(f"s{i}", _session())
+    monkeypatch.setattr(time, "time", lambda: now + 10)
+    sqlite_store.get("s0") # Touch the oldest so it survives
+    assert sqlite_store.sweep() == 2
+    assert sqlite_store.evictions["max_sessions"] == 2
+    assert [sid for sid in ("s0", "s1", "s2", "s3", "s4") if sqlite_store.get(sid)] == ["s0", "s3", "s4"]
+
+
+def test_sqlite_migrates_a_table_without_history_version(tmp_path):
+    path = str(tmp_path / "legacy.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sessions (session_id TEXT PRIMARY KEY, data TEXT NOT NULL, last_access REAL NOT NULL)")
+    conn.commit()
+    conn.close()
+    store = SQLiteSessionStore(path)
+    store.put("s1", _session(4))
+    conn = sqlite3.connect(path)
+    # Rewrite as a legacy row to check the backfill from the stored JSON
+    conn.execute("ALTER TABLE sessions DROP COLUMN history_version")
+    conn.commit()
+    conn.close()
+    store = SQLiteSessionStore(path)
+    assert store.put("s1", _session(5), expected_version=4)
+
+
+def test_redis_sessions_expire_server_side():
+    store = RedisSessionStore(client=fakeredis.FakeRedis(), idle_ttl_s=0.05)
+    store.put("s1", _session())
+    time.sleep(0.1)
+    assert store.get("s1") is None
+    assert len(store) == 0 # The index entry is pruned along with the key
+
+
+def test_redis_get_refreshes_the_ttl(redis_store):
+    redis_store.put("s1", _session())
+    redis_store.client.pexpire(redis_store._key("s1"), 1000)
+    redis_store.get("s1")
+    assert redis_store.client.pttl(redis_store._key("s1")) > 1000
+
+
+def test_redis_compare_and_set_retries_when_only_touched(redis_store, monkeypatch):
+    redis_store.put("s1", _session(0))
+    real_pipeline = redis_store.client.pipeline
+    touched = []
+
+    def pipeline(*args, **kwargs):
+        pipe = real_pipeline(*args, **kwargs)
+        real_multi = pipe.multi
+
+        def multi():
+            if not touched: # Another reader refreshes the TTL between WATCH and MULTI
+                touched.append(True)
+                redis_store.get("s1")
+            return real_multi()
+        pipe.multi = multi
+        return pipe
+
+    monkeypatch.setattr(redis_store.client, "pipeline", pipeline)
+    assert redis_store.put("s1", _session(1), expected_version=0)
+    assert touched
+    assert redis_store.get("s1")["history_version"] == 1
+
+
+def test_injected_empty_store_is_kept(make_service):
+    # An empty store is falsy (it defines __len__) but must not be swapped for the environment default
+    store = InMemorySessionStore(max_sessions=5)
+    assert make_service(session_store=store).session_store is store
+
+
+def test_stores_hand_out_copies(store):
+    store.put("s1", _session())
+    store.get("s1")["conversation_history"].append({"speaker_id": "user", "message": "Unsaved"})
+    assert len(store.get("s1")["conversation_history"]) == 1
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_concurrent_turns_on_one_session_conflict(make_service, stub_llm, tmp_path, backend):
+    store = InMemorySessionStore() if backend == "memory" else SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    negotiators = [{"id": "ai_north", "persona_type": "hardliner", "initial_stance": "Keep the dam."}]
+
+    async def scenario():
+        service = make_service(session_store=store)
+        session_id = (await service.start_negotiation("water", "mediator", negotiators))["session_id"]
+        stub_llm(ttft_s=0.05)
+        outcomes = await asyncio.gather(
+            service.take_turn(session_id, "user", message="Proposal A."),
+            service.take_turn(session_id, "user", message="Proposal B."),
+            return_exceptions=True
+        )
+        assert sum(isinstance(outcome, dict) for outcome in outcomes) == 1
+        assert sum(isinstance(outcome, SessionConflictError) for outcome in outcomes) == 1
+        session = store.get(session_id)
+        assert [turn["speaker_id"] for turn in session["conversation_history"]] == ["ai_north", "user", "ai_north"]
+        assert session["history_version"] == 1
+
+    asyncio.run(scenario())
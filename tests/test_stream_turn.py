@@ -0,0 +1,36 @@
+# tests/test_stream_turn.py
+
+import asyncio
+
+NEGOTIATORS = [{"id": f"ai_{i}", "persona_type": "hardliner", "initial_stance": "Hold the line."} for i in range(2)]
+
+
+def test_completed_stream_commits_the_user_turn_with_the_replies(make_service):
+    async def scenario():
+        service = make_service()
+        session_id = (await service.start_negotiation("water", "mediator", NEGOTIATORS))["session_id"]
+        events = [event async for event, _ in await service.stream_turn(session_id, "user", message="Share the river.")]
+        assert events[0] == "user_turn" and events[-1] == "status"
+        session = service.session_store.get(session_id)
+        assert [turn["speaker_id"] for turn in session["conversation_history"][2:]] == ["user", "ai_0", "ai_1"]
+        assert session["history_version"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_stream_leaves_no_orphan_user_turn(make_service, stub_llm):
+    async def scenario():
+        service = make_service()
+        session_id = (await service.start_negotiation("water", "mediator", NEGOTIATORS))["session_id"]
+        stub_llm(tokens_per_s=50.0)
+        events = await service.stream_turn(session_id, "user", message="Share the river.")
+        async for event, _ in events:
+            if event == "agent_delta":
+                break # The client disconnects mid-reply
+        await events.aclose()
+        session = service.session_store.get(session_id)
+        assert [turn["speaker_id"] for turn in session["conversation_history"]] == ["ai_0", "ai_1"]
+        assert session["history_version"] == 0
+        assert session["agent_cursors"] == {"ai_0": 0, "ai_1": 0}
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+# tests/test_text_chunking.py
+
+from src.utils.text_chunking import SentenceChunker
+
+
+def _feed_all(chunker, deltas):
+    chunks = []
+    for delta in deltas:
+        chunks.extend(chunker.feed(delta))
+    return chunks
+
+
+def test_decimals_and_abbreviations_split_across_deltas_are_not_cut():
+    chunker = SentenceChunker(min_chars=10)
+    chunks = _feed_all(chunker, ["We can release 3.", "5 million litres a day. Our minister, Dr.", " Ama, agrees, e.", "g. on the dam. Next"])
+    assert chunks == ["We can release 3.5 million litres a day.", "Our minister, Dr. Ama, agrees, e.g. on the dam."]
+    assert chunker.flush() == "Next"
+
+
+def test_a_sentence_end_waits_for_the_following_whitespace():
+    chunker = SentenceChunker(min_chars=5)
+    assert chunker.feed("That is final.") == []
+    assert chunker.feed(" And") == ["That is final."]
+
+
+def test_short_sentences_are_merged_until_min_chars():
+    chunker = SentenceChunker(min_chars=20)
+    assert chunker.feed("Yes. No. ") == []
+    assert chunker.feed("Perhaps we can talk. ") == ["Yes. No. Perhaps we can talk."]
+
+
+def test_run_on_text_is_cut_at_max_chars():
+    chunker = SentenceChunker(min_chars=5, max_chars=30)
+    chunks = chunker.feed("the river, the dam and the fields along the valley floor")
+    assert chunks == ["the river,", "the dam and the fields along"]
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    assert chunker.flush() == "the valley floor"
+    # No space at all: a hard cut at max_chars
+    assert SentenceChunker(max_chars=10).feed("x" * 25) == ["x" * 10, "x" * 10]
+
+
+def test_flush_returns_the_remainder_once():
+    chunker = SentenceChunker()
+    chunker.feed("  trailing words  ")
+    assert chunker.flush() == "trailing words"
+    assert chunker.flush() is None
@@ -0,0 +1,33 @@
+# tests/test_tts_cache.py
+
+import os
+
+from src.services.tts_cache import DiskAudioCache
+
+
+def _directory_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def test_workers_sharing_a_directory_see_each_others_entries(tmp_path):
+    first, second = DiskAudioCache(str(tmp_path), max_bytes=100), DiskAudioCache(str(tmp_path), max_bytes=100)
+    first.put("a", b"12345")
+    assert second.get("a") == b"12345" # Written after the second worker's startup scan
+    assert second.stats()["entries"] == 1 and second.hits == 1
+
+
+def test_the_size_cap_holds_for_the_directory_as_a_whole(tmp_path):
+    first = DiskAudioCache(str(tmp_path), max_bytes=10, rescan_interval_s=0)
+    second = DiskAudioCache(str(tmp_path), max_bytes=10, rescan_interval_s=0)
+    first.put("a", b"123456")
+    second.put("b", b"123456") # Each worker alone is under the cap
+    assert _directory_bytes(tmp_path) <= 10
+    assert first.get("a") is None and second.get("b") == b"123456"
+
+
+def test_an_entry_removed_by_another_worker_is_a_miss(tmp_path):
+    first, second = DiskAudioCache(str(tmp_path), max_bytes=100), DiskAudioCache(str(tmp_path), max_bytes=100)
+    first.put("a", b"12345")
+    assert second.get("a") == b"12345"
+    os.remove(tmp_path / "a.mp3")
+    assert second.get("a") is None and second.stats()["entries"] == 0
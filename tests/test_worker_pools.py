@@ -0,0 +1,47 @@
+# tests/test_worker_pools.py
+
+import asyncio
+import contextvars
+import threading
+
+from src.utils.worker_pools import WorkerPool, get_pool, pool_stats, run_in_pool
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def test_pool_runs_work_in_the_callers_context():
+    pool = WorkerPool("test-context", 2)
+    request_id.set("req-1")
+    assert pool.submit(request_id.get).result() == "req-1"
+    assert pool.submit(threading.current_thread).result().name.startswith("pool-test-context")
+
+
+def test_pool_tracks_active_and_queued_work():
+    pool = WorkerPool("test-stats", 1)
+    gate = threading.Event()
+    running = pool.submit(gate.wait)
+    queued = pool.submit(lambda: "done")
+    while pool.stats()["active"] == 0:
+        gate.wait(0.001)
+    assert pool.stats() == {"workers": 1, "active": 1, "queued": 1, "utilization": 1.0}
+    gate.set()
+    assert queued.result() == "done" and running.result()
+    assert pool.stats()["active"] == 0 and pool.stats()["queued"] == 0
+
+
+def test_cancelled_queued_work_is_not_counted():
+    pool = WorkerPool("test-cancel", 1)
+    gate = threading.Event()
+    pool.submit(gate.wait)
+    assert pool.submit(lambda: None).cancel()
+    assert pool.stats()["queued"] == 0
+    gate.set()
+
+
+def test_named_pools_are_shared_and_sized_from_the_environment(monkeypatch):
+    monkeypatch.setenv("WORKER_POOL_TEST_ENV_SIZE", "3")
+    pool = get_pool("test-env")
+    assert pool is get_pool("test-env")
+    assert pool.max_workers == 3
+    assert "test-env" in pool_stats()
+    assert asyncio.run(run_in_pool("test-env", lambda x, y=0: x + y, 1, y=2)) == 3